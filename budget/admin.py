@@ -1,3 +1,36 @@
 from django.contrib import admin
+from . import ledger
+from .models import ExchangeRate, Transaction
 
 # Register your models here.
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('date', 'usd_to_pen')
+    date_hierarchy = 'date'
+
+
+@admin.register(Transaction)
+class TransactionAdmin(admin.ModelAdmin):
+    list_display = ('date', 'kind', 'amount', 'currency', 'description', 'account_from', 'account_to', 'is_valid')
+    list_filter = ('is_valid', 'kind', 'currency')
+    list_select_related = ('account_from', 'account_to')
+    search_fields = ('description',)
+    date_hierarchy = 'date'
+    actions = ['invalidate_selected', 'delete_invalidated']
+
+    def get_actions(self, request):
+        # The stock bulk delete bypasses the ledger and would leave balances stale
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Invalidar transacciones seleccionadas')
+    def invalidate_selected(self, request, queryset):
+        count = ledger.bulk_invalidate(queryset)
+        self.message_user(request, f'{count} transacciones invalidadas.')
+
+    @admin.action(description='Eliminar transacciones invalidadas seleccionadas')
+    def delete_invalidated(self, request, queryset):
+        count = ledger.bulk_delete(queryset)
+        self.message_user(request, f'{count} transacciones eliminadas permanentemente.')
@@ -0,0 +1,110 @@
+"""
+Versioned response cache for the dashboard JSON APIs.
+
+Cached responses are keyed on a ledger version counter stored in the
+``budget`` cache. Any write that can change a dashboard number (see
+budget/signals.py and ledger.apply_changes) bumps the counter, so old
+entries simply stop being addressed and expire on their own. A cache hit
+costs one counter read, one entry read and one LedgerState primary-key
+lookup, which is the same one ``conditional_api`` already makes for the ETag.
+It runs none of the view's aggregations.
+
+With the locmem backend each process keeps its own counter, so it is only
+safe for a single worker; use the file or redis backend for several.
+
+Keys also carry the LedgerState version the request's ETag was computed
+from (``conditional_api`` loads it before the view runs). A dashboard read
+routed to the read replica therefore gets a new key whenever a refresh
+brings the replica forward. The counter cannot do that, because the
+refresh runs in another process.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+VERSION_KEY = 'budget:ledger-version'
+
+
+def get_cache():
+    return caches[getattr(settings, 'BUDGET_CACHE_ALIAS', 'budget')]
+
+
+def ledger_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a lost counter never reuses an old version
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump():
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def bump_ledger_version():
+    _bump()
+    # Bump again once durable, in case a reader cached the pre-commit state
+    db_transaction.on_commit(_bump)
+
+
+def response_key(request, version, state_version):
+    query = '&'.join(f'{key}={value}' for key, value in sorted(request.GET.items()))
+    digest = hashlib.sha1(f'{request.path}?{query}'.encode()).hexdigest()
+    # Some endpoints are relative to today, so the date is part of the key
+    return f'budget:response:{version}:{state_version}:{timezone.now().date().isoformat()}:{digest}'
+
+
+def request_key(request):
+    from .conditional import request_state
+    # The state comes from the database the view reads, replica included
+    return response_key(request, ledger_version(), request_state(request).version)
+
+
+def cached_api(view):
+    """Serve successful GET responses of ``view`` from the versioned cache."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await view(request, *args, **kwargs)
+            cache = get_cache()
+            key = await sync_to_async(request_key)(request)
+            entry = await cache.aget(key)
+            if entry is not None:
+                content, content_type = entry
+                return HttpResponse(content, content_type=content_type)
+            response = await view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                await cache.aset(key, (response.content, response['Content-Type']), getattr(settings, 'BUDGET_CACHE_TIMEOUT', 86400))
+            return response
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return view(request, *args, **kwargs)
+        cache = get_cache()
+        key = request_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            content, content_type = entry
+            return HttpResponse(content, content_type=content_type)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response.content, response['Content-Type']), getattr(settings, 'BUDGET_CACHE_TIMEOUT', 86400))
+        return response
+    return wrapper
@@ -0,0 +1,72 @@
+"""
+Conditional GET support (ETag / Last-Modified) for budget pages and APIs.
+
+The validators come from the LedgerState fingerprint (one primary-key
+lookup), so a matching ``If-None-Match`` is answered with 304 before any of
+the view's aggregations run.
+"""
+import hashlib
+from datetime import datetime, time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils import timezone
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from .ledger import current_state
+
+
+def request_state(request):
+    # Both validators read the fingerprint; fetch it once per request
+    if not hasattr(request, '_ledger_state'):
+        request._ledger_state = current_state()
+    return request._ledger_state
+
+
+def fingerprint(state):
+    return f'{state.version}:{state.transaction_count}:{state.max_transaction_id}:{state.last_write.isoformat()}'
+
+
+def api_etag(request, *args, **kwargs):
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    # Several endpoints are relative to today, so the date is part of the tag
+    parts = [fingerprint(request_state(request)), timezone.localdate().isoformat(), request.get_full_path()]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def api_last_modified(request, *args, **kwargs):
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    start_of_day = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    return max(request_state(request).last_write, start_of_day)
+
+
+def page_etag(request, *args, **kwargs):
+    # Pending flash messages and the CSRF cookie are rendered into the page
+    if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+        return None
+    parts = [api_etag(request, *args, **kwargs), request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def conditional_api(view):
+    conditional = condition(etag_func=api_etag, last_modified_func=api_last_modified)(view)
+    if not iscoroutinefunction(view):
+        return conditional
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # The validators are synchronous; load the fingerprint off the event loop first
+        if request.method in ('GET', 'HEAD'):
+            await sync_to_async(request_state)(request)
+        return await conditional(request, *args, **kwargs)
+    return wrapper
+
+
+def conditional_page(view):
+    return vary_on_cookie(condition(etag_func=page_etag)(view))
@@ -0,0 +1,275 @@
+"""
+Deterministic synthetic ledgers for reproducing production-scale load.
+
+``generate_dataset(scale)`` creates accounts of every type, years of mixed
+PEN/USD transactions, daily exchange rates, recurring schedules and budget
+plans. Everything is derived from ``seed`` and ``end``, so the same
+arguments always produce the same rows. Rows are inserted with
+``bulk_create`` and the derived ledger tables are rebuilt once at the end.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from . import ledger, rollups
+from .cache import bump_ledger_version
+from .models import (
+    Account, BudgetPlan, Category, ExchangeRate, Payee, RecurringTransaction, Transaction,
+)
+from .payees import payee_index
+from .validation import account_directory
+
+CATEGORIES = (
+    'Alimentación', 'Transporte', 'Servicios', 'Ocio', 'Salud', 'Educación', 'Vivienda', 'Otros',
+    'Ropa', 'Mascotas', 'Viajes', 'Regalos', 'Suscripciones', 'Impuestos', 'Hogar', 'Tecnología',
+)
+PAYEES = ('Tottus', 'Plaza Vea', 'Wong', 'Metro', 'Uber', 'Cabify', 'Luz del Sur', 'Sedapal', 'Claro', 'Movistar',
+          'Netflix', 'Spotify', 'Inkafarma', 'Mifarma', 'Rappi', 'PedidosYa', 'Cineplanet', 'Starbucks', 'Saga', 'Ripley')
+BANKS = ('BCP', 'Interbank', 'BBVA', 'Scotiabank')
+
+# Relative frequency of each kind among generated transactions
+KIND_WEIGHTS = (
+    ('GASTO', 70), ('INGRESO', 8), ('TRANSFERENCIA', 8), ('PAGO_TARJETA', 6), ('TRANSFERENCIA_EXTERNA', 8),
+)
+GASTO_METHODS = {'EFECTIVO': 'EFECTIVO', 'DEBITO': 'TARJETA_DEBITO', 'CREDITO': 'TARJETA_CREDITO'}
+INVALID_RATE = 0.01
+CENT = Decimal('0.01')
+
+
+class DatasetError(Exception):
+    pass
+
+
+def dataset_size(scale, years):
+    """Rough row counts for ``scale``; the transaction count scales linearly."""
+    return {
+        'accounts': 6 * scale,
+        'payees': 25 * scale,
+        'transactions_per_day': 10 * scale,
+        'days': 365 * years,
+        'recurring': 4 * scale,
+    }
+
+
+DATASET_MODELS = (Transaction, RecurringTransaction, BudgetPlan, ExchangeRate, Account, Payee, Category)
+
+
+def clear_dataset():
+    """Delete every budget row (derived tables follow through cascades and rebuilds)."""
+    with db_transaction.atomic():
+        for model in DATASET_MODELS:
+            model.objects.all().delete()
+
+
+def generate_dataset(scale=1, years=3, seed=0, end=None, batch_size=5000, replace=False):
+    """Create a synthetic ledger and return the number of rows created per model."""
+    if scale < 1 or years < 1:
+        raise DatasetError('scale and years must be at least 1')
+    if any(model.objects.exists() for model in DATASET_MODELS):
+        if not replace:
+            raise DatasetError('the database already has budget data; pass replace=True to wipe it')
+        clear_dataset()
+    rng = random.Random(seed)
+    end = end or timezone.now().date()
+    size = dataset_size(scale, years)
+    start = end - timedelta(days=size['days'] - 1)
+
+    with db_transaction.atomic():
+        categories = Category.objects.bulk_create([Category(name=name) for name in CATEGORIES])
+        payees = Payee.objects.bulk_create([
+            Payee(name=f'{PAYEES[i % len(PAYEES)]} {i // len(PAYEES) + 1}') for i in range(size['payees'])
+        ])
+        accounts = Account.objects.bulk_create(build_accounts(rng, size['accounts']))
+        rates = ExchangeRate.objects.bulk_create(build_rates(rng, start, end), batch_size=batch_size)
+        plans = BudgetPlan.objects.bulk_create(build_budget_plans(rng, start, end))
+        recurring = RecurringTransaction.objects.bulk_create(
+            build_recurring(rng, size['recurring'], accounts, categories, payees, end)
+        )
+
+    created = 0
+    batch = []
+    for transaction in build_transactions(rng, start, end, size['transactions_per_day'], accounts, categories, payees):
+        batch.append(transaction)
+        if len(batch) >= batch_size:
+            created += len(Transaction.objects.bulk_create(batch))
+            batch = []
+    if batch:
+        created += len(Transaction.objects.bulk_create(batch))
+
+    # bulk_create skips save() and the model signals, so rebuild what they maintain
+    ledger.rebuild_balances()
+    rollups.rebuild_rollups()
+    rollups.rebuild_daily_rollups()
+    ledger.rebuild_state()
+    payee_index.invalidate()
+    account_directory.invalidate()
+    bump_ledger_version()
+    return {
+        'categories': len(categories),
+        'payees': len(payees),
+        'accounts': len(accounts),
+        'exchange_rates': len(rates),
+        'budget_plans': len(plans),
+        'recurring_transactions': len(recurring),
+        'transactions': created,
+    }
+
+
+def build_accounts(rng, count):
+    accounts = []
+    for i in range(count):
+        kind = ('EFECTIVO', 'DEBITO', 'CREDITO')[i % 3]
+        # About one account in four holds dollars
+        currency = 'USD' if i % 4 == 3 else 'PEN'
+        bank = BANKS[i % len(BANKS)]
+        account = Account(
+            name=f'Efectivo {i + 1}' if kind == 'EFECTIVO' else f'{bank} {kind.title()} {i + 1}',
+            type=kind,
+            currency=currency,
+            opening_balance=money(rng, 200, 20000) if kind != 'CREDITO' else Decimal('0.00'),
+        )
+        if kind == 'DEBITO':
+            account.savings_amount = money(rng, 100, 5000)
+        elif kind == 'CREDITO':
+            account.credit_limit = Decimal(rng.choice((3000, 5000, 10000, 20000)))
+            account.billing_cycle_day = rng.randint(1, 28)
+            account.due_day = rng.randint(1, 28)
+        accounts.append(account)
+    return accounts
+
+
+def build_rates(rng, start, end):
+    rate = Decimal('3.7500')
+    rates = []
+    for day in daterange(start, end):
+        # Small daily random walk kept inside a plausible band
+        rate = min(max(rate + Decimal(rng.uniform(-0.02, 0.02)).quantize(Decimal('0.0001')), Decimal('3.3000')), Decimal('4.1000'))
+        rates.append(ExchangeRate(date=day, usd_to_pen=rate))
+    return rates
+
+
+def build_budget_plans(rng, start, end):
+    plans = []
+    month = start.replace(day=1)
+    while month <= end:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        plans.append(budget_plan(rng, 'MENSUAL', month, next_month - timedelta(days=1), 4000))
+        month = next_month
+    # Shorter plans for the recent weeks
+    for weeks_back in range(8):
+        week_start = end - timedelta(days=end.weekday() + 7 * weeks_back)
+        plans.append(budget_plan(rng, 'SEMANAL', week_start, week_start + timedelta(days=6), 1000))
+    return plans
+
+
+def budget_plan(rng, frequency, period_start, period_end, income):
+    target_income = money(rng, income * 0.8, income * 1.2)
+    return BudgetPlan(
+        frequency=frequency, period_start=period_start, period_end=period_end, currency='PEN',
+        target_income=target_income, target_expenses=(target_income * Decimal(rng.uniform(0.5, 0.9))).quantize(CENT),
+        savings_rate=Decimal(rng.choice((10, 20, 30, 50))),
+    )
+
+
+def build_recurring(rng, count, accounts, categories, payees, end):
+    schedules = []
+    frequency_days = {'SEMANAL': 7, 'QUINCENAL': 14, 'MENSUAL': 30}
+    for i in range(count):
+        kind = 'INGRESO' if i % 4 == 0 else 'GASTO'
+        account = rng.choice(accounts)
+        frequency = rng.choice(list(frequency_days))
+        start_date = end - timedelta(days=rng.randint(60, 720))
+        schedules.append(RecurringTransaction(
+            kind=kind,
+            amount=money(rng, 1500, 6000) if kind == 'INGRESO' else money(rng, 20, 400),
+            currency=account.currency,
+            category=None if kind == 'INGRESO' else rng.choice(categories),
+            description='Sueldo' if kind == 'INGRESO' else f'Suscripción {i + 1}',
+            payment_method='TRANSFERENCIA' if kind == 'INGRESO' else GASTO_METHODS[account.type],
+            account_from=None if kind == 'INGRESO' else account,
+            account_to=account if kind == 'INGRESO' else None,
+            payee=None if kind == 'INGRESO' else rng.choice(payees),
+            frequency=frequency,
+            start_date=start_date,
+            next_run_date=end + timedelta(days=rng.randint(1, frequency_days[frequency])),
+        ))
+    return schedules
+
+
+def build_transactions(rng, start, end, per_day, accounts, categories, payees):
+    """Yield unsaved transactions; every row satisfies Transaction.clean()."""
+    kinds = [kind for kind, _ in KIND_WEIGHTS]
+    weights = [weight for _, weight in KIND_WEIGHTS]
+    by_currency = {currency: [a for a in accounts if a.currency == currency] for currency, _ in Account.CURRENCIES}
+    for day in daterange(start, end):
+        # Busier weekends and a little day-to-day noise
+        count = max(1, round(per_day * (1.3 if day.weekday() >= 5 else 1.0) * rng.uniform(0.7, 1.3)))
+        for _ in range(count):
+            transaction = build_transaction(rng, rng.choices(kinds, weights)[0], by_currency, categories, payees)
+            if transaction is None:
+                continue
+            transaction.date = day
+            transaction.effective_period = day.replace(day=1)
+            transaction.is_valid = rng.random() >= INVALID_RATE
+            yield transaction
+
+
+def build_transaction(rng, kind, by_currency, categories, payees):
+    currency = 'USD' if rng.random() < 0.2 and by_currency['USD'] else 'PEN'
+    pool = by_currency[currency]
+    account = rng.choice(pool)
+    transaction = Transaction(kind=kind, currency=currency)
+    if kind == 'GASTO':
+        transaction.amount = money(rng, 5, 600)
+        transaction.account_from = account
+        transaction.payment_method = GASTO_METHODS[account.type]
+        transaction.category = rng.choice(categories)
+        transaction.payee = rng.choice(payees)
+        transaction.description = f'Compra {transaction.payee.name}'
+    elif kind == 'INGRESO':
+        transaction.amount = money(rng, 300, 8000)
+        transaction.account_to = account
+        transaction.payment_method = 'TRANSFERENCIA'
+        transaction.description = rng.choice(('Sueldo', 'Honorarios', 'Reembolso', 'Venta'))
+    elif kind == 'TRANSFERENCIA':
+        sources = [a for a in pool if a.type != 'CREDITO']
+        if len(sources) < 2:
+            return None
+        transaction.account_from, transaction.account_to = rng.sample(sources, 2)
+        transaction.amount = money(rng, 50, 2000)
+        transaction.payment_method = 'TRANSFERENCIA'
+        transaction.description = 'Transferencia entre cuentas'
+    elif kind == 'PAGO_TARJETA':
+        cards = [a for a in pool if a.type == 'CREDITO']
+        sources = [a for a in pool if a.type != 'CREDITO']
+        if not cards or not sources:
+            return None
+        transaction.account_from = rng.choice(sources)
+        transaction.account_to = rng.choice(cards)
+        transaction.amount = money(rng, 100, 3000)
+        transaction.payment_method = 'TRANSFERENCIA'
+        transaction.description = 'Pago de tarjeta'
+    else:  # TRANSFERENCIA_EXTERNA
+        outgoing = rng.random() < 0.5
+        transaction.account_from = account if outgoing else None
+        transaction.account_to = None if outgoing else account
+        transaction.amount = money(rng, 20, 1500)
+        transaction.payment_method = 'TRANSFERENCIA'
+        transaction.payee = rng.choice(payees)
+        transaction.description = f'Transferencia {transaction.payee.name}'
+    return transaction
+
+
+def money(rng, low, high):
+    # Log-uniform, so small amounts are far more common than large ones
+    return Decimal(str(round(low * (high / low) ** rng.random(), 2))).quantize(CENT)
+
+
+def daterange(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
@@ -0,0 +1,102 @@
+"""
+Streaming ledger export as CSV or JSON Lines.
+
+Rows are read with ``values(...).iterator(chunk_size=...)`` and the related
+names are joined in the same query, so memory use stays flat regardless of
+ledger size. The CSV columns are a superset of what ``import_transactions``
+reads, so an export can be imported back.
+"""
+import csv
+import json
+from datetime import date
+
+from django.db.models import Q
+
+from .models import Transaction
+
+COLUMNS = (
+    'id', 'date', 'kind', 'amount', 'currency', 'description', 'payment_method',
+    'category', 'account_from', 'account_to', 'payee', 'is_valid',
+)
+
+VALUES = {
+    'id': 'id',
+    'date': 'date',
+    'kind': 'kind',
+    'amount': 'amount',
+    'currency': 'currency',
+    'description': 'description',
+    'payment_method': 'payment_method',
+    'category': 'category__name',
+    'account_from': 'account_from__name',
+    'account_to': 'account_to__name',
+    'payee': 'payee__name',
+    'is_valid': 'is_valid',
+}
+
+FORMATS = ('csv', 'jsonl')
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class ExportFilterError(ValueError):
+    pass
+
+
+def export_queryset(start=None, end=None, account=None, currency=None, valid=None):
+    """Filtered Transaction queryset in (date, id) order; arguments are raw strings."""
+    queryset = Transaction.objects.all()
+    try:
+        if start:
+            queryset = queryset.filter(date__gte=date.fromisoformat(start))
+        if end:
+            queryset = queryset.filter(date__lte=date.fromisoformat(end))
+    except ValueError:
+        raise ExportFilterError('start and end must be YYYY-MM-DD')
+    if account:
+        if not account.isdigit():
+            raise ExportFilterError('account must be an account id')
+        queryset = queryset.filter(Q(account_from_id=account) | Q(account_to_id=account))
+    if currency:
+        queryset = queryset.filter(currency=currency)
+    if valid in ('true', '1'):
+        queryset = queryset.filter(is_valid=True)
+    elif valid in ('false', '0'):
+        queryset = queryset.filter(is_valid=False)
+    elif valid not in (None, '', 'all'):
+        raise ExportFilterError('valid must be true, false or all')
+    return queryset.order_by('date', 'id')
+
+
+def iter_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    lookups = [VALUES[column] for column in COLUMNS]
+    for row in queryset.values_list(*lookups).iterator(chunk_size=chunk_size):
+        yield dict(zip(COLUMNS, row))
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in iter_rows(queryset, chunk_size):
+        row['date'] = row['date'].isoformat()
+        yield writer.writerow([row[column] if row[column] is not None else '' for column in COLUMNS])
+
+
+def iter_jsonl(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    for row in iter_rows(queryset, chunk_size):
+        row['date'] = row['date'].isoformat()
+        row['amount'] = str(row['amount'])
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def iter_export(queryset, file_format='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    if file_format == 'jsonl':
+        return iter_jsonl(queryset, chunk_size)
+    return iter_csv(queryset, chunk_size)
@@ -0,0 +1,87 @@
+"""
+Running balance of an account over time.
+
+The series applies the same signed flows as ``Account.balance`` (inflows via
+``account_to`` for INFLOW_KINDS, outflows via ``account_from`` for
+OUTFLOW_KINDS, valid rows only). The running total is a window SUM ordered
+by date, so one query returns the balance at the end of every day with
+activity; days without activity carry the previous balance forward.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When, Window
+
+from .ledger import INFLOW_KINDS, OUTFLOW_KINDS
+from .models import Transaction
+
+CENT = Decimal('0.01')
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def signed_flow(account_id):
+    return Case(
+        When(Q(account_to_id=account_id, kind__in=INFLOW_KINDS), then=F('amount')),
+        When(Q(account_from_id=account_id, kind__in=OUTFLOW_KINDS), then=-F('amount')),
+        default=Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=15, decimal_places=2),
+    )
+
+
+def daily_net_flows(account_id, end):
+    """(date, net flow of every valid row up to that date) for each day with activity, oldest first."""
+    # The default window frame (RANGE ... CURRENT ROW) includes every row of
+    # the same date, so all rows of a day share one running total
+    return (
+        Transaction.objects.filter(is_valid=True, date__lte=end)
+        .filter(Q(account_to_id=account_id) | Q(account_from_id=account_id))
+        .annotate(running=Window(
+            Sum(signed_flow(account_id)), order_by=F('date').asc(),
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        ))
+        .values_list('date', 'running').distinct().order_by('date')
+    )
+
+
+def bucket_end(day, granularity):
+    if granularity == 'week':
+        # ISO weeks end on Sunday
+        return day + timedelta(days=6 - day.weekday())
+    if granularity == 'month':
+        return (day.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return day
+
+
+def balance_history(account, start, end, granularity='day'):
+    """[(date, balance)] at the end of each ``granularity`` bucket in [start, end].
+
+    The last bucket is cut at ``end``. Rows before ``start`` are read too, as
+    they make up the balance the series opens with.
+    """
+    rows = iter(daily_net_flows(account.pk, end))
+    balance = account.opening_balance
+    pending = next(rows, None)
+    series = []
+    day = bucket_end(start, granularity)
+    while True:
+        point = min(day, end)
+        while pending is not None and pending[0] <= point:
+            # SQLite sums decimals in floating point; round back to cents
+            balance = account.opening_balance + pending[1].quantize(CENT)
+            pending = next(rows, None)
+        series.append((point, balance))
+        if point == end:
+            return series
+        day = bucket_end(day + timedelta(days=1), granularity)
+
+
+def history_payload(account, start, end, granularity, series):
+    return {
+        'account': account.id,
+        'currency': account.currency,
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': [{'date': day.isoformat(), 'balance': float(balance)} for day, balance in series],
+    }
@@ -0,0 +1,213 @@
+"""
+Streaming bulk import of bank statements.
+
+Rows are read lazily from CSV or OFX files, resolved against preloaded
+account, category and payee maps, validated a batch at a time by
+``validation.validate_many`` (no per-row queries), and
+inserted with ``bulk_create`` one batch per database transaction. Derived
+ledger tables are updated once per batch through ``ledger.apply_changes``.
+"""
+import csv
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+
+from . import ledger, validation
+from .models import Account, Category, Payee, Transaction
+
+CSV_COLUMNS = (
+    'date', 'kind', 'amount', 'currency', 'description', 'payment_method',
+    'category', 'account_from', 'account_to', 'payee', 'is_valid',
+)
+
+# is_valid is optional; exports write True/False
+VALID_VALUES = {'': True, 'true': True, '1': True, 'false': False, '0': False}
+
+
+class ImportRowError(Exception):
+    pass
+
+
+def read_csv(handle):
+    """Yield (line number, row dict) from a CSV file with a header row."""
+    reader = csv.DictReader(handle)
+    missing = {'date', 'kind', 'amount', 'description'} - set(reader.fieldnames or [])
+    if missing:
+        raise ImportRowError(f"missing CSV columns: {', '.join(sorted(missing))}")
+    for row in reader:
+        yield reader.line_num, {key: (value or '').strip() for key, value in row.items() if key}
+
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+
+def read_ofx(handle, account_name, payment_method='TRANSFERENCIA'):
+    """Yield (line number, row dict) for each <STMTTRN> in an OFX (SGML or XML) file.
+
+    Negative amounts become GASTO from ``account_name``, positive ones
+    INGRESO into it.
+    """
+    currency = ''
+    current = None
+    for line_num, line in enumerate(handle, start=1):
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            value = value.strip()
+            if tag == 'CURDEF' and not closing:
+                currency = value
+            elif tag == 'STMTTRN':
+                if closing and current is not None:
+                    yield current.pop('_line'), ofx_row(current, account_name, currency, payment_method)
+                    current = None
+                elif not closing:
+                    current = {'_line': line_num}
+            elif current is not None and not closing and value:
+                current[tag] = value
+
+
+def ofx_row(fields, account_name, currency, payment_method):
+    amount = fields.get('TRNAMT', '')
+    outgoing = amount.startswith('-')
+    return {
+        'date': fields.get('DTPOSTED', '')[:8],
+        'kind': 'GASTO' if outgoing else 'INGRESO',
+        'amount': amount.lstrip('+-'),
+        'currency': currency,
+        'description': fields.get('MEMO') or fields.get('NAME') or fields.get('FITID', ''),
+        'payment_method': payment_method,
+        'account_from': account_name if outgoing else '',
+        'account_to': '' if outgoing else account_name,
+        'payee': fields.get('NAME', ''),
+    }
+
+
+def parse_date(value):
+    if len(value) == 8 and value.isdigit():
+        return datetime.strptime(value, '%Y%m%d').date()
+    return date.fromisoformat(value)
+
+
+class TransactionImporter:
+    """Validate and insert imported rows in batches of ``batch_size``."""
+
+    def __init__(self, batch_size=2000, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.created = 0
+        self.errors = []
+        self.accounts = {}
+        for account in Account.objects.all():
+            # Ambiguous names map to None and are reported per row
+            self.accounts[account.name] = None if account.name in self.accounts else account
+            self.accounts[str(account.pk)] = account
+        self.categories = {category.name: category for category in Category.objects.all()}
+        self.payees = dict(Payee.objects.values_list('name', 'id'))
+
+    def run(self, rows):
+        batch = []
+        for line_num, row in rows:
+            batch.append((line_num, row))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+        return self.created
+
+    def flush(self, batch):
+        built = []
+        errors = []
+        for line_num, row in batch:
+            try:
+                built.append((line_num, self.build(row), row.get('payee', '')))
+            except ImportRowError as error:
+                errors.append((line_num, format_error(error)))
+        failed = set()
+        for position, error in validation.validate_many([transaction for _, transaction, _ in built]):
+            failed.add(position)
+            errors.append((built[position][0], format_error(error)))
+        self.errors.extend(sorted(errors, key=lambda error: error[0]))
+        valid = [(transaction, payee) for position, (_, transaction, payee) in enumerate(built) if position not in failed]
+        if self.dry_run:
+            # Count the rows that would have been created
+            self.created += len(valid)
+            return
+        if not valid:
+            return
+
+        with db_transaction.atomic():
+            self.create_payees({name for _, name in valid if name})
+            transactions = []
+            for transaction, payee_name in valid:
+                if payee_name:
+                    transaction.payee_id = self.payees[payee_name]
+                transactions.append(transaction)
+            Transaction.objects.bulk_create(transactions, batch_size=self.batch_size)
+            ledger.apply_changes([], [ledger.snapshot(transaction) for transaction in transactions])
+        self.created += len(transactions)
+
+    def create_payees(self, names):
+        missing = [name for name in names if name not in self.payees]
+        if not missing:
+            return
+        Payee.objects.bulk_create([Payee(name=name) for name in missing], ignore_conflicts=True)
+        self.payees.update(Payee.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    def lookup_account(self, value):
+        if not value:
+            return None
+        if value not in self.accounts:
+            raise ImportRowError(f'unknown account "{value}"')
+        account = self.accounts[value]
+        if account is None:
+            raise ImportRowError(f'ambiguous account name "{value}"')
+        return account
+
+    def build(self, row):
+        try:
+            day = parse_date(row.get('date', ''))
+        except ValueError:
+            raise ImportRowError(f"invalid date \"{row.get('date', '')}\"")
+        try:
+            amount = Decimal(row.get('amount', ''))
+        except InvalidOperation:
+            raise ImportRowError(f"invalid amount \"{row.get('amount', '')}\"")
+        category = None
+        if row.get('category'):
+            category = self.categories.get(row['category'])
+            if category is None:
+                raise ImportRowError(f"unknown category \"{row['category']}\"")
+        account_from = self.lookup_account(row.get('account_from'))
+        account_to = self.lookup_account(row.get('account_to'))
+        is_valid = VALID_VALUES.get(row.get('is_valid', '').lower())
+        if is_valid is None:
+            raise ImportRowError(f"invalid is_valid \"{row['is_valid']}\"")
+        currency = row.get('currency')
+        if not currency:
+            account = account_from or account_to
+            currency = account.currency if account else 'PEN'
+
+        return Transaction(
+            date=day,
+            effective_period=day.replace(day=1),
+            kind=row.get('kind', ''),
+            amount=amount,
+            currency=currency,
+            description=row.get('description', ''),
+            payment_method=row.get('payment_method') or 'OTRO',
+            category=category,
+            account_from=account_from,
+            account_to=account_to,
+            is_valid=is_valid,
+        )
+
+
+def format_error(error):
+    if isinstance(error, ValidationError):
+        if hasattr(error, 'error_dict'):
+            return '; '.join(f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items())
+        return ' '.join(error.messages)
+    return str(error)
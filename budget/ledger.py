@@ -0,0 +1,216 @@
+"""
+Derived ledger state kept in sync with Transaction writes.
+
+Every write to a Transaction is described as a pair of snapshot lists: the
+rows as they were before the write (``removed``) and the rows as they are
+after it (``added``). ``apply_changes`` turns that pair into deltas for the
+materialized tables, so callers never have to rescan the transaction history.
+
+``bulk_invalidate`` and ``bulk_delete`` write a whole queryset with one
+UPDATE or DELETE and feed the same snapshots through ``apply_changes``.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import rollups, statements
+from .cache import bump_ledger_version
+from .models import Account, AccountBalance, LedgerState, RecurringOccurrence, Transaction
+
+SNAPSHOT_FIELDS = (
+    'id', 'date', 'effective_period', 'kind', 'is_valid', 'amount', 'currency',
+    'category_id', 'payment_method', 'account_from_id', 'account_to_id',
+)
+
+# Same flow rules as the historical Account.balance aggregates
+INFLOW_KINDS = ('INGRESO', 'TRANSFERENCIA', 'PAGO_TARJETA', 'TRANSFERENCIA_EXTERNA')
+OUTFLOW_KINDS = ('GASTO', 'TRANSFERENCIA', 'PAGO_TARJETA', 'TRANSFERENCIA_EXTERNA')
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+STATE_PK = 1
+
+
+def snapshot(transaction):
+    return {field: getattr(transaction, field) for field in SNAPSHOT_FIELDS}
+
+
+def load_snapshots(ids):
+    ids = [pk for pk in ids if pk is not None]
+    if not ids:
+        return []
+    return list(Transaction.objects.filter(pk__in=ids).values(*SNAPSHOT_FIELDS))
+
+
+def account_deltas(rows, sign=1):
+    # account_id -> [net_flow delta, credit_used delta]
+    deltas = defaultdict(lambda: [ZERO, ZERO])
+    for row in rows:
+        if not row['is_valid']:
+            continue
+        amount = Decimal(row['amount']) * sign
+        kind = row['kind']
+        account_from = row['account_from_id']
+        account_to = row['account_to_id']
+        if account_to and kind in INFLOW_KINDS:
+            deltas[account_to][0] += amount
+        if account_from and kind in OUTFLOW_KINDS:
+            deltas[account_from][0] -= amount
+        if account_from and kind == 'GASTO' and row['payment_method'] == 'TARJETA_CREDITO':
+            deltas[account_from][1] += amount
+        if account_to and kind == 'PAGO_TARJETA':
+            deltas[account_to][1] -= amount
+    return deltas
+
+
+def apply_balance_deltas(deltas):
+    for account_id, (net_flow, credit_used) in deltas.items():
+        if not net_flow and not credit_used:
+            continue
+        updated = AccountBalance.objects.filter(account_id=account_id).update(
+            net_flow=F('net_flow') + net_flow,
+            credit_used=F('credit_used') + credit_used,
+        )
+        if not updated:
+            AccountBalance.objects.create(account_id=account_id, net_flow=net_flow, credit_used=credit_used)
+
+
+def apply_changes(removed, added):
+    """Update every derived table for rows going from ``removed`` to ``added``."""
+    with db_transaction.atomic():
+        deltas = account_deltas(removed, sign=-1)
+        for account_id, (net_flow, credit_used) in account_deltas(added).items():
+            deltas[account_id][0] += net_flow
+            deltas[account_id][1] += credit_used
+        apply_balance_deltas(deltas)
+        rollup_deltas = rollups.rollup_deltas(removed, sign=-1)
+        rollups.apply_rollup_deltas(rollups.rollup_deltas(added, deltas=rollup_deltas))
+        daily_deltas = rollups.daily_deltas(removed, sign=-1)
+        rollups.apply_daily_deltas(rollups.daily_deltas(added, deltas=daily_deltas))
+        statements.invalidate_rows(removed + added)
+        removed_ids = {row['id'] for row in removed}
+        added_ids = {row['id'] for row in added}
+        touch_state(
+            count_delta=len(added_ids - removed_ids) - len(removed_ids - added_ids),
+            max_id=max(added_ids - {None}, default=0),
+        )
+    # Bulk writes do not send model signals, so invalidate cached dashboards here
+    bump_ledger_version()
+
+
+def bulk_invalidate(queryset):
+    """Invalidate the valid rows of ``queryset`` with one UPDATE; returns how many were invalidated."""
+    targets = queryset.filter(is_valid=True)
+    with db_transaction.atomic():
+        # Transactions take the write lock at BEGIN (see SQLITE_OPTIONS), so
+        # the snapshots and the UPDATE see the same rows
+        removed = list(targets.values(*SNAPSHOT_FIELDS))
+        if not removed:
+            return 0
+        count = targets.update(is_valid=False)
+        apply_changes(removed, [{**row, 'is_valid': False} for row in removed])
+    return count
+
+
+def bulk_delete(queryset):
+    """Delete the invalidated rows of ``queryset`` with one DELETE; returns how many were deleted.
+
+    Like the single-row view, valid rows are never deleted. ``queryset`` must
+    not be sliced.
+    """
+    targets = queryset.filter(is_valid=False)
+    with db_transaction.atomic():
+        removed = list(targets.values(*SNAPSHOT_FIELDS))
+        if not removed:
+            return 0
+        # QuerySet.delete() would load every row to apply on_delete and send
+        # one post_delete each; apply_changes already bumps the cache version
+        # once. RecurringOccurrence.transaction (SET_NULL) is the only
+        # relation to Transaction, and a test fails if another appears.
+        RecurringOccurrence.objects.filter(transaction__in=targets).update(transaction=None)
+        sql, params = targets.values('id').order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {Transaction._meta.db_table} WHERE id IN ({sql})', params)
+            count = cursor.rowcount
+        apply_changes(removed, [])
+    return count
+
+
+def compute_balances():
+    """Recompute every account total from the raw transactions (a few GROUP BY queries)."""
+    totals = defaultdict(lambda: [ZERO, ZERO])
+    valid = Transaction.objects.filter(is_valid=True)
+
+    inflows = valid.filter(kind__in=INFLOW_KINDS, account_to__isnull=False).values('account_to').annotate(total=Sum('amount'))
+    for row in inflows:
+        totals[row['account_to']][0] += row['total']
+    outflows = valid.filter(kind__in=OUTFLOW_KINDS, account_from__isnull=False).values('account_from').annotate(total=Sum('amount'))
+    for row in outflows:
+        totals[row['account_from']][0] -= row['total']
+
+    used = valid.filter(kind='GASTO', payment_method='TARJETA_CREDITO', account_from__isnull=False).values('account_from').annotate(total=Sum('amount'))
+    for row in used:
+        totals[row['account_from']][1] += row['total']
+    paid = valid.filter(kind='PAGO_TARJETA', account_to__isnull=False).values('account_to').annotate(total=Sum('amount'))
+    for row in paid:
+        totals[row['account_to']][1] -= row['total']
+    # SQLite sums decimals in floating point; round back to cents
+    for entry in totals.values():
+        entry[0] = entry[0].quantize(CENT)
+        entry[1] = entry[1].quantize(CENT)
+    return totals
+
+
+def rebuild_balances():
+    totals = compute_balances()
+    with db_transaction.atomic():
+        AccountBalance.objects.all().delete()
+        AccountBalance.objects.bulk_create([
+            AccountBalance(account_id=account_id, net_flow=totals[account_id][0], credit_used=totals[account_id][1])
+            for account_id in Account.objects.values_list('id', flat=True)
+        ])
+    return len(totals)
+
+
+def verify_balances():
+    """Return a list of (account_id, stored, expected) tuples that disagree."""
+    totals = compute_balances()
+    stored = {row.account_id: (row.net_flow, row.credit_used) for row in AccountBalance.objects.all()}
+    mismatches = []
+    for account_id in Account.objects.values_list('id', flat=True):
+        expected = tuple(totals[account_id]) if account_id in totals else (ZERO, ZERO)
+        current = stored.get(account_id, (ZERO, ZERO))
+        if current != expected:
+            mismatches.append((account_id, current, expected))
+    return mismatches
+
+
+def touch_state(count_delta=0, max_id=0):
+    """Record a write in the LedgerState fingerprint (one UPDATE)."""
+    updated = LedgerState.objects.filter(pk=STATE_PK).update(
+        version=F('version') + 1,
+        transaction_count=F('transaction_count') + count_delta,
+        max_transaction_id=Greatest('max_transaction_id', Value(max_id)),
+        last_write=timezone.now(),
+    )
+    if not updated:
+        rebuild_state()
+
+
+def rebuild_state():
+    totals = Transaction.objects.aggregate(count=Count('id'), max_id=Max('id'))
+    state, _ = LedgerState.objects.update_or_create(pk=STATE_PK, defaults={
+        'transaction_count': totals['count'],
+        'max_transaction_id': totals['max_id'] or 0,
+        'last_write': timezone.now(),
+    })
+    return state
+
+
+def current_state():
+    return LedgerState.objects.filter(pk=STATE_PK).first() or rebuild_state()
@@ -0,0 +1,138 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction as db_transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from budget import cache
+from budget.datasets import generate_dataset
+from budget.samples import sample_request, url_names
+
+class Command(BaseCommand):
+    help = (
+        'Time every view and API in budget/urls.py against synthetic ledgers of several scales. '
+        'Runs on a throwaway test database and writes JSON results comparable between commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1,4', help='Comma-separated generate_dataset scales')
+        parser.add_argument('--years', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per endpoint')
+        parser.add_argument('--endpoints', help='Comma-separated URL names (default: all)')
+        parser.add_argument('--warm', action='store_true', help='Keep the response cache between requests')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Earlier --output file to compare the medians against')
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('--scales must be comma-separated integers')
+        names = url_names()
+        if options['endpoints']:
+            unknown = set(options['endpoints'].split(',')) - set(names)
+            if unknown:
+                raise CommandError(f"unknown endpoints: {', '.join(sorted(unknown))}")
+            names = [name for name in names if name in options['endpoints'].split(',')]
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as handle:
+                baseline = json.load(handle)
+
+        report = {
+            'commit': git_commit(),
+            'generated_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'years': options['years'],
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'warm': options['warm'],
+            'scales': {},
+        }
+        # Never touch the configured database: build a test database, as the test runner does
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for scale in scales:
+                started = time.perf_counter()
+                rows = generate_dataset(scale=scale, years=options['years'], seed=options['seed'], replace=True)
+                self.stdout.write(f"Scale {scale}: {rows['transactions']} transactions generated in {time.perf_counter() - started:.1f}s")
+                endpoints = {}
+                for name in names:
+                    endpoints[name] = self.bench_endpoint(name, options['repeat'], options['warm'])
+                    self.stdout.write(
+                        f"  {name:45} {endpoints[name]['median_ms']:9.2f} ms  {endpoints[name]['queries']:3} queries"
+                        + compare_note(baseline, scale, name, endpoints[name])
+                    )
+                report['scales'][str(scale)] = {'rows': rows, 'endpoints': endpoints}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def bench_endpoint(self, name, repeat, warm):
+        method, path, params = sample_request(name)
+        client = Client()
+        # The first request loads in-process indexes; count its queries but do not time it
+        with CaptureQueriesContext(connection) as queries:
+            status = send(client, method, path, params)
+        if status >= 400:
+            raise CommandError(f'{name} answered {status}')
+        samples = []
+        for _ in range(repeat):
+            if not warm:
+                cache.get_cache().clear()
+            started = time.perf_counter()
+            send(client, method, path, params)
+            samples.append((time.perf_counter() - started) * 1000)
+        return {
+            'method': method,
+            'status': status,
+            'queries': len(queries),
+            'min_ms': min(samples),
+            'median_ms': statistics.median(samples),
+            'mean_ms': statistics.fmean(samples),
+            'max_ms': max(samples),
+        }
+
+
+def send(client, method, path, params):
+    if method == 'POST':
+        with db_transaction.atomic():
+            response = client.post(path, params)
+            db_transaction.set_rollback(True)
+        return response.status_code
+    response = client.get(path, params)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response.status_code
+
+
+def compare_note(baseline, scale, name, result):
+    if not baseline:
+        return ''
+    previous = baseline.get('scales', {}).get(str(scale), {}).get('endpoints', {}).get(name)
+    if not previous or not previous['median_ms']:
+        return ''
+    return f"  {result['median_ms'] / previous['median_ms']:5.2f}x vs {baseline.get('commit') or 'baseline'}"
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
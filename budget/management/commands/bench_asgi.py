@@ -0,0 +1,116 @@
+import importlib.util
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from budget import metrics
+
+ENDPOINTS = {
+    'summary': ('/api/dashboard/summary', '/api/async/dashboard/summary', True),
+    'netflow': ('/api/dashboard/netflow_12m', '/api/async/dashboard/netflow_12m', False),
+    'income_expenses': ('/api/dashboard/income_expenses_12m', '/api/async/dashboard/income_expenses_12m', False),
+    'expenses_by_category': ('/api/dashboard/expenses_by_category', '/api/async/dashboard/expenses_by_category', True),
+    'bundle': ('/api/dashboard/bundle', '/api/async/dashboard/bundle', True),
+}
+
+class Command(BaseCommand):
+    help = 'Compare dashboard API latency and throughput: WSGI (runserver) against ASGI (uvicorn)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='bundle')
+        parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=400, help='Requests per server')
+        parser.add_argument('--port', type=int, default=8765, help='First of the two ports to listen on')
+        parser.add_argument('--cached', action='store_true', help='Let repeated requests hit the response cache')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec('uvicorn') is None:
+            raise CommandError('uvicorn is not installed (pip install uvicorn)')
+
+        sync_path, async_path, dated = ENDPOINTS[options['endpoint']]
+        query = ''
+        if dated:
+            start, end = metrics.month_bounds(timezone.now().date())
+            query = f'start={start.isoformat()}&end={end.isoformat()}'
+
+        port = options['port']
+        servers = [
+            ('wsgi', sync_path, [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']),
+            ('asgi', async_path, [
+                sys.executable, '-m', 'uvicorn', 'newfinance.asgi:application',
+                '--host', '127.0.0.1', '--port', str(port + 1), '--log-level', 'warning', '--no-access-log',
+            ]),
+        ]
+        results = {}
+        for offset, (name, path, command) in enumerate(servers):
+            url = f'http://127.0.0.1:{port + offset}{path}?{query}'
+            process = subprocess.Popen(command, cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_for_port(port + offset)
+                results[name] = run_load(url, options['clients'], options['requests'], options['cached'])
+            finally:
+                process.terminate()
+                process.wait()
+            self.stdout.write(
+                f"{name}: {results[name]['throughput']:.1f} req/s, "
+                f"p50 {results[name]['p50_ms']:.1f} ms, p95 {results[name]['p95_ms']:.1f} ms, "
+                f"p99 {results[name]['p99_ms']:.1f} ms, {results[name]['errors']} errors"
+            )
+
+        if options['output']:
+            report = {'endpoint': options['endpoint'], 'clients': options['clients'], 'requests': options['requests'], 'results': results}
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, indent=2)
+        speedup = results['asgi']['throughput'] / results['wsgi']['throughput'] if results['wsgi']['throughput'] else 0
+        self.stdout.write(self.style.SUCCESS(f'ASGI/WSGI throughput: {speedup:.2f}x'))
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f'Server on port {port} did not start')
+
+
+def run_load(url, clients, total, cached):
+    def fetch(i):
+        # A distinct query string per request bypasses the response cache
+        target = url if cached else f'{url}&_={i}'
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(target, timeout=30) as response:
+                response.read()
+                ok = response.status == 200
+        except OSError:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        samples = list(pool.map(fetch, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, ok in samples if ok)
+    if len(latencies) < 2:
+        raise CommandError(f'Too few successful requests against {url}')
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        'throughput': len(latencies) / elapsed,
+        'mean_ms': statistics.fmean(latencies),
+        'p50_ms': quantiles[49],
+        'p95_ms': quantiles[94],
+        'p99_ms': quantiles[98],
+        'errors': sum(1 for _, ok in samples if not ok),
+    }
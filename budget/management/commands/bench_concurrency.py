@@ -0,0 +1,171 @@
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from budget import cache
+from budget.datasets import generate_dataset
+from budget.samples import sample_request
+from budget.models import Transaction
+from newfinance.database import refresh_replica
+
+MODES = ('rollback', 'wal', 'replica')
+
+class Command(BaseCommand):
+    help = (
+        'Measure dashboard read throughput while transactions are written concurrently, with the '
+        'default rollback journal, with the WAL connection profile, and with reads sent to a replica. '
+        'Runs on a throwaway database file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default=','.join(MODES), help=f"Comma-separated subset of {', '.join(MODES)}")
+        parser.add_argument('--scale', type=int, default=1, help='generate_dataset scale')
+        parser.add_argument('--years', type=int, default=2)
+        parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of each mode')
+        parser.add_argument('--write-pause', type=float, default=0.01, help='Seconds the writer waits between writes')
+        parser.add_argument('--refresh', type=float, default=2, help='Replica refresh interval in seconds')
+        parser.add_argument('--endpoint', default='api_dashboard_bundle', help='URL name the readers request')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        modes = [mode for mode in options['modes'].split(',') if mode]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"unknown modes: {', '.join(sorted(unknown))}")
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark compares SQLite journal modes')
+        if not options['endpoint'].startswith(settings.BUDGET_REPLICA_VIEWS):
+            raise CommandError(f"{options['endpoint']} is not routed to the replica")
+
+        workdir = tempfile.mkdtemp(prefix='bench-concurrency-')
+        primary = os.path.join(workdir, 'primary.sqlite3')
+        # WAL needs a database file; the test runner would use an in-memory one
+        connection.settings_dict['TEST'] = {**connection.settings_dict.get('TEST', {}), 'NAME': primary}
+        profile = dict(connection.settings_dict['OPTIONS'])
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        results = {}
+        try:
+            rows = generate_dataset(scale=options['scale'], years=options['years'], replace=True)
+            self.stdout.write(f"{rows['transactions']} transactions, {options['readers']} readers, 1 writer")
+            writes = list(Transaction.objects.filter(is_valid=True).order_by('id').values_list('id', flat=True)[:200])
+            for mode in modes:
+                results[mode] = self.run_mode(mode, profile, primary, writes, options)
+                self.stdout.write(
+                    f"  {mode:9} {results[mode]['reads_per_second']:8.1f} reads/s"
+                    f"  p50 {results[mode]['read_p50_ms']:7.2f} ms  p95 {results[mode]['read_p95_ms']:7.2f} ms"
+                    f"  {results[mode]['writes_per_second']:6.1f} writes/s  {results[mode]['errors']} errors"
+                )
+        finally:
+            connections.close_all()
+            connection.settings_dict['OPTIONS'] = profile
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        if 'rollback' in results and results['rollback']['reads_per_second']:
+            for mode in modes:
+                if mode != 'rollback':
+                    gain = results[mode]['reads_per_second'] / results['rollback']['reads_per_second']
+                    self.stdout.write(self.style.SUCCESS(f'{mode}: {gain:.2f}x the read throughput of rollback journaling'))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump({'options': {k: options[k] for k in ('scale', 'years', 'readers', 'seconds', 'write_pause', 'refresh', 'endpoint')},
+                           'modes': results}, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def run_mode(self, mode, profile, primary, writes, options):
+        connections.close_all()
+        # The journal mode is stored in the file; switch it with no connection open
+        raw = sqlite3.connect(primary)
+        raw.execute(f"PRAGMA journal_mode={'DELETE' if mode == 'rollback' else 'WAL'}")
+        raw.close()
+        # The stock configuration: no pragmas, deferred transactions
+        connection.settings_dict['OPTIONS'] = {} if mode == 'rollback' else dict(profile)
+        replica = None
+        if mode == 'replica':
+            replica = {**connection.settings_dict, 'NAME': primary.replace('primary', 'replica')}
+            replica['OPTIONS'] = {**profile, 'init_command': profile.get('init_command', '') + ';PRAGMA query_only=1'}
+            connections.settings['replica'] = replica
+
+        stop = threading.Event()
+        latencies = [[] for _ in range(options['readers'])]
+        counters = {'writes': 0, 'errors': 0}
+        method, path, params = sample_request(options['endpoint'])
+        with override_settings(BUDGET_READ_REPLICA='replica' if replica else None):
+            if replica:
+                refresh_replica('replica')
+            threads = [threading.Thread(target=self.read, args=(path, params, stop, latencies[i], counters)) for i in range(options['readers'])]
+            threads.append(threading.Thread(target=self.write, args=(writes, options['write_pause'], stop, counters)))
+            if replica:
+                threads.append(threading.Thread(target=self.refresh, args=(options['refresh'], stop)))
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            time.sleep(options['seconds'])
+            stop.set()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        if replica:
+            connections.settings.pop('replica')
+
+        samples = sorted(sample for thread_samples in latencies for sample in thread_samples)
+        return {
+            'reads': len(samples),
+            'reads_per_second': len(samples) / elapsed,
+            'read_p50_ms': statistics.median(samples) if samples else 0.0,
+            'read_p95_ms': samples[int(len(samples) * 0.95)] if samples else 0.0,
+            'writes': counters['writes'],
+            'writes_per_second': counters['writes'] / elapsed,
+            'errors': counters['errors'],
+        }
+
+    def read(self, path, params, stop, samples, counters):
+        client = Client()
+        try:
+            while not stop.is_set():
+                # Every request misses the response cache and runs its queries
+                cache.get_cache().clear()
+                started = time.perf_counter()
+                try:
+                    status = client.get(path, params).status_code
+                except OperationalError:
+                    status = 500
+                if status == 200:
+                    samples.append((time.perf_counter() - started) * 1000)
+                else:
+                    counters['errors'] += 1
+        finally:
+            connections.close_all()
+
+    def write(self, ids, pause, stop, counters):
+        try:
+            while not stop.is_set():
+                for transaction in Transaction.objects.filter(pk__in=ids[:10]):
+                    if stop.is_set():
+                        break
+                    # Invalidate and restore a row: two real ledger writes, same end state
+                    for is_valid in (False, True):
+                        transaction.is_valid = is_valid
+                        try:
+                            transaction.save()
+                            counters['writes'] += 1
+                        except OperationalError:
+                            counters['errors'] += 1
+                    time.sleep(pause)
+                ids = ids[10:] + ids[:10]
+        finally:
+            connections.close_all()
+
+    def refresh(self, interval, stop):
+        while not stop.wait(interval):
+            refresh_replica('replica')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from budget import exports
+
+class Command(BaseCommand):
+    help = 'Stream the transaction ledger as CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--output', help='Output file (defaults to stdout)')
+        parser.add_argument('--start', help='First date, YYYY-MM-DD')
+        parser.add_argument('--end', help='Last date, YYYY-MM-DD')
+        parser.add_argument('--account', help='Account id (either side of the transaction)')
+        parser.add_argument('--currency', choices=['PEN', 'USD'])
+        parser.add_argument('--valid', choices=['true', 'false', 'all'], default='all')
+        parser.add_argument('--chunk-size', type=int, default=exports.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            queryset = exports.export_queryset(
+                start=options['start'],
+                end=options['end'],
+                account=options['account'],
+                currency=options['currency'],
+                valid=options['valid'],
+            )
+        except exports.ExportFilterError as e:
+            raise CommandError(str(e))
+
+        chunks = exports.iter_export(queryset, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
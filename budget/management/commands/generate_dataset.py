@@ -0,0 +1,41 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from budget.datasets import DatasetError, dataset_size, generate_dataset
+
+class Command(BaseCommand):
+    help = 'Fill the database with a deterministic synthetic ledger (about 11k transactions per scale unit and year)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help='Multiplies accounts, payees, schedules and daily transactions')
+        parser.add_argument('--years', type=int, default=3, help='Years of history ending on --end')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--end', help='Last day of history (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--replace', action='store_true', help='Delete the existing budget data first')
+
+    def handle(self, *args, **options):
+        end = timezone.now().date()
+        if options['end']:
+            try:
+                end = date.fromisoformat(options['end'])
+            except ValueError:
+                raise CommandError('--end must be YYYY-MM-DD')
+
+        size = dataset_size(options['scale'], options['years'])
+        self.stdout.write(f"Generating {size['days']} days x ~{size['transactions_per_day']} transactions/day...")
+        started = time.perf_counter()
+        try:
+            counts = generate_dataset(
+                scale=options['scale'], years=options['years'], seed=options['seed'], end=end,
+                batch_size=options['batch_size'], replace=options['replace'],
+            )
+        except DatasetError as error:
+            raise CommandError(str(error))
+        elapsed = time.perf_counter() - started
+
+        for name, count in counts.items():
+            self.stdout.write(f'  {name}: {count}')
+        rate = counts['transactions'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Generated {counts['transactions']} transactions in {elapsed:.2f}s ({rate:.0f} rows/s)"))
@@ -1,46 +1,31 @@
-from django.core.management.base import BaseCommand
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from datetime import timedelta
-from budget.models import RecurringTransaction, Transaction, Payee
+from budget.recurring import generate_due
 
 class Command(BaseCommand):
     help = 'Generate recurring transactions'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--today', help='Generate as of this date (YYYY-MM-DD) instead of today')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be generated without writing')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
     def handle(self, *args, **options):
         today = timezone.now().date()
-        recurrings = RecurringTransaction.objects.filter(is_active=True, next_run_date__lte=today)
-        for rec in recurrings:
-            if rec.end_date and rec.next_run_date > rec.end_date:
-                rec.is_active = False
-                rec.save()
-                continue
-
-            # Create transaction
-            transaction = Transaction(
-                date=rec.next_run_date,
-                kind=rec.kind,
-                amount=rec.amount,
-                currency=rec.currency,
-                category=rec.category,
-                description=rec.description,
-                payment_method=rec.payment_method,
-                account_from=rec.account_from,
-                account_to=rec.account_to,
-                payee=rec.payee,
-            )
-            transaction.save()
+        if options['today']:
+            try:
+                today = date.fromisoformat(options['today'])
+            except ValueError:
+                raise CommandError('--today must be YYYY-MM-DD')
 
-            # Update next_run_date
-            if rec.frequency == 'SEMANAL':
-                rec.next_run_date += timedelta(weeks=1)
-            elif rec.frequency == 'QUINCENAL':
-                rec.next_run_date += timedelta(days=15)
-            elif rec.frequency == 'MENSUAL':
-                # Add one month
-                if rec.next_run_date.month == 12:
-                    rec.next_run_date = rec.next_run_date.replace(year=rec.next_run_date.year + 1, month=1)
-                else:
-                    rec.next_run_date = rec.next_run_date.replace(month=rec.next_run_date.month + 1)
-            rec.save()
+        result = generate_due(today, dry_run=options['dry_run'], batch_size=options['batch_size'])
 
-            self.stdout.write(self.style.SUCCESS(f'Created transaction for {rec} on {rec.next_run_date}'))
\ No newline at end of file
+        for rec, day, message in result.errors:
+            self.stderr.write(f'{rec} on {day}: {message}')
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.created} transactions for {result.schedules} schedules '
+            f'({result.skipped} already emitted, {result.deactivated} finished) '
+            f'in {result.elapsed:.2f}s ({result.rate:.0f} transactions/s)'
+        ))
@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from budget.importers import ImportRowError, TransactionImporter, read_csv, read_ofx
+
+class Command(BaseCommand):
+    help = 'Import transactions from a CSV or OFX bank statement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with header) or OFX file')
+        parser.add_argument('--format', choices=['csv', 'ofx'], help='Defaults to the file extension')
+        parser.add_argument('--account', help='Account name or id the OFX statement belongs to')
+        parser.add_argument('--payment-method', default='TRANSFERENCIA', help='Payment method for OFX rows')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--encoding', default='utf-8')
+        parser.add_argument('--dry-run', action='store_true', help='Validate without inserting')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('ofx' if path.lower().endswith(('.ofx', '.qfx')) else 'csv')
+        if file_format == 'ofx' and not options['account']:
+            raise CommandError('--account is required for OFX files')
+
+        importer = TransactionImporter(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        started = time.perf_counter()
+        try:
+            with open(path, newline='', encoding=options['encoding']) as handle:
+                if file_format == 'ofx':
+                    rows = read_ofx(handle, options['account'], options['payment_method'])
+                else:
+                    rows = read_csv(handle)
+                created = importer.run(rows)
+        except (OSError, ImportRowError) as error:
+            raise CommandError(str(error))
+        elapsed = time.perf_counter() - started
+
+        for line_num, message in importer.errors:
+            self.stderr.write(f'Line {line_num}: {message}')
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        rate = created / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f'{verb} {created} transactions in {elapsed:.2f}s ({rate:.0f} rows/s), {len(importer.errors)} errors'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from budget import ledger, rollups, statements
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the materialized account balances, monthly and daily rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only compare the derived tables with the raw ledger')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            ledger.rebuild_balances()
+            self.stdout.write(self.style.SUCCESS('Rebuilt account balances'))
+            count = rollups.rebuild_rollups()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} monthly rollup rows'))
+            count = rollups.rebuild_daily_rollups()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} daily rollup rows'))
+            count = statements.reset_statements()
+            self.stdout.write(self.style.SUCCESS(f'Dropped {count} stored card statements (rebuilt on next read)'))
+            ledger.rebuild_state()
+
+        errors = 0
+        for account_id, stored, expected in ledger.verify_balances():
+            self.stdout.write(self.style.ERROR(f'Account {account_id}: stored {stored}, expected {expected}'))
+            errors += 1
+        for key, stored, expected in rollups.verify_rollups():
+            self.stdout.write(self.style.ERROR(f'Rollup {key}: stored {stored}, expected {expected}'))
+            errors += 1
+        for key, stored, expected in rollups.verify_daily_rollups():
+            self.stdout.write(self.style.ERROR(f'Daily rollup {key}: stored {stored}, expected {expected}'))
+            errors += 1
+        if errors:
+            raise CommandError(f'{errors} derived row(s) out of sync')
+        self.stdout.write(self.style.SUCCESS('Derived ledger tables are consistent'))
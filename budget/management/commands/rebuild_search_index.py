@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from budget import search
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the full-text index over transaction descriptions, payees and categories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only compare the index with the transactions table')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            count = search.rebuild_index()
+            self.stdout.write(self.style.SUCCESS(f'Indexed {count} transactions'))
+
+        stale = search.verify_index()
+        if stale:
+            shown = ', '.join(str(pk) for pk in stale[:20])
+            raise CommandError(f"{len(stale)} transaction(s) out of sync with the search index: {shown}{'...' if len(stale) > 20 else ''}")
+        self.stdout.write(self.style.SUCCESS('Search index is consistent'))
@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from newfinance.database import refresh_replica, replica_alias
+
+class Command(BaseCommand):
+    help = 'Copy the primary database into the dashboard read replica (SQLite online backup)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Keep refreshing every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        if not replica_alias():
+            raise CommandError('No read replica configured (set BUDGET_SQLITE_REPLICA)')
+        while True:
+            started = time.perf_counter()
+            pages = refresh_replica()
+            self.stdout.write(self.style.SUCCESS(f'Copied {pages} pages in {time.perf_counter() - started:.2f}s'))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
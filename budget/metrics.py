@@ -0,0 +1,213 @@
+"""
+Dashboard metrics computed in a single database pass.
+
+``period_metrics`` returns, for each currency, the INGRESO and GASTO totals
+plus the external transfers into and out of our accounts. The dashboard
+counts external transfers as income/expenses, the summary API does not, so
+both views derive their figures from the same components.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Max, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+
+from . import rollups
+from .models import Account, ExchangeRate, Transaction
+
+CURRENCIES = [code for code, _ in Account.CURRENCIES]
+
+COMPONENTS = {
+    'income': Q(kind='INGRESO'),
+    'expenses': Q(kind='GASTO'),
+    'external_in': Q(kind='TRANSFERENCIA_EXTERNA', account_to__isnull=False),
+    'external_out': Q(kind='TRANSFERENCIA_EXTERNA', account_from__isnull=False),
+}
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+MICRO = Decimal('0.000001')
+
+UNCATEGORIZED = 'Sin Categoría'
+
+# amount (2 dp) * usd_to_pen (4 dp) is exact at 6 dp; SQLite computes in
+# floating point, so rounding the sums back to 6 dp restores the Decimal result.
+CONVERTED = DecimalField(max_digits=21, decimal_places=6)
+
+
+def period_metrics(start_date, end_date, queryset=None):
+    """Income, expenses, external flows and savings per currency for valid rows in the range."""
+    if queryset is None:
+        queryset = Transaction.objects.all()
+    aggregates = {
+        f'{currency}_{name}': Sum('amount', filter=condition & Q(currency=currency))
+        for currency in CURRENCIES
+        for name, condition in COMPONENTS.items()
+    }
+    totals = queryset.filter(date__range=(start_date, end_date), is_valid=True).aggregate(**aggregates)
+
+    metrics = {}
+    for currency in CURRENCIES:
+        # SQLite sums decimals in floating point; round back to cents
+        values = {name: (totals[f'{currency}_{name}'] or ZERO).quantize(CENT) for name in COMPONENTS}
+        values['total_income'] = values['income'] + values['external_in']
+        values['total_expenses'] = values['expenses'] + values['external_out']
+        values['savings'] = values['total_income'] - values['total_expenses']
+        metrics[currency] = values
+    return metrics
+
+
+def currency_balances():
+    """Current balance per currency; PEN credit lines are not counted as cash."""
+    balances = {currency: ZERO for currency in CURRENCIES}
+    for account in Account.objects.select_related('ledger'):
+        if account.currency == 'PEN' and account.type == 'CREDITO':
+            continue
+        balances[account.currency] += account.balance
+    return balances
+
+
+def as_of_rate():
+    """Latest usd_to_pen on or before the outer row's date (NULL when there is none)."""
+    return Subquery(
+        ExchangeRate.objects.filter(date__lte=OuterRef('date')).order_by('-date').values('usd_to_pen')[:1]
+    )
+
+
+def amount_in_pen():
+    return Case(
+        When(currency='PEN', then=F('amount')),
+        default=Coalesce(F('amount') * as_of_rate(), F('amount')),
+        output_field=CONVERTED,
+    )
+
+
+def expenses_by_category(start_date, end_date, mode='original'):
+    """Valid GASTO totals per category name, optionally converted to PEN, in one query.
+
+    Categories are ordered by their most recent expense, matching the
+    order a newest-first scan of the rows would produce.
+    """
+    amount = F('amount') if mode == 'original' else amount_in_pen()
+    rows = (
+        Transaction.objects.filter(date__range=(start_date, end_date), kind='GASTO', is_valid=True)
+        .values('category__name')
+        .annotate(total=Sum(amount, output_field=CONVERTED), last_date=Max('date'))
+        .order_by('-last_date', 'category__name')
+    )
+    data = {}
+    for row in rows:
+        name = row['category__name'] or UNCATEGORIZED
+        data[name] = data.get(name, ZERO) + row['total'].quantize(MICRO)
+    return data
+
+
+def month_bounds(day):
+    start = day.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def last_12_months(today):
+    # Month starts of the last 12 months, oldest to newest
+    months = []
+    for i in range(11, -1, -1):
+        months.append((today - timedelta(days=30*i)).replace(day=1))
+    return months
+
+
+# JSON payloads shared by the single-widget APIs and the dashboard bundle
+
+def summary_payload(totals):
+    return {
+        'pen_income': float(totals['PEN']['income']),
+        'pen_expenses': float(totals['PEN']['expenses']),
+        'usd_income': float(totals['USD']['income']),
+        'usd_expenses': float(totals['USD']['expenses']),
+    }
+
+
+def netflow_payload(months, flows):
+    # Net flow (income - expenses) per month, chronological order
+    data = []
+    for month_start in months:
+        pen_income = rollups.flow_total(flows, month_start, 'PEN', 'INGRESO') + rollups.flow_total(flows, month_start, 'PEN', 'TRANSFERENCIA_EXTERNA', has_to=True)
+        pen_expense = rollups.flow_total(flows, month_start, 'PEN', 'GASTO') + rollups.flow_total(flows, month_start, 'PEN', 'TRANSFERENCIA_EXTERNA', has_from=True)
+        usd_income = rollups.flow_total(flows, month_start, 'USD', 'INGRESO')
+        usd_expense = rollups.flow_total(flows, month_start, 'USD', 'GASTO')
+        data.append({
+            'month': month_start.strftime('%Y-%m'),
+            'pen': float(pen_income - pen_expense),
+            'usd': float(usd_income - usd_expense),
+        })
+    return data
+
+
+def income_expenses_payload(months, flows):
+    # Income and expenses per month, chronological order
+    data = []
+    for month_start in months:
+        data.append({
+            'month': month_start.strftime('%Y-%m'),
+            'pen_income': float(rollups.flow_total(flows, month_start, 'PEN', 'INGRESO', valid_only=False)),
+            'pen_expense': float(rollups.flow_total(flows, month_start, 'PEN', 'GASTO', valid_only=False)),
+            'usd_income': float(rollups.flow_total(flows, month_start, 'USD', 'INGRESO', valid_only=False)),
+            'usd_expense': float(rollups.flow_total(flows, month_start, 'USD', 'GASTO', valid_only=False)),
+        })
+    return data
+
+
+def categories_payload(data):
+    return {name: float(total) for name, total in data.items()}
+
+
+def actual_vs_budget_payload(budget):
+    """Targets against the actual income/expenses of the budget's own window and currency.
+
+    ``budget`` must come from a ``rollups.with_actuals`` queryset.
+    """
+    actual_income = budget.actual_income
+    actual_expenses = budget.actual_expenses
+    return {
+        'target_income': float(budget.target_income),
+        'actual_income': float(actual_income),
+        'target_expenses': float(budget.target_expenses),
+        'actual_expenses': float(actual_expenses),
+        'target_savings': float(budget.target_savings),
+        'actual_savings': float(actual_income - actual_expenses),
+    }
+
+
+BUNDLE_WIDGETS = ('summary', 'netflow', 'income_expenses', 'expenses_by_category', 'actual_vs_budget')
+
+
+def bundle_queries(widgets, start_date, end_date, today, mode='original'):
+    """Independent queries behind the requested widgets, as ``{name: (func, *args)}``.
+
+    netflow and income_expenses share one monthly_flows pass; the
+    actual_vs_budget figures come annotated on the budget itself.
+    """
+    queries = {}
+    if 'summary' in widgets:
+        queries['totals'] = (period_metrics, start_date, end_date)
+    if 'netflow' in widgets or 'income_expenses' in widgets:
+        queries['flows'] = (rollups.monthly_flows, last_12_months(today))
+    if 'expenses_by_category' in widgets:
+        queries['categories'] = (expenses_by_category, start_date, end_date, mode)
+    return queries
+
+
+def bundle_payload(widgets, start_date, end_date, queries, results, budget=None):
+    data = {'start': start_date.isoformat(), 'end': end_date.isoformat()}
+    if 'summary' in widgets:
+        data['summary'] = summary_payload(results['totals'])
+    if 'flows' in results:
+        months = queries['flows'][1]
+        if 'netflow' in widgets:
+            data['netflow'] = netflow_payload(months, results['flows'])
+        if 'income_expenses' in widgets:
+            data['income_expenses'] = income_expenses_payload(months, results['flows'])
+    if 'expenses_by_category' in widgets:
+        data['expenses_by_category'] = categories_payload(results['categories'])
+    if budget is not None:
+        data['actual_vs_budget'] = actual_vs_budget_payload(budget)
+    return data
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:10
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_balances(apps, schema_editor):
+    Account = apps.get_model('budget', 'Account')
+    AccountBalance = apps.get_model('budget', 'AccountBalance')
+    Transaction = apps.get_model('budget', 'Transaction')
+    valid = Transaction.objects.filter(is_valid=True)
+
+    def totals(queryset, field):
+        return {row[field]: row['total'] for row in queryset.values(field).annotate(total=Sum('amount'))}
+
+    inflows = totals(valid.exclude(kind='GASTO'), 'account_to')
+    outflows = totals(valid.exclude(kind='INGRESO'), 'account_from')
+    used = totals(valid.filter(kind='GASTO', payment_method='TARJETA_CREDITO'), 'account_from')
+    paid = totals(valid.filter(kind='PAGO_TARJETA'), 'account_to')
+    zero = Decimal('0.00')
+    AccountBalance.objects.bulk_create([
+        AccountBalance(
+            account_id=account_id,
+            net_flow=inflows.get(account_id, zero) - outflows.get(account_id, zero),
+            credit_used=used.get(account_id, zero) - paid.get(account_id, zero),
+        )
+        for account_id in Account.objects.values_list('id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0003_alter_recurringtransaction_kind_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalance',
+            fields=[
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger', serialize=False, to='budget.account')),
+                ('net_flow', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('credit_used', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+            ],
+            options={
+                'verbose_name': 'Saldo de Cuenta',
+                'verbose_name_plural': 'Saldos de Cuenta',
+            },
+        ),
+        migrations.RunPython(populate_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:11
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rollups(apps, schema_editor):
+    MonthlyRollup = apps.get_model('budget', 'MonthlyRollup')
+    Transaction = apps.get_model('budget', 'Transaction')
+    fields = ('effective_period', 'currency', 'kind', 'is_valid', 'category', 'account_from', 'account_to')
+    rows = Transaction.objects.values(*fields).annotate(total=Sum('amount'), count=Count('id')).order_by()
+    MonthlyRollup.objects.bulk_create([
+        MonthlyRollup(
+            effective_period=row['effective_period'],
+            currency=row['currency'],
+            kind=row['kind'],
+            is_valid=row['is_valid'],
+            category_id=row['category'],
+            account_from_id=row['account_from'],
+            account_to_id=row['account_to'],
+            total=row['total'],
+            count=row['count'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0004_accountbalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('effective_period', models.DateField()),
+                ('currency', models.CharField(choices=[('PEN', 'PEN'), ('USD', 'USD')], max_length=3)),
+                ('kind', models.CharField(choices=[('INGRESO', 'Ingreso'), ('GASTO', 'Gasto'), ('TRANSFERENCIA', 'Transferencia'), ('PAGO_TARJETA', 'Pago de Tarjeta'), ('TRANSFERENCIA_EXTERNA', 'Transf. Externa')], max_length=25)),
+                ('is_valid', models.BooleanField()),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=17)),
+                ('count', models.IntegerField(default=0)),
+                ('account_from', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='budget.account')),
+                ('account_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='budget.account')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='budget.category')),
+            ],
+            options={
+                'verbose_name': 'Resumen Mensual',
+                'verbose_name_plural': 'Resúmenes Mensuales',
+                'indexes': [models.Index(fields=['effective_period', 'currency', 'kind'], name='budget_mont_effecti_39d002_idx')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0005_monthlyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date', 'is_valid', 'currency', 'kind', 'amount'], name='txn_date_valid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['currency', 'kind', 'date', 'is_valid'], name='txn_currency_kind_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['kind', 'date', 'is_valid'], name='txn_kind_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['effective_period', 'kind', 'is_valid'], name='txn_period_kind_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account_to', 'kind', 'is_valid', 'amount'], name='txn_account_to_flow_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['account_from', 'kind', 'is_valid', 'amount'], name='txn_account_from_flow_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0007_transaction_date_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('recurring', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='budget.recurringtransaction')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='budget.transaction')),
+            ],
+            options={
+                'verbose_name': 'Ocurrencia Recurrente',
+                'verbose_name_plural': 'Ocurrencias Recurrentes',
+                'constraints': [models.UniqueConstraint(fields=('recurring', 'date'), name='unique_recurring_occurrence')],
+            },
+        ),
+    ]
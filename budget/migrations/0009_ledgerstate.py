@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:20
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def create_state(apps, schema_editor):
+    LedgerState = apps.get_model('budget', 'LedgerState')
+    Transaction = apps.get_model('budget', 'Transaction')
+    totals = Transaction.objects.aggregate(count=Count('id'), max_id=Max('id'))
+    LedgerState.objects.create(pk=1, transaction_count=totals['count'], max_transaction_id=totals['max_id'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0008_recurringoccurrence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('max_transaction_id', models.PositiveBigIntegerField(default=0)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('last_write', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Estado del Libro',
+                'verbose_name_plural': 'Estado del Libro',
+            },
+        ),
+        migrations.RunPython(create_state, migrations.RunPython.noop),
+    ]
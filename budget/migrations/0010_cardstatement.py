@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:05
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0009_ledgerstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('due_date', models.DateField()),
+                ('opening_balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('charges', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('payments', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('closing_balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statements', to='budget.account')),
+            ],
+            options={
+                'verbose_name': 'Estado de Cuenta',
+                'verbose_name_plural': 'Estados de Cuenta',
+                'ordering': ['account', 'period_end'],
+                'constraints': [models.UniqueConstraint(fields=('account', 'period_end'), name='unique_card_statement')],
+            },
+        ),
+    ]
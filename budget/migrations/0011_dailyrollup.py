@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:30
+
+from collections import defaultdict
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_daily_rollups(apps, schema_editor):
+    DailyRollup = apps.get_model('budget', 'DailyRollup')
+    Transaction = apps.get_model('budget', 'Transaction')
+    rows = (
+        Transaction.objects.filter(is_valid=True).values('currency', 'kind', 'date')
+        .annotate(total=Sum('amount')).order_by('currency', 'kind', 'date')
+    )
+    running = defaultdict(lambda: Decimal('0.00'))
+    rollups = []
+    for row in rows:
+        total = row['total'].quantize(Decimal('0.01'))
+        running[row['currency'], row['kind']] += total
+        rollups.append(DailyRollup(
+            date=row['date'], currency=row['currency'], kind=row['kind'],
+            total=total, cumulative=running[row['currency'], row['kind']],
+        ))
+    DailyRollup.objects.bulk_create(rollups, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0010_cardstatement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('currency', models.CharField(choices=[('PEN', 'PEN'), ('USD', 'USD')], max_length=3)),
+                ('kind', models.CharField(choices=[('INGRESO', 'Ingreso'), ('GASTO', 'Gasto'), ('TRANSFERENCIA', 'Transferencia'), ('PAGO_TARJETA', 'Pago de Tarjeta'), ('TRANSFERENCIA_EXTERNA', 'Transf. Externa')], max_length=25)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=17)),
+                ('cumulative', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=17)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario',
+                'verbose_name_plural': 'Resúmenes Diarios',
+                'constraints': [models.UniqueConstraint(fields=('currency', 'kind', 'date'), name='unique_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(populate_daily_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:12
+
+from django.db import migrations
+
+# Keep in sync with budget/search.py
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE budget_transaction_fts USING fts5(
+    description, payee, category,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+# Triggers rather than signals, so bulk_create and queryset updates are indexed too.
+# SQLite drops them when a migration remakes budget_transaction; recreate them there.
+CREATE_TRIGGERS = [
+    """
+    CREATE TRIGGER budget_transaction_fts_insert AFTER INSERT ON budget_transaction BEGIN
+        INSERT INTO budget_transaction_fts (rowid, description, payee, category) VALUES (
+            new.id, new.description,
+            (SELECT name FROM budget_payee WHERE id = new.payee_id),
+            (SELECT name FROM budget_category WHERE id = new.category_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER budget_transaction_fts_update AFTER UPDATE OF description, payee_id, category_id ON budget_transaction BEGIN
+        UPDATE budget_transaction_fts SET
+            description = new.description,
+            payee = (SELECT name FROM budget_payee WHERE id = new.payee_id),
+            category = (SELECT name FROM budget_category WHERE id = new.category_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER budget_transaction_fts_delete AFTER DELETE ON budget_transaction BEGIN
+        DELETE FROM budget_transaction_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER budget_payee_fts_rename AFTER UPDATE OF name ON budget_payee BEGIN
+        UPDATE budget_transaction_fts SET payee = new.name
+        WHERE rowid IN (SELECT id FROM budget_transaction WHERE payee_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER budget_category_fts_rename AFTER UPDATE OF name ON budget_category BEGIN
+        UPDATE budget_transaction_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM budget_transaction WHERE category_id = new.id);
+    END
+    """,
+]
+
+POPULATE = """
+INSERT INTO budget_transaction_fts (rowid, description, payee, category)
+SELECT t.id, t.description, p.name, c.name
+FROM budget_transaction t
+LEFT JOIN budget_payee p ON p.id = t.payee_id
+LEFT JOIN budget_category c ON c.id = t.category_id
+"""
+
+DROP = [
+    'DROP TRIGGER IF EXISTS budget_category_fts_rename',
+    'DROP TRIGGER IF EXISTS budget_payee_fts_rename',
+    'DROP TRIGGER IF EXISTS budget_transaction_fts_delete',
+    'DROP TRIGGER IF EXISTS budget_transaction_fts_update',
+    'DROP TRIGGER IF EXISTS budget_transaction_fts_insert',
+    'DROP TABLE IF EXISTS budget_transaction_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0011_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.RunSQL([CREATE_TABLE, *CREATE_TRIGGERS, POPULATE], DROP),
+    ]
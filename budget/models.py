@@ -1,8 +1,7 @@
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 from django.utils import timezone
-from django.db.models import Sum, F, Case, When, Value, DecimalField
 from django.core.exceptions import ValidationError
 
 # Create your models here.
@@ -80,35 +79,23 @@ class Account(models.Model):
 
     @property
     def balance(self):
-        # Calculate balance based on valid transactions
-        from django.db.models import Q
-        inflows = Transaction.objects.filter(
-            Q(kind='INGRESO', account_to=self) |
-            Q(kind='TRANSFERENCIA', account_to=self) |
-            Q(kind='PAGO_TARJETA', account_to=self) |
-            Q(kind='TRANSFERENCIA_EXTERNA', account_to=self),
-            is_valid=True
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-
-        outflows = Transaction.objects.filter(
-            Q(kind='GASTO', account_from=self) |
-            Q(kind='TRANSFERENCIA', account_from=self) |
-            Q(kind='PAGO_TARJETA', account_from=self) |
-            Q(kind='TRANSFERENCIA_EXTERNA', account_from=self),
-            is_valid=True
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-
-        return self.opening_balance + inflows - outflows
+        # Opening balance plus the net flow stored in the account ledger
+        # (maintained on every Transaction write, see budget/ledger.py)
+        return self.opening_balance + self._ledger_entry().net_flow
 
     @property
     def credit_used(self):
         if self.type != 'CREDITO':
             return Decimal('0.00')
-        # Sum of GASTO with payment_method=TARJETA_CREDITO from this account
-        # Minus sum of PAGO_TARJETA to this account
-        used = Transaction.objects.filter(account_from=self, kind='GASTO', payment_method='TARJETA_CREDITO', is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        paid = Transaction.objects.filter(account_to=self, kind='PAGO_TARJETA', is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        return used - paid
+        # GASTO with payment_method=TARJETA_CREDITO from this account
+        # minus PAGO_TARJETA to this account, as stored in the ledger
+        return self._ledger_entry().credit_used
+
+    def _ledger_entry(self):
+        try:
+            return self.ledger
+        except AccountBalance.DoesNotExist:
+            return AccountBalance(account=self)
 
     @property
     def available_credit(self):
@@ -124,6 +111,20 @@ class Account(models.Model):
         verbose_name_plural = "Cuentas"
 
 
+class AccountBalance(models.Model):
+    # Materialized running totals for an account, kept in sync by budget.ledger
+    account = models.OneToOneField(Account, on_delete=models.CASCADE, primary_key=True, related_name='ledger')
+    net_flow = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    credit_used = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f"{self.account.name}: {self.net_flow}"
+
+    class Meta:
+        verbose_name = "Saldo de Cuenta"
+        verbose_name_plural = "Saldos de Cuenta"
+
+
 class Transaction(models.Model):
     KINDS = [
         ('INGRESO', 'Ingreso'),
@@ -155,39 +156,28 @@ class Transaction(models.Model):
     payee = models.ForeignKey(Payee, on_delete=models.SET_NULL, null=True, blank=True)
 
     def clean(self):
-        if self.kind == 'GASTO':
-            if not self.account_from:
-                raise ValidationError("Los gastos requieren cuenta de origen.")
-            if self.account_to:
-                raise ValidationError("Los gastos no tienen cuenta de destino.")
-        elif self.kind == 'INGRESO':
-            if not self.account_to:
-                raise ValidationError("Los ingresos requieren cuenta de destino.")
-            if self.account_from:
-                raise ValidationError("Los ingresos no tienen cuenta de origen.")
-        elif self.kind == 'TRANSFERENCIA':
-            if not self.account_from or not self.account_to:
-                raise ValidationError("Las transferencias requieren cuenta de origen y destino.")
-            if self.account_from == self.account_to:
-                raise ValidationError("No se puede transferir a la misma cuenta.")
-        elif self.kind == 'PAGO_TARJETA':
-            if not self.account_from or not self.account_to:
-                raise ValidationError("Los pagos de tarjeta requieren cuenta de origen y destino.")
-            if self.account_to.type != 'CREDITO':
-                raise ValidationError("El destino debe ser una cuenta de crédito.")
-            if self.account_from.type == 'CREDITO':
-                raise ValidationError("El origen no puede ser una cuenta de crédito.")
-        elif self.kind == 'TRANSFERENCIA_EXTERNA':
-            if not ((self.account_from and not self.account_to) or (not self.account_from and self.account_to)):
-                raise ValidationError("Las transferencias externas requieren una cuenta interna (origen o destino) y un destinatario externo.")
-            if self.account_from and self.account_to:
-                raise ValidationError("Las transferencias externas no pueden tener ambas cuentas internas.")
+        from . import validation
+        # Kind and account rules, against the cached account metadata
+        validation.check_rules(self)
         # Effective period is first day of the month of date
         self.effective_period = self.date.replace(day=1)
 
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
+        from . import ledger, validation
+        # full_clean() minus its per-foreign-key queries
+        validation.validate(self)
+        with db_transaction.atomic():
+            previous = ledger.load_snapshots([self.pk]) if self.pk else []
+            super().save(*args, **kwargs)
+            ledger.apply_changes(previous, [ledger.snapshot(self)])
+
+    def delete(self, *args, **kwargs):
+        from . import ledger
+        with db_transaction.atomic():
+            previous = ledger.load_snapshots([self.pk])
+            result = super().delete(*args, **kwargs)
+            ledger.apply_changes(previous, [])
+        return result
 
     def __str__(self):
         return f"{self.get_kind_display()} - {self.amount} {self.currency} - {self.date}"
@@ -196,6 +186,101 @@ class Transaction(models.Model):
         verbose_name = "Transacción"
         verbose_name_plural = "Transacciones"
         ordering = ['-date']
+        indexes = [
+            # is_valid=True compiles to a bare column test, which SQLite cannot
+            # seek on, so it always follows the equality/range columns.
+            # Keyset pagination of the transactions page
+            models.Index(fields=['date', 'id'], name='txn_date_id_idx'),
+            # Dashboard KPIs: rows in a date range, split by currency/kind
+            models.Index(fields=['date', 'is_valid', 'currency', 'kind', 'amount'], name='txn_date_valid_idx'),
+            # Per-kind reports (expenses by category, income/expense series)
+            models.Index(fields=['currency', 'kind', 'date', 'is_valid'], name='txn_currency_kind_date_idx'),
+            models.Index(fields=['kind', 'date', 'is_valid'], name='txn_kind_date_idx'),
+            # Monthly reports keyed on effective_period
+            models.Index(fields=['effective_period', 'kind', 'is_valid'], name='txn_period_kind_idx'),
+            # Account balances: covering indexes for inflows and outflows
+            models.Index(fields=['account_to', 'kind', 'is_valid', 'amount'], name='txn_account_to_flow_idx'),
+            models.Index(fields=['account_from', 'kind', 'is_valid', 'amount'], name='txn_account_from_flow_idx'),
+        ]
+
+
+class LedgerState(models.Model):
+    # Single row fingerprint of the ledger, bumped by every write (budget.ledger)
+    transaction_count = models.PositiveIntegerField(default=0)
+    max_transaction_id = models.PositiveBigIntegerField(default=0)
+    version = models.PositiveBigIntegerField(default=0)
+    last_write = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"v{self.version}: {self.transaction_count} transacciones"
+
+    class Meta:
+        verbose_name = "Estado del Libro"
+        verbose_name_plural = "Estado del Libro"
+
+
+class MonthlyRollup(models.Model):
+    # Pre-aggregated Transaction totals per month, kept in sync by budget.ledger
+    effective_period = models.DateField()
+    currency = models.CharField(max_length=3, choices=Account.CURRENCIES)
+    kind = models.CharField(max_length=25, choices=Transaction.KINDS)
+    is_valid = models.BooleanField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    account_from = models.ForeignKey(Account, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    account_to = models.ForeignKey(Account, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    total = models.DecimalField(max_digits=17, decimal_places=2, default=Decimal('0.00'))
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.effective_period:%Y-%m} {self.kind} {self.currency}: {self.total}"
+
+    class Meta:
+        verbose_name = "Resumen Mensual"
+        verbose_name_plural = "Resúmenes Mensuales"
+        indexes = [models.Index(fields=['effective_period', 'currency', 'kind'])]
+
+
+class DailyRollup(models.Model):
+    # Valid Transaction totals per day with running (prefix) sums, kept in sync by budget.ledger
+    date = models.DateField()
+    currency = models.CharField(max_length=3, choices=Account.CURRENCIES)
+    kind = models.CharField(max_length=25, choices=Transaction.KINDS)
+    total = models.DecimalField(max_digits=17, decimal_places=2, default=Decimal('0.00'))
+    # Sum of total over every day up to and including this one
+    cumulative = models.DecimalField(max_digits=17, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f"{self.date} {self.kind} {self.currency}: {self.total}"
+
+    class Meta:
+        verbose_name = "Resumen Diario"
+        verbose_name_plural = "Resúmenes Diarios"
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'kind', 'date'], name='unique_daily_rollup'),
+        ]
+
+
+class CardStatement(models.Model):
+    # Closed billing cycle of a CREDITO account, stored once by budget.statements
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='statements')
+    period_start = models.DateField()
+    period_end = models.DateField()  # closing date
+    due_date = models.DateField()
+    opening_balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    charges = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    payments = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    closing_balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+
+    def __str__(self):
+        return f"{self.account.name}: {self.period_start} a {self.period_end}"
+
+    class Meta:
+        verbose_name = "Estado de Cuenta"
+        verbose_name_plural = "Estados de Cuenta"
+        ordering = ['account', 'period_end']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'period_end'], name='unique_card_statement'),
+        ]
 
 
 class RecurringTransaction(models.Model):
@@ -221,19 +306,9 @@ class RecurringTransaction(models.Model):
     next_run_date = models.DateField()
 
     def clean(self):
-        # Similar validations as Transaction
-        if self.kind == 'GASTO':
-            if not self.account_from:
-                raise ValidationError("Los gastos requieren cuenta de origen.")
-        elif self.kind == 'INGRESO':
-            if not self.account_to:
-                raise ValidationError("Los ingresos requieren cuenta de destino.")
-        elif self.kind == 'TRANSFERENCIA':
-            if not self.account_from or not self.account_to:
-                raise ValidationError("Las transferencias requieren cuenta de origen y destino.")
-        elif self.kind == 'PAGO_TARJETA':
-            if not self.account_from or not self.account_to:
-                raise ValidationError("Los pagos de tarjeta requieren cuenta de origen y destino.")
+        from . import validation
+        # Same kind and account rules as Transaction
+        validation.check_rules(self)
 
     def __str__(self):
         return f"Recurrente: {self.get_kind_display()} - {self.amount} {self.currency}"
@@ -243,6 +318,23 @@ class RecurringTransaction(models.Model):
         verbose_name_plural = "Transacciones Recurrentes"
 
 
+class RecurringOccurrence(models.Model):
+    # One row per emitted occurrence; makes generate_recurring idempotent
+    recurring = models.ForeignKey(RecurringTransaction, on_delete=models.CASCADE, related_name='occurrences')
+    date = models.DateField()
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    def __str__(self):
+        return f"{self.recurring} - {self.date}"
+
+    class Meta:
+        verbose_name = "Ocurrencia Recurrente"
+        verbose_name_plural = "Ocurrencias Recurrentes"
+        constraints = [
+            models.UniqueConstraint(fields=['recurring', 'date'], name='unique_recurring_occurrence'),
+        ]
+
+
 class BudgetPlan(models.Model):
     FREQUENCIES = [
         ('SEMANAL', 'Semanal'),
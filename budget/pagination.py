@@ -0,0 +1,83 @@
+"""
+Keyset (cursor) pagination over ``(date, id)``, newest first.
+
+Cursors look like ``2025-03-14_1234``: the date and id of the last row on
+the previous page (``after``) or the first row on the next page
+(``before``). Each page is one indexed range query no matter how deep the
+reader has paged.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(row):
+    return f'{row.date.isoformat()}_{row.id}'
+
+
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        day, pk = value.split('_', 1)
+        return date.fromisoformat(day), int(pk)
+    except ValueError:
+        return None
+
+
+def page_size_from(value):
+    default = getattr(settings, 'BUDGET_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    try:
+        size = int(value) if value else default
+    except ValueError:
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    def __init__(self, rows, next_cursor, previous_cursor, page_size):
+        self.rows = rows
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def keyset_page(queryset, after=None, before=None, page_size=None):
+    """Return a KeysetPage of ``queryset`` ordered by ``-date, -id``."""
+    page_size = page_size or page_size_from(None)
+    after = decode_cursor(after)
+    before = decode_cursor(before) if not after else None
+
+    if before:
+        day, pk = before
+        rows = list(
+            queryset.filter(Q(date__gt=day) | Q(date=day, id__gt=pk)).order_by('date', 'id')[:page_size + 1]
+        )
+        has_more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_previous, has_next = has_more, True
+    else:
+        if after:
+            day, pk = after
+            queryset = queryset.filter(Q(date__lt=day) | Q(date=day, id__lt=pk))
+        rows = list(queryset.order_by('-date', '-id')[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after is not None
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1]) if rows and has_next else None,
+        previous_cursor=encode_cursor(rows[0]) if rows and has_previous else None,
+        page_size=page_size,
+    )
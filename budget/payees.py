@@ -0,0 +1,155 @@
+"""
+Process-local prefix index of payee names for autocomplete.
+
+Every word of every name is a key (``'plaza vea'`` is found by ``pla`` and
+by ``ve``), normalized to lowercase without accents and kept in one sorted
+list, so a prefix is a ``bisect`` range. Suggestions are ranked by the
+payee's valid transactions in the last ``RECENT_DAYS``, then by all-time
+uses, then by name. The ranked lists of the short prefixes, whose ranges
+are the largest, are computed once per load.
+
+The index loads on the first lookup (one query) and reloads after
+``MAX_AGE`` seconds so the recency window slides. New payees and new
+transactions are added in place through the signals in budget/signals.py;
+renames and deletes invalidate it.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Payee
+
+RECENT_DAYS = 180
+MAX_AGE = 60 * 60
+MAX_SUGGESTIONS = 20
+# Prefixes up to this length have their ranked lists precomputed
+PRECOMPUTED = 2
+END = '\U0010ffff'
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+def word_keys(name):
+    """The normalized name from the start of each of its words."""
+    words = normalize(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+def prefixes(key):
+    return [key[:length] for length in range(min(len(key), PRECOMPUTED) + 1)]
+
+
+class PayeeIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None  # sorted (key, payee_id)
+        self._names = {}
+        self._uses = {}  # payee_id -> [recent, total]
+        self._top = {}  # short prefix -> payee ids, best first
+        self._loaded_at = 0.0
+        self.loads = 0
+
+    def rank(self, payee_id):
+        recent, total = self._uses[payee_id]
+        return (-recent, -total, self._names[payee_id].casefold(), payee_id)
+
+    def load(self):
+        since = timezone.now().date() - timedelta(days=RECENT_DAYS)
+        valid = Q(transaction__is_valid=True)
+        rows = Payee.objects.annotate(
+            recent=Count('transaction', filter=valid & Q(transaction__date__gte=since)),
+            total=Count('transaction', filter=valid),
+        ).values_list('id', 'name', 'recent', 'total')
+        names = {}
+        uses = {}
+        keys = []
+        for payee_id, name, recent, total in rows:
+            names[payee_id] = name
+            uses[payee_id] = [recent, total]
+            keys.extend((key, payee_id) for key in word_keys(name))
+        keys.sort()
+        with self._lock:
+            self._names = names
+            self._uses = uses
+            self._top = {}
+            for payee_id in sorted(names, key=self.rank):
+                for key in word_keys(names[payee_id]):
+                    for prefix in prefixes(key):
+                        top = self._top.setdefault(prefix, [])
+                        if len(top) < MAX_SUGGESTIONS and payee_id not in top:
+                            top.append(payee_id)
+            self._keys = keys
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._keys = None
+
+    def _ensure_loaded(self):
+        if self._keys is None or time.monotonic() - self._loaded_at > MAX_AGE:
+            self.load()
+        return self._keys
+
+    def _promote(self, payee_id):
+        # Re-rank payee_id in the precomputed lists of its prefixes (lock held)
+        for key in word_keys(self._names[payee_id]):
+            for prefix in prefixes(key):
+                top = self._top.setdefault(prefix, [])
+                if payee_id in top:
+                    top.remove(payee_id)
+                top.append(payee_id)
+                top.sort(key=self.rank)
+                del top[MAX_SUGGESTIONS:]
+
+    def add(self, payee):
+        """Index a new payee (a no-op until the index is loaded)."""
+        with self._lock:
+            if self._keys is None or payee.pk in self._names:
+                return
+            self._names[payee.pk] = payee.name
+            self._uses[payee.pk] = [0, 0]
+            for key in word_keys(payee.name):
+                insort(self._keys, (key, payee.pk))
+            self._promote(payee.pk)
+
+    def record_use(self, payee_id):
+        """Count a new transaction of ``payee_id`` as a recent use."""
+        with self._lock:
+            if self._keys is None or payee_id not in self._uses:
+                return
+            self._uses[payee_id][0] += 1
+            self._uses[payee_id][1] += 1
+            self._promote(payee_id)
+
+    def suggest(self, query, limit=10):
+        """Up to ``limit`` (payee_id, name) pairs whose words start with ``query``, best first."""
+        keys = self._ensure_loaded()
+        prefix = normalize(query)
+        limit = min(limit, MAX_SUGGESTIONS)
+        if len(prefix) <= PRECOMPUTED:
+            ids = self._top.get(prefix, [])[:limit]
+        else:
+            start = bisect_left(keys, (prefix,))
+            stop = bisect_left(keys, (prefix + END,), start)
+            ids = heapq.nsmallest(limit, {payee_id for _, payee_id in keys[start:stop]}, key=self.rank)
+        return [(payee_id, self._names[payee_id]) for payee_id in ids]
+
+    def stats(self):
+        return {
+            'size': len(self._names) if self._keys is not None else 0,
+            'loaded': self._keys is not None,
+            'loads': self.loads,
+        }
+
+
+payee_index = PayeeIndex()
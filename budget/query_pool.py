@@ -0,0 +1,49 @@
+"""
+Bounded thread pool for running independent read queries concurrently.
+
+Django's async ORM methods hop onto a single shared thread, so awaiting
+several of them still runs the queries one after another. The async
+dashboard views hand their independent aggregations to this pool instead;
+each worker thread keeps its own database connection, and the pool size
+(``BUDGET_QUERY_WORKERS``) caps how many of them exist.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BUDGET_QUERY_WORKERS', 4),
+            thread_name_prefix='budget-query',
+        )
+    return _executor
+
+
+def _run(func, *args):
+    # Worker connections outlive requests; drop them once stale or broken
+    close_old_connections()
+    return func(*args)
+
+
+async def gather(calls):
+    """Run ``(func, *args)`` calls concurrently and return their results in order."""
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    # Each call runs in a copy of the caller's context, like sync_to_async
+    return await asyncio.gather(*(
+        loop.run_in_executor(executor, partial(contextvars.copy_context().run, _run, *call)) for call in calls
+    ))
+
+
+async def run(func, *args):
+    [result] = await gather([(func, *args)])
+    return result
@@ -0,0 +1,228 @@
+"""
+Monthly and daily rollups of Transaction totals.
+
+Monthly rows are keyed by (effective_period, currency, kind, is_valid,
+category, account_from, account_to) and updated incrementally by
+budget.ledger, so period reports read a handful of rollup rows instead of
+scanning Transaction.
+
+Daily rows hold the valid totals per (currency, kind, date) together with
+their running sum, so the total over any date window is the difference of
+two prefix rows (see ``with_actuals``).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import BooleanField, Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import DailyRollup, MonthlyRollup, Transaction
+
+KEY_FIELDS = ('effective_period', 'currency', 'kind', 'is_valid', 'category_id', 'account_from_id', 'account_to_id')
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+
+def rollup_key(row):
+    return tuple(row[field] for field in KEY_FIELDS)
+
+
+def rollup_deltas(rows, sign=1, deltas=None):
+    # key -> [total delta, count delta]
+    if deltas is None:
+        deltas = defaultdict(lambda: [ZERO, 0])
+    for row in rows:
+        delta = deltas[rollup_key(row)]
+        delta[0] += Decimal(row['amount']) * sign
+        delta[1] += sign
+    return deltas
+
+
+def apply_rollup_deltas(deltas):
+    for key, (total, count) in deltas.items():
+        if not total and not count:
+            continue
+        lookup = dict(zip(KEY_FIELDS, key))
+        # Category deletion (SET_NULL) can leave two rows for one key; always
+        # update the oldest so the totals still add up.
+        pk = MonthlyRollup.objects.filter(**lookup).order_by('pk').values_list('pk', flat=True).first()
+        if pk is None:
+            MonthlyRollup.objects.create(total=total, count=count, **lookup)
+        else:
+            MonthlyRollup.objects.filter(pk=pk).update(total=F('total') + total, count=F('count') + count)
+
+
+def monthly_flows(periods):
+    """Totals per (period, currency, kind, validity, direction) in a single query."""
+    rows = list(
+        MonthlyRollup.objects.filter(effective_period__in=set(periods))
+        .annotate(
+            has_from=ExpressionWrapper(Q(account_from__isnull=False), output_field=BooleanField()),
+            has_to=ExpressionWrapper(Q(account_to__isnull=False), output_field=BooleanField()),
+        )
+        .values('effective_period', 'currency', 'kind', 'is_valid', 'has_from', 'has_to')
+        .annotate(total=Sum('total'))
+        .order_by()
+    )
+    # SQLite sums decimals in floating point; round back to cents
+    for row in rows:
+        row['total'] = row['total'].quantize(CENT)
+    return rows
+
+
+def flow_total(flows, period, currency, kind, valid_only=True, **direction):
+    """Sum ``monthly_flows`` rows matching the given period, currency and kind."""
+    return sum(
+        (row['total'] for row in flows
+         if row['effective_period'] == period and row['currency'] == currency and row['kind'] == kind
+         and (row['is_valid'] or not valid_only)
+         and all(row[name] == value for name, value in direction.items())),
+        ZERO,
+    )
+
+
+def compute_rollups():
+    """Aggregate the raw ledger into rollup totals (one GROUP BY query)."""
+    fields = [field.removesuffix('_id') for field in KEY_FIELDS]
+    rows = Transaction.objects.values(*fields).annotate(total=Sum('amount'), count=Count('id')).order_by()
+    return {tuple(row[field] for field in fields): (row['total'].quantize(CENT), row['count']) for row in rows}
+
+
+def stored_rollups():
+    totals = defaultdict(lambda: [ZERO, 0])
+    for row in MonthlyRollup.objects.values(*KEY_FIELDS, 'total', 'count'):
+        entry = totals[rollup_key(row)]
+        entry[0] += row['total']
+        entry[1] += row['count']
+    return {key: tuple(value) for key, value in totals.items() if value[0] or value[1]}
+
+
+def rebuild_rollups():
+    totals = compute_rollups()
+    with db_transaction.atomic():
+        MonthlyRollup.objects.all().delete()
+        MonthlyRollup.objects.bulk_create([
+            MonthlyRollup(total=total, count=count, **dict(zip(KEY_FIELDS, key)))
+            for key, (total, count) in totals.items()
+        ], batch_size=500)
+    return len(totals)
+
+
+def verify_rollups():
+    """Return a list of (key, stored, expected) tuples that disagree with Transaction."""
+    expected = compute_rollups()
+    stored = stored_rollups()
+    mismatches = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        if stored.get(key) != expected.get(key):
+            mismatches.append((key, stored.get(key), expected.get(key)))
+    return mismatches
+
+
+def daily_deltas(rows, sign=1, deltas=None):
+    # (currency, kind) -> {date: total delta}; only valid rows are rolled up
+    if deltas is None:
+        deltas = defaultdict(lambda: defaultdict(lambda: ZERO))
+    for row in rows:
+        if row['is_valid']:
+            deltas[row['currency'], row['kind']][row['date']] += Decimal(row['amount']) * sign
+    return deltas
+
+
+def apply_daily_deltas(deltas):
+    for (currency, kind), days in deltas.items():
+        days = {day: delta for day, delta in days.items() if delta}
+        if not days:
+            continue
+        series = DailyRollup.objects.filter(currency=currency, kind=kind)
+        first, last = min(days), max(days)
+        running = series.filter(date__lt=first).order_by('-date').values_list('cumulative', flat=True).first() or ZERO
+        # Rewrite the days between the first and last change; later days only shift
+        existing = list(series.filter(date__range=(first, last)).order_by('date'))
+        stored = {row.date for row in existing}
+        created = [DailyRollup(currency=currency, kind=kind, date=day) for day in days if day not in stored]
+        for row in sorted(existing + created, key=lambda row: row.date):
+            row.total += days.get(row.date, ZERO)
+            running += row.total
+            row.cumulative = running
+        if created:
+            DailyRollup.objects.bulk_create(created)
+        if existing:
+            DailyRollup.objects.bulk_update(existing, ['total', 'cumulative'])
+        series.filter(date__gt=last).update(cumulative=F('cumulative') + sum(days.values()))
+
+
+def compute_daily_rollups():
+    """(currency, kind, date) -> (total, cumulative) from the raw ledger (one GROUP BY query)."""
+    rows = (
+        Transaction.objects.filter(is_valid=True).values('currency', 'kind', 'date')
+        .annotate(total=Sum('amount')).order_by('currency', 'kind', 'date')
+    )
+    running = defaultdict(lambda: ZERO)
+    totals = {}
+    for row in rows:
+        total = row['total'].quantize(CENT)
+        running[row['currency'], row['kind']] += total
+        totals[row['currency'], row['kind'], row['date']] = (total, running[row['currency'], row['kind']])
+    return totals
+
+
+def rebuild_daily_rollups():
+    totals = compute_daily_rollups()
+    with db_transaction.atomic():
+        DailyRollup.objects.all().delete()
+        DailyRollup.objects.bulk_create([
+            DailyRollup(currency=currency, kind=kind, date=day, total=total, cumulative=cumulative)
+            for (currency, kind, day), (total, cumulative) in totals.items()
+        ], batch_size=500)
+    return len(totals)
+
+
+def verify_daily_rollups():
+    """Return a list of (key, stored, expected) tuples that disagree with Transaction."""
+    expected = compute_daily_rollups()
+    stored = {
+        (row['currency'], row['kind'], row['date']): (row['total'], row['cumulative'])
+        for row in DailyRollup.objects.values('currency', 'kind', 'date', 'total', 'cumulative')
+    }
+    mismatches = []
+    running = {}
+    for key in sorted(set(expected) | set(stored)):
+        if key in expected:
+            want = expected[key]
+        else:
+            # A day whose rows all went away keeps a zero total; its prefix must still be right
+            want = (ZERO, running.get(key[:2], ZERO))
+        running[key[:2]] = want[1]
+        if stored.get(key) != want:
+            mismatches.append((key, stored.get(key), want))
+    return mismatches
+
+
+def prefix_sum(kind, **bound):
+    """Running total of ``kind`` in the outer row's currency at the last day matching ``bound``."""
+    return Coalesce(
+        Subquery(
+            DailyRollup.objects.filter(currency=OuterRef('currency'), kind=kind, **bound)
+            .order_by('-date').values('cumulative')[:1]
+        ),
+        Value(ZERO),
+    )
+
+
+def with_actuals(plans):
+    """Annotate BudgetPlan rows with ``actual_income`` and ``actual_expenses``.
+
+    Each actual is two prefix-row lookups on the daily rollup (the running
+    total at period_end minus the one before period_start) in the plan's
+    currency, so any number of plans costs one query.
+    """
+    actuals = {}
+    for name, kind in (('actual_income', 'INGRESO'), ('actual_expenses', 'GASTO')):
+        actuals[name] = ExpressionWrapper(
+            prefix_sum(kind, date__lte=OuterRef('period_end')) - prefix_sum(kind, date__lt=OuterRef('period_start')),
+            output_field=DecimalField(max_digits=17, decimal_places=2),
+        )
+    return plans.annotate(**actuals)
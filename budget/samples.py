@@ -0,0 +1,114 @@
+"""
+Representative requests for every budget URL, shared by the query-budget
+tests and the bench commands.
+
+``sample_request`` gives one request per URL name (GET for pages and APIs).
+``write_requests`` gives the form POSTs of the pages that also write. Every
+sample targets rows of a fixed shape in a ``generate_dataset`` ledger, so its
+query count does not depend on the ledger's size.
+"""
+from datetime import timedelta
+
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import metrics, urls
+from .datasets import PAYEES
+from .models import Account, BudgetPlan, Transaction
+
+# Pages whose form POSTs create or edit rows, and the labels of their samples
+WRITE_VIEWS = {
+    'transactions': ('create', 'edit'),
+    'accounts': ('create', 'edit'),
+    'budgets': ('create',),
+    'exchange_rates': ('save',),
+}
+
+
+def url_names():
+    return [pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern) and pattern.name]
+
+
+def sample_transaction(is_valid=True):
+    # A card expense with category and payee
+    return (
+        Transaction.objects.filter(kind='GASTO', payment_method='TARJETA_CREDITO', is_valid=is_valid)
+        .exclude(category=None).exclude(payee=None).select_related('category', 'payee').order_by('id').first()
+    )
+
+
+def sample_request(name):
+    """(method, path, params) of a representative request to the ``name`` URL."""
+    start, end = metrics.month_bounds(timezone.now().date())
+    period = {'start': start.isoformat(), 'end': end.isoformat()}
+    budget_id = BudgetPlan.objects.filter(frequency='MENSUAL', period_start=start).values_list('id', flat=True).first()
+    if name.endswith(('invalidate_transaction', 'delete_transaction', 'bulk_invalidate', 'bulk_delete')):
+        # delete only removes invalidated rows. Always pick the same shape of
+        # row so the query count is stable.
+        transaction_id = sample_transaction(is_valid='invalidate' in name).id
+        if name.startswith('api_'):
+            return 'POST', reverse(name), {'ids': str(transaction_id)}
+        return 'POST', reverse(name, args=[transaction_id]), {}
+    if name == 'api_account_statements':
+        card = Account.objects.filter(type='CREDITO').order_by('id').values_list('id', flat=True).first()
+        return 'GET', reverse(name, args=[card]), {}
+    if name == 'api_account_balance_history':
+        account = Account.objects.order_by('id').values_list('id', flat=True).first()
+        return 'GET', reverse(name, args=[account]), {'start': (end - timedelta(days=3 * 365)).isoformat(), 'end': end.isoformat()}
+    if name == 'api_transactions_search':
+        return 'GET', reverse(name), {'q': f'{PAYEES[0][:3]}*', 'start': (end - timedelta(days=365)).isoformat()}
+    if name == 'api_payees_suggest':
+        return 'GET', reverse(name), {'q': PAYEES[0][:3]}
+    if name.startswith('api_dashboard_actual_vs_budget'):
+        return 'GET', reverse(name), {'budget_id': budget_id}
+    if name.startswith('api_dashboard_bundle'):
+        return 'GET', reverse(name), {**period, 'widgets': ','.join(metrics.BUNDLE_WIDGETS), 'budget_id': budget_id}
+    if name.startswith(('api_dashboard_summary', 'api_dashboard_expenses_by_category')):
+        return 'GET', reverse(name), period
+    if name == 'export_transactions':
+        return 'GET', reverse(name), {'format': 'csv', **period}
+    return 'GET', reverse(name), {}
+
+
+def transaction_form(transaction):
+    return {
+        'kind': transaction.kind,
+        'date': transaction.date.isoformat(),
+        'amount': str(transaction.amount),
+        'currency': transaction.currency,
+        'category': str(transaction.category_id or ''),
+        'description': transaction.description,
+        'payment_method': transaction.payment_method,
+        'account_from': str(transaction.account_from_id or ''),
+        'account_to': str(transaction.account_to_id or ''),
+        'payee': transaction.payee.name if transaction.payee else '',
+    }
+
+
+def write_requests(name):
+    """{label: (method, path, params)} of the form POSTs of the ``name`` page."""
+    today = timezone.now().date()
+    path = reverse(name)
+    if name == 'transactions':
+        edited = sample_transaction()
+        created = transaction_form(edited)
+        created.update(date=today.isoformat(), description='Compra de prueba')
+        changed = transaction_form(edited)
+        changed.update(transaction_id=str(edited.id), amount=str(edited.amount + 1))
+        return {'create': ('POST', path, created), 'edit': ('POST', path, changed)}
+    if name == 'accounts':
+        cash = Account.objects.filter(type='EFECTIVO').order_by('id').first()
+        account = {'name': 'Caja chica', 'type': 'EFECTIVO', 'currency': 'PEN', 'opening_balance': '50.00'}
+        edit = {'account_id': str(cash.id), 'name': cash.name, 'type': 'EFECTIVO', 'currency': cash.currency,
+                'opening_balance': str(cash.opening_balance + 1)}
+        return {'create': ('POST', path, account), 'edit': ('POST', path, edit)}
+    if name == 'budgets':
+        start, end = metrics.month_bounds(today.replace(day=28) + timedelta(days=7))
+        return {'create': ('POST', path, {
+            'frequency': 'MENSUAL', 'period_start': start.isoformat(), 'period_end': end.isoformat(), 'currency': 'PEN',
+            'target_income': '5000.00', 'target_expenses': '3500.00', 'savings_rate': '10.00',
+        })}
+    if name == 'exchange_rates':
+        # The generated ledger has a rate for every day, so this is an update
+        return {'save': ('POST', path, {'date': today.isoformat(), 'usd_to_pen': '3.7500'})}
+    return {}
@@ -0,0 +1,126 @@
+"""
+Full-text search over transactions with SQLite FTS5.
+
+``budget_transaction_fts`` (see migration 0012) holds each transaction's
+description, payee name and category name under the transaction's id as
+rowid. Triggers keep it in sync with inserts, updates, deletes and payee or
+category renames, bulk writes included; ``rebuild_index`` refills it from
+scratch.
+
+User queries are parsed into a safe MATCH expression: every word must
+appear, ``word*`` matches a prefix and ``"two words"`` a phrase. Accents and
+case are ignored.
+"""
+import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction as db_transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABLE = 'budget_transaction_fts'
+
+# Query-string parameters understood by search_transactions
+FILTERS = ('q', 'start', 'end', 'account', 'min_amount', 'max_amount')
+
+TERMS = re.compile(r'"([^"]*)"|(\S+)')
+WORD = re.compile(r'\w+')
+
+
+def match_expression(query):
+    """FTS5 MATCH string for a user query, or None when it has no searchable words."""
+    terms = []
+    for phrase, word in TERMS.findall(query):
+        if phrase:
+            words = WORD.findall(phrase)
+            if words:
+                terms.append('"' + ' '.join(words) + '"')
+            continue
+        # Punctuation would be FTS5 syntax; keep the words it separates
+        parts = [f'"{part}"' for part in WORD.findall(word)]
+        if parts and word.endswith('*'):
+            parts[-1] += '*'
+        terms.extend(parts)
+    return ' '.join(terms) or None
+
+
+def matching_ids(expression):
+    return RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s', [expression])
+
+
+class SearchFilterError(ValueError):
+    pass
+
+
+def search_transactions(queryset, q=None, start=None, end=None, account=None, min_amount=None, max_amount=None):
+    """Narrow ``queryset`` to rows matching ``q`` and the filters; arguments are raw strings."""
+    expression = match_expression(q or '')
+    if expression:
+        queryset = queryset.filter(id__in=matching_ids(expression))
+    try:
+        if start:
+            queryset = queryset.filter(date__gte=date.fromisoformat(start))
+        if end:
+            queryset = queryset.filter(date__lte=date.fromisoformat(end))
+    except ValueError:
+        raise SearchFilterError('start and end must be YYYY-MM-DD')
+    if account:
+        if not account.isdigit():
+            raise SearchFilterError('account must be an account id')
+        queryset = queryset.filter(Q(account_from_id=account) | Q(account_to_id=account))
+    try:
+        if min_amount:
+            queryset = queryset.filter(amount__gte=Decimal(min_amount))
+        if max_amount:
+            queryset = queryset.filter(amount__lte=Decimal(max_amount))
+    except InvalidOperation:
+        raise SearchFilterError('min_amount and max_amount must be numbers')
+    return queryset
+
+
+def result_payload(transaction):
+    return {
+        'id': transaction.id,
+        'date': transaction.date.isoformat(),
+        'kind': transaction.kind,
+        'amount': float(transaction.amount),
+        'currency': transaction.currency,
+        'description': transaction.description,
+        'payee': transaction.payee.name if transaction.payee else None,
+        'category': transaction.category.name if transaction.category else None,
+        'account_from': transaction.account_from_id,
+        'account_to': transaction.account_to_id,
+        'is_valid': transaction.is_valid,
+    }
+
+
+def rebuild_index():
+    """Refill the index from the transactions table; returns the number of rows indexed."""
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, description, payee, category) '
+            'SELECT t.id, t.description, p.name, c.name FROM budget_transaction t '
+            'LEFT JOIN budget_payee p ON p.id = t.payee_id '
+            'LEFT JOIN budget_category c ON c.id = t.category_id'
+        )
+        count = cursor.rowcount
+        # Merge the index b-trees left behind by incremental updates
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return count
+
+
+def verify_index():
+    """Return the ids of transactions whose index row is missing, stale or orphaned."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT t.id FROM budget_transaction t '
+            'LEFT JOIN budget_payee p ON p.id = t.payee_id '
+            'LEFT JOIN budget_category c ON c.id = t.category_id '
+            f'LEFT JOIN {TABLE} f ON f.rowid = t.id '
+            'WHERE f.rowid IS NULL OR f.description IS NOT t.description '
+            'OR f.payee IS NOT p.name OR f.category IS NOT c.name '
+            f'UNION SELECT rowid FROM {TABLE} WHERE rowid NOT IN (SELECT id FROM budget_transaction)'
+        )
+        return sorted(row[0] for row in cursor.fetchall())
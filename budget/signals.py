@@ -0,0 +1,54 @@
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import ledger
+from .cache import bump_ledger_version
+from .models import Account, BudgetPlan, Category, ExchangeRate, Payee, Transaction
+from .payees import payee_index
+from .validation import account_directory
+
+
+@receiver([post_save, post_delete], sender=Account)
+def invalidate_account_directory(sender, **kwargs):
+    account_directory.invalidate()
+    db_transaction.on_commit(account_directory.invalidate)
+
+
+@receiver(post_save, sender=Payee)
+def index_payee(sender, instance, created, **kwargs):
+    if created:
+        db_transaction.on_commit(lambda: payee_index.add(instance))
+    else:
+        # Renamed: its word keys changed
+        db_transaction.on_commit(payee_index.invalidate)
+
+
+@receiver(post_delete, sender=Payee)
+def drop_payee(sender, **kwargs):
+    db_transaction.on_commit(payee_index.invalidate)
+
+
+@receiver(post_save, sender=Transaction)
+def count_payee_use(sender, instance, created, **kwargs):
+    # Edits and invalidations only reach the ranking on the next reload
+    if created and instance.payee_id and instance.is_valid:
+        db_transaction.on_commit(lambda: payee_index.record_use(instance.payee_id))
+
+
+@receiver([post_save, post_delete], sender=Transaction)
+@receiver([post_save, post_delete], sender=ExchangeRate)
+@receiver([post_save, post_delete], sender=Account)
+@receiver([post_save, post_delete], sender=BudgetPlan)
+def invalidate_dashboard_cache(sender, **kwargs):
+    bump_ledger_version()
+
+
+# Transaction writes go through ledger.apply_changes, which records them itself
+@receiver([post_save, post_delete], sender=ExchangeRate)
+@receiver([post_save, post_delete], sender=Account)
+@receiver([post_save, post_delete], sender=BudgetPlan)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Payee)
+def touch_ledger_state(sender, **kwargs):
+    ledger.touch_state()
@@ -0,0 +1,188 @@
+"""
+Credit card statements per billing cycle.
+
+A cycle closes on the account's ``billing_cycle_day`` (clamped to short
+months) and is due on the first ``due_day`` after the close. Closed cycles
+are stored once as CardStatement rows, each opening with the previous
+closing balance; only the open cycle is aggregated live. Writes that touch
+a closed cycle (see ``ledger.apply_changes``) drop the stored statements
+from that cycle on, and they are rebuilt on the next read.
+
+Charges and payments follow the ledger's credit_used rules: valid GASTO
+paid with TARJETA_CREDITO from the card, and valid PAGO_TARJETA to it.
+"""
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+
+from .models import CardStatement, Transaction
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+
+def closing_date(year, month, cycle_day):
+    return date(year, month, min(cycle_day, calendar.monthrange(year, month)[1]))
+
+
+def next_month(day):
+    return (day.year + 1, 1) if day.month == 12 else (day.year, day.month + 1)
+
+
+def previous_month(day):
+    return (day.year - 1, 12) if day.month == 1 else (day.year, day.month - 1)
+
+
+def cycle_for(account, day):
+    """(start, close) of the billing cycle of ``account`` that contains ``day``."""
+    close = closing_date(day.year, day.month, account.billing_cycle_day)
+    if day > close:
+        close = closing_date(*next_month(day), account.billing_cycle_day)
+    start = closing_date(*previous_month(close), account.billing_cycle_day) + timedelta(days=1)
+    return start, close
+
+
+def due_date(account, close):
+    due = closing_date(close.year, close.month, account.due_day)
+    if due <= close:
+        due = closing_date(*next_month(close), account.due_day)
+    return due
+
+
+def has_cycle(account):
+    return account.type == 'CREDITO' and bool(account.billing_cycle_day) and bool(account.due_day)
+
+
+def card_rows(account_id):
+    return Transaction.objects.filter(is_valid=True).filter(
+        Q(account_from_id=account_id, kind='GASTO', payment_method='TARJETA_CREDITO')
+        | Q(account_to_id=account_id, kind='PAGO_TARJETA')
+    )
+
+
+CARD_TOTALS = {
+    'charges': Sum('amount', filter=Q(kind='GASTO')),
+    'payments': Sum('amount', filter=Q(kind='PAGO_TARJETA')),
+}
+
+
+def cents(value):
+    # SQLite sums decimals in floating point; round back to cents
+    return (value or ZERO).quantize(CENT)
+
+
+def close_cycles(account, today):
+    """Store every cycle of ``account`` closed before ``today``; return the latest stored statement."""
+    last = CardStatement.objects.filter(account=account).order_by('-period_end').first()
+    if last is not None and (
+        (last.period_start, last.period_end) != cycle_for(account, last.period_end)
+        or last.due_date != due_date(account, last.period_end)
+    ):
+        # The cycle or due day changed since these were stored
+        CardStatement.objects.filter(account=account).delete()
+        last = None
+    open_start, _ = cycle_for(account, today)
+    if last is not None:
+        first_start = last.period_end + timedelta(days=1)
+    else:
+        first_day = card_rows(account.pk).filter(date__lt=open_start).order_by('date').values_list('date', flat=True).first()
+        if first_day is None:
+            return None
+        first_start, _ = cycle_for(account, first_day)
+    if first_start >= open_start:
+        return last
+
+    # One pass over the missing cycles, bucketed by day in Python
+    daily = (
+        card_rows(account.pk).filter(date__gte=first_start, date__lt=open_start)
+        .values('date').annotate(**CARD_TOTALS).order_by('date')
+    )
+    totals = {row['date']: row for row in daily}
+    balance = last.closing_balance if last is not None else ZERO
+    statements = []
+    start = first_start
+    while start < open_start:
+        _, close = cycle_for(account, start)
+        charges = payments = ZERO
+        day = start
+        while day <= close:
+            if day in totals:
+                charges += cents(totals[day]['charges'])
+                payments += cents(totals[day]['payments'])
+            day += timedelta(days=1)
+        statement = CardStatement(
+            account=account, period_start=start, period_end=close, due_date=due_date(account, close),
+            opening_balance=balance, charges=charges, payments=payments,
+            closing_balance=balance + charges - payments,
+        )
+        statements.append(statement)
+        balance = statement.closing_balance
+        start = close + timedelta(days=1)
+    # A concurrent reader may have stored the same cycles already
+    CardStatement.objects.bulk_create(statements, ignore_conflicts=True)
+    return statements[-1]
+
+
+def open_statement(account, today, last=None):
+    """Unsaved statement for the cycle containing ``today``, aggregated live."""
+    start, close = cycle_for(account, today)
+    totals = card_rows(account.pk).filter(date__range=(start, today)).aggregate(**CARD_TOTALS)
+    opening = last.closing_balance if last is not None else ZERO
+    charges = cents(totals['charges'])
+    payments = cents(totals['payments'])
+    return CardStatement(
+        account=account, period_start=start, period_end=close, due_date=due_date(account, close),
+        opening_balance=opening, charges=charges, payments=payments,
+        closing_balance=opening + charges - payments,
+    )
+
+
+def account_statements(account, today, start=None, end=None):
+    """Stored statements overlapping [start, end] plus the open cycle, oldest first."""
+    last = close_cycles(account, today)
+    stored = CardStatement.objects.filter(account=account)
+    if start:
+        stored = stored.filter(period_end__gte=start)
+    if end:
+        stored = stored.filter(period_start__lte=end)
+    statements = [(statement, False) for statement in stored.order_by('period_end')]
+    current = open_statement(account, today, last)
+    if (not start or current.period_end >= start) and (not end or current.period_start <= end):
+        statements.append((current, True))
+    return statements
+
+
+def statement_payload(statement, is_open=False):
+    return {
+        'period_start': statement.period_start.isoformat(),
+        'period_end': statement.period_end.isoformat(),
+        'due_date': statement.due_date.isoformat(),
+        'opening_balance': float(statement.opening_balance),
+        'charges': float(statement.charges),
+        'payments': float(statement.payments),
+        'closing_balance': float(statement.closing_balance),
+        'open': is_open,
+    }
+
+
+def invalidate_rows(rows):
+    """Drop stored statements from the earliest cycle any changed card row falls in."""
+    earliest = {}
+    for row in rows:
+        if row['kind'] == 'GASTO' and row['payment_method'] == 'TARJETA_CREDITO':
+            account_id = row['account_from_id']
+        elif row['kind'] == 'PAGO_TARJETA':
+            account_id = row['account_to_id']
+        else:
+            continue
+        if account_id and (account_id not in earliest or row['date'] < earliest[account_id]):
+            earliest[account_id] = row['date']
+    for account_id, day in earliest.items():
+        CardStatement.objects.filter(account_id=account_id, period_end__gte=day).delete()
+
+
+def reset_statements():
+    """Drop every stored statement; they are rebuilt lazily on the next read."""
+    return CardStatement.objects.all().delete()[0]
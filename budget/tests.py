@@ -1,7 +1,29 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+import django.test
+from django.contrib.auth.models import User
+from django.contrib.messages import constants as message_levels, get_messages
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from datetime import date, timedelta
 from decimal import Decimal
-from .models import Account, Transaction, BudgetPlan
+from unittest import mock
+from urllib.parse import urlencode
+from . import cache, datasets, history, ledger, metrics, recurring, rollups, samples, search, statements, validation
+from .models import Account, AccountBalance, CardStatement, Category, LedgerState, ExchangeRate, Payee, RecurringOccurrence, RecurringTransaction, Transaction, BudgetPlan
+from .payees import payee_index
+from newfinance import database, instrumentation
 
 class AccountTestCase(TestCase):
     def test_credit_account_validation(self):
@@ -45,6 +67,105 @@ class TransactionTestCase(TestCase):
         with self.assertRaises(ValidationError):
             transaction.full_clean()
 
+class TransactionValidationTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.card = Account.objects.create(
+            name='Tarjeta', type='CREDITO', currency='PEN', credit_limit=Decimal('1000.00'), billing_cycle_day=15, due_day=30,
+        )
+        self.category = Category.objects.create(name='Comida')
+        self.payee = Payee.objects.create(name='Tottus')
+
+    def build(self, kind, **accounts):
+        return Transaction(
+            date=date(2025, 1, 10), effective_period=date(2025, 1, 1), kind=kind, amount=Decimal('10.00'), currency='PEN',
+            description='Mov', payment_method='EFECTIVO', category=self.category, payee=self.payee, **accounts,
+        )
+
+    def test_save_does_not_look_up_related_rows(self):
+        validation.account_directory.load()
+        with CaptureQueriesContext(connection) as queries:
+            self.build('GASTO', account_from=self.cash).save()
+            self.build('PAGO_TARJETA', account_from_id=self.cash.pk, account_to_id=self.card.pk).save()
+        lookups = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and any(
+            table in q['sql'].split(' WHERE ')[0] for table in ('"budget_account"', '"budget_category"', '"budget_payee"')
+        )]
+        self.assertEqual(lookups, [])
+
+    def test_validate_many_checks_a_batch_in_one_pass(self):
+        rows = [
+            self.build('GASTO', account_from=self.cash),
+            self.build('PAGO_TARJETA', account_from=self.card, account_to=self.cash),
+            self.build('TRANSFERENCIA', account_from=self.cash, account_to=self.cash),
+            self.build('INGRESO', account_to_id=10 ** 6),
+            self.build('TRANSFERENCIA_EXTERNA', account_from=self.cash),
+        ]
+        rows[0].amount = Decimal('0.00')
+        validation.account_directory.load()
+        # Only the unknown account id makes the directory reload
+        with self.assertNumQueries(1):
+            errors = validation.validate_many(rows)
+        self.assertEqual([position for position, _ in errors], [0, 1, 2, 3])
+        self.assertEqual(errors[1][1].messages, ['El destino debe ser una cuenta de crédito.'])
+        self.assertEqual(errors[3][1].messages, [f'La cuenta {10 ** 6} no existe.'])
+
+    def test_account_changes_reach_the_directory(self):
+        payment = self.build('PAGO_TARJETA', account_from=self.cash, account_to=self.card)
+        validation.validate(payment)
+        self.card.type = 'DEBITO'
+        self.card.savings_amount = Decimal('1.00')
+        self.card.save()
+        with self.assertRaises(ValidationError):
+            validation.validate(payment)
+
+    def test_directory_reloads_changes_made_elsewhere(self):
+        payment = self.build('PAGO_TARJETA', account_from=self.cash, account_to=self.card)
+        validation.account_directory.load()
+        # Another process changes the type: no signal reaches this directory
+        Account.objects.filter(pk=self.card.pk).update(type='DEBITO')
+        validation.validate(payment)
+        later = time.monotonic() + validation.MAX_AGE + 1
+        with mock.patch('budget.validation.time.monotonic', return_value=later):
+            with self.assertRaises(ValidationError):
+                validation.validate(payment)
+
+    def test_transactions_page_creates_and_edits(self):
+        form = {
+            'kind': 'GASTO', 'date': '2025-01-10', 'amount': '25.00', 'currency': 'PEN', 'description': 'Mercado',
+            'payment_method': 'EFECTIVO', 'category': str(self.category.pk), 'account_from': str(self.cash.pk), 'account_to': '',
+            'payee': 'Tottus',
+        }
+        validation.account_directory.load()
+        loads = validation.account_directory.loads
+        response = self.client.post(reverse('transactions'), form, follow=True)
+        self.assertEqual([str(message) for message in response.context['messages']], ['Transacción creada exitosamente.'])
+        transaction = Transaction.objects.get()
+        self.assertEqual((transaction.account_from_id, transaction.amount), (self.cash.pk, Decimal('25.00')))
+
+        form.update(transaction_id=str(transaction.pk), kind='PAGO_TARJETA', account_to=str(self.card.pk), payment_method='TRANSFERENCIA')
+        response = self.client.post(reverse('transactions'), form, follow=True)
+        self.assertEqual([str(message) for message in response.context['messages']], ['Transacción actualizada exitosamente.'])
+        transaction.refresh_from_db()
+        self.assertEqual((transaction.kind, transaction.account_to_id), ('PAGO_TARJETA', self.card.pk))
+        # Form ids were matched against the directory without reloading it
+        self.assertEqual(validation.account_directory.loads, loads)
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('-25.00'))
+
+    def test_recurring_schedules_share_the_rules(self):
+        schedule = RecurringTransaction(
+            kind='GASTO', amount=Decimal('10.00'), currency='PEN', description='Suscripción', payment_method='EFECTIVO',
+            account_from=self.cash, account_to=self.card, frequency='MENSUAL', start_date=date(2025, 1, 1), next_run_date=date(2025, 1, 1),
+        )
+        with self.assertRaises(ValidationError):
+            schedule.full_clean()
+        schedule.save()
+        result = recurring.generate_due(date(2025, 1, 31))
+        self.assertEqual(result.created, 0)
+        self.assertEqual(result.errors[0][2], 'Los gastos no tienen cuenta de destino.')
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.next_run_date, date(2025, 1, 1))
+
+
 class BudgetPlanTestCase(TestCase):
     def test_budget_validation(self):
         budget = BudgetPlan(
@@ -61,3 +182,1126 @@ class BudgetPlanTestCase(TestCase):
         budget.savings_rate = Decimal('110.00')
         with self.assertRaises(ValidationError):
             budget.full_clean()
+
+class AccountLedgerTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN', opening_balance=Decimal('100.00'))
+        self.card = Account.objects.create(
+            name='Tarjeta', type='CREDITO', currency='PEN',
+            credit_limit=Decimal('1000.00'), billing_cycle_day=15, due_day=30
+        )
+
+    def make(self, **kwargs):
+        values = dict(date=date(2025, 1, 10), effective_period=date(2025, 1, 1), currency='PEN', description='Mov', payment_method='EFECTIVO')
+        values.update(kwargs)
+        transaction = Transaction(**values)
+        transaction.save()
+        return transaction
+
+    def test_balance_follows_writes(self):
+        income = self.make(kind='INGRESO', amount=Decimal('50.00'), account_to=self.cash)
+        expense = self.make(kind='GASTO', amount=Decimal('30.00'), account_from=self.cash)
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('120.00'))
+
+        expense.amount = Decimal('40.00')
+        expense.save()
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('110.00'))
+
+        income.is_valid = False
+        income.save()
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('60.00'))
+
+        income.delete()
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('60.00'))
+        self.assertEqual(ledger.verify_balances(), [])
+
+    def test_credit_used_and_rebuild(self):
+        self.make(kind='GASTO', amount=Decimal('200.00'), account_from=self.card, payment_method='TARJETA_CREDITO')
+        self.make(kind='PAGO_TARJETA', amount=Decimal('75.00'), account_from=self.cash, account_to=self.card, payment_method='TRANSFERENCIA')
+        card = Account.objects.select_related('ledger').get(pk=self.card.pk)
+        self.assertEqual(card.credit_used, Decimal('125.00'))
+        self.assertEqual(card.available_credit, Decimal('875.00'))
+
+        AccountBalance.objects.filter(account=self.card).update(credit_used=Decimal('0.00'))
+        self.assertEqual(len(ledger.verify_balances()), 1)
+        ledger.rebuild_balances()
+        self.assertEqual(ledger.verify_balances(), [])
+        self.assertEqual(Account.objects.get(pk=self.card.pk).credit_used, Decimal('125.00'))
+
+class BulkOperationsTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.card = Account.objects.create(
+            name='Tarjeta', type='CREDITO', currency='PEN',
+            credit_limit=Decimal('1000.00'), billing_cycle_day=15, due_day=30
+        )
+        self.food = Category.objects.create(name='Alimentación')
+        self.lunch = self.make(date(2025, 1, 5), '35.00', 'Almuerzo', category=self.food)
+        self.taxi = self.make(date(2025, 1, 9), '12.00', 'Taxi')
+        self.dinner = self.make(date(2025, 2, 3), '80.00', 'Cena', account_from=self.card, payment_method='TARJETA_CREDITO')
+
+    def make(self, day, amount, description, **kwargs):
+        values = dict(
+            date=day, effective_period=day.replace(day=1), kind='GASTO', amount=Decimal(amount), currency='PEN',
+            description=description, payment_method='EFECTIVO', account_from=self.cash,
+        )
+        values.update(kwargs)
+        transaction = Transaction(**values)
+        transaction.save()
+        return transaction
+
+    def assertConsistent(self):
+        self.assertEqual(ledger.verify_balances(), [])
+        self.assertEqual(rollups.verify_rollups(), [])
+        self.assertEqual(rollups.verify_daily_rollups(), [])
+        self.assertEqual(search.verify_index(), [])
+        state = ledger.current_state()
+        self.assertEqual(state.transaction_count, Transaction.objects.count())
+
+    def post(self, name, **data):
+        return self.client.post(reverse(name), data)
+
+    def test_invalidate_by_ids_and_by_filter(self):
+        response = self.post('api_transactions_bulk_invalidate', ids=f'{self.lunch.pk},{self.dinner.pk}')
+        self.assertEqual(response.json(), {'invalidated': 2})
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('-12.00'))
+        self.assertEqual(Account.objects.select_related('ledger').get(pk=self.card.pk).credit_used, Decimal('0.00'))
+        self.assertConsistent()
+
+        # Already invalid rows are not counted again
+        response = self.post('api_transactions_bulk_invalidate', start='2025-01-01', end='2025-01-31')
+        self.assertEqual(response.json(), {'invalidated': 1})
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('0.00'))
+        self.assertConsistent()
+
+    def test_delete_only_removes_invalidated_rows(self):
+        schedule = RecurringTransaction.objects.create(
+            kind='GASTO', amount=Decimal('12.00'), currency='PEN', description='Taxi', payment_method='EFECTIVO',
+            account_from=self.cash, frequency='MENSUAL', start_date=date(2025, 1, 9), next_run_date=date(2025, 2, 9),
+        )
+        occurrence = RecurringOccurrence.objects.create(recurring=schedule, date=date(2025, 1, 9), transaction=self.taxi)
+        ledger.bulk_invalidate(Transaction.objects.filter(pk__in=[self.lunch.pk, self.taxi.pk]))
+
+        response = self.post('api_transactions_bulk_delete', start='2025-01-01')
+        self.assertEqual(response.json(), {'deleted': 2})
+        self.assertEqual(list(Transaction.objects.values_list('pk', flat=True)), [self.dinner.pk])
+        occurrence.refresh_from_db()
+        self.assertIsNone(occurrence.transaction)
+        self.assertConsistent()
+
+    def test_bulk_delete_knows_every_relation_to_transaction(self):
+        # bulk_delete bypasses the delete collector and handles these by hand
+        relations = {
+            (field.related_model, field.field.name, field.on_delete.__name__)
+            for field in Transaction._meta.get_fields(include_hidden=True) if field.auto_created and not field.concrete
+        }
+        self.assertEqual(relations, {(RecurringOccurrence, 'transaction', 'SET_NULL')})
+
+    def test_delete_sends_no_signal_per_row(self):
+        ledger.bulk_invalidate(Transaction.objects.all())
+        version = cache.ledger_version()
+        self.assertEqual(ledger.bulk_delete(Transaction.objects.all()), 3)
+        # One bump from apply_changes, whatever the number of rows
+        self.assertEqual(cache.ledger_version(), version + 1)
+        self.assertConsistent()
+
+    def test_requires_a_selection(self):
+        self.assertEqual(self.post('api_transactions_bulk_delete').status_code, 400)
+        self.assertEqual(self.post('api_transactions_bulk_invalidate', ids='1,dos').status_code, 400)
+        self.assertEqual(self.post('api_transactions_bulk_invalidate', min_amount='mucho').status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_transactions_bulk_invalidate'), {'ids': self.lunch.pk}).status_code, 405)
+        self.assertTrue(Transaction.objects.get(pk=self.lunch.pk).is_valid)
+
+    def test_admin_actions(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+        changelist = reverse('admin:budget_transaction_changelist')
+        choices = self.client.get(changelist).context['action_form'].fields['action'].choices
+        self.assertNotIn('delete_selected', [name for name, _ in choices])
+        selected = [self.lunch.pk, self.taxi.pk]
+        self.client.post(changelist, {'action': 'invalidate_selected', '_selected_action': selected})
+        self.assertEqual(Transaction.objects.filter(is_valid=False).count(), 2)
+        self.client.post(changelist, {'action': 'delete_invalidated', '_selected_action': selected + [self.dinner.pk]})
+        self.assertEqual(list(Transaction.objects.values_list('pk', flat=True)), [self.dinner.pk])
+        self.assertConsistent()
+
+class MonthlyRollupTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.today = timezone.now().date()
+
+    def make(self, **kwargs):
+        values = dict(date=self.today, effective_period=self.today.replace(day=1), currency='PEN', description='Mov', payment_method='EFECTIVO')
+        values.update(kwargs)
+        transaction = Transaction(**values)
+        transaction.save()
+        return transaction
+
+    def test_12m_endpoints_read_rollup(self):
+        self.make(kind='INGRESO', amount=Decimal('500.00'), account_to=self.cash)
+        self.make(kind='GASTO', amount=Decimal('120.00'), account_from=self.cash)
+        self.make(kind='TRANSFERENCIA_EXTERNA', amount=Decimal('30.00'), account_from=self.cash)
+        invalid = self.make(kind='GASTO', amount=Decimal('10.00'), account_from=self.cash)
+        invalid.is_valid = False
+        invalid.save()
+
+        with self.assertNumQueries(2):
+            netflow = self.client.get(reverse('api_dashboard_netflow_12m')).json()
+        self.assertEqual(netflow[-1]['pen'], 350.0)
+
+        with self.assertNumQueries(2):
+            income_expenses = self.client.get(reverse('api_dashboard_income_expenses_12m')).json()
+        # income_expenses_12m has always included invalidated rows
+        self.assertEqual(income_expenses[-1]['pen_expense'], 130.0)
+        self.assertEqual(rollups.verify_rollups(), [])
+
+    def test_rebuild_matches_incremental(self):
+        expense = self.make(kind='GASTO', amount=Decimal('80.00'), account_from=self.cash)
+        expense.date = self.today.replace(day=1) - timedelta(days=1)
+        expense.save()
+        incremental = rollups.stored_rollups()
+        rollups.rebuild_rollups()
+        self.assertEqual(rollups.stored_rollups(), incremental)
+        expense.delete()
+        self.assertEqual(rollups.verify_rollups(), [])
+
+class DailyRollupTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.dollars = Account.objects.create(name='Ahorros', type='DEBITO', currency='USD', savings_amount=Decimal('1.00'))
+        for day, kind, amount in (
+            (date(2025, 3, 3), 'INGRESO', '1000.00'),
+            (date(2025, 3, 5), 'GASTO', '40.00'),
+            (date(2025, 3, 9), 'GASTO', '25.50'),
+            (date(2025, 3, 12), 'GASTO', '60.00'),
+            (date(2025, 3, 20), 'GASTO', '15.00'),
+        ):
+            self.add(day, kind, amount)
+        self.add(date(2025, 3, 5), 'GASTO', '99.00', account=self.dollars)
+
+    def add(self, day, kind, amount, account=None):
+        account = account or self.cash
+        transaction = Transaction(
+            date=day, effective_period=day.replace(day=1), kind=kind, amount=Decimal(amount), currency=account.currency,
+            description='Mov', payment_method='EFECTIVO',
+            account_from=account if kind == 'GASTO' else None, account_to=account if kind == 'INGRESO' else None,
+        )
+        transaction.save()
+        return transaction
+
+    def plan(self, frequency, start, end):
+        return BudgetPlan.objects.create(
+            frequency=frequency, period_start=start, period_end=end,
+            target_income=Decimal('500.00'), target_expenses=Decimal('100.00'), savings_rate=Decimal('10.00'),
+        )
+
+    def actuals(self, plan):
+        plan = rollups.with_actuals(BudgetPlan.objects.all()).get(pk=plan.pk)
+        return plan.actual_income, plan.actual_expenses
+
+    def test_plans_use_their_own_window_and_currency(self):
+        weekly = self.plan('SEMANAL', date(2025, 3, 3), date(2025, 3, 9))
+        biweekly = self.plan('QUINCENAL', date(2025, 3, 10), date(2025, 3, 24))
+        self.assertEqual(self.actuals(weekly), (Decimal('1000.00'), Decimal('65.50')))
+        self.assertEqual(self.actuals(biweekly), (Decimal('0.00'), Decimal('75.00')))
+        data = self.client.get(reverse('api_dashboard_actual_vs_budget'), {'budget_id': biweekly.pk}).json()
+        self.assertEqual(data['actual_expenses'], 75.0)
+
+    def test_backdated_and_invalidated_rows_update_prefix_sums(self):
+        weekly = self.plan('SEMANAL', date(2025, 3, 10), date(2025, 3, 16))
+        self.add(date(2025, 3, 1), 'GASTO', '7.00')
+        transaction = self.add(date(2025, 3, 11), 'GASTO', '3.00')
+        self.assertEqual(self.actuals(weekly)[1], Decimal('63.00'))
+        transaction.is_valid = False
+        transaction.save()
+        self.assertEqual(self.actuals(weekly)[1], Decimal('60.00'))
+        transaction.delete()
+        self.assertEqual(rollups.verify_daily_rollups(), [])
+        rollups.rebuild_daily_rollups()
+        self.assertEqual(self.actuals(weekly)[1], Decimal('60.00'))
+
+    def test_budgets_page_reads_every_plan_in_one_query(self):
+        self.plan('SEMANAL', date(2025, 3, 3), date(2025, 3, 9))
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse('budgets'))
+        for week in range(1, 10):
+            start = date(2025, 3, 3) + timedelta(weeks=week)
+            self.plan('SEMANAL', start, start + timedelta(days=6))
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse('budgets'))
+        self.assertEqual(len(many), len(few))
+        first = min(response.context['budgets'], key=lambda budget: budget.period_start)
+        self.assertEqual(first.actual_expenses, Decimal('65.50'))
+
+
+class BalanceHistoryTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN', opening_balance=Decimal('100.00'))
+        self.bank = Account.objects.create(name='Banco', type='DEBITO', currency='PEN', savings_amount=Decimal('1.00'))
+        self.add(date(2025, 1, 5), 'INGRESO', '500.00', account_to=self.cash)
+        self.add(date(2025, 1, 5), 'GASTO', '30.25', account_from=self.cash)
+        self.add(date(2025, 1, 20), 'TRANSFERENCIA', '200.00', account_from=self.cash, account_to=self.bank)
+        self.add(date(2025, 2, 3), 'TRANSFERENCIA', '50.00', account_from=self.bank, account_to=self.cash)
+        self.add(date(2025, 2, 10), 'TRANSFERENCIA_EXTERNA', '20.00', account_from=self.cash)
+        self.add(date(2025, 2, 11), 'GASTO', '999.00', account_from=self.cash, is_valid=False)
+
+    def add(self, day, kind, amount, is_valid=True, **accounts):
+        Transaction(
+            date=day, effective_period=day.replace(day=1), kind=kind, amount=Decimal(amount), currency='PEN',
+            description='Mov', payment_method='EFECTIVO', is_valid=is_valid, **accounts,
+        ).save()
+
+    def naive_balance(self, account, day):
+        balance = account.opening_balance
+        for transaction in Transaction.objects.filter(is_valid=True, date__lte=day):
+            if transaction.account_to_id == account.pk and transaction.kind in ledger.INFLOW_KINDS:
+                balance += transaction.amount
+            if transaction.account_from_id == account.pk and transaction.kind in ledger.OUTFLOW_KINDS:
+                balance -= transaction.amount
+        return balance
+
+    def test_daily_series_matches_balance_on_every_day(self):
+        for account in (self.cash, self.bank):
+            series = history.balance_history(account, date(2025, 1, 1), date(2025, 2, 28))
+            self.assertEqual(len(series), 59)
+            for day, balance in series:
+                self.assertEqual(balance, self.naive_balance(account, day), (account.name, day))
+            account.refresh_from_db()
+            self.assertEqual(series[-1][1], account.balance)
+
+    def test_series_opens_with_earlier_rows(self):
+        series = history.balance_history(self.cash, date(2025, 2, 1), date(2025, 2, 2))
+        self.assertEqual(series, [(date(2025, 2, 1), Decimal('369.75')), (date(2025, 2, 2), Decimal('369.75'))])
+
+    def test_week_and_month_buckets(self):
+        months = history.balance_history(self.cash, date(2025, 1, 10), date(2025, 3, 15), 'month')
+        self.assertEqual(months, [
+            (date(2025, 1, 31), Decimal('369.75')), (date(2025, 2, 28), Decimal('399.75')), (date(2025, 3, 15), Decimal('399.75')),
+        ])
+        weeks = history.balance_history(self.cash, date(2025, 1, 1), date(2025, 1, 31), 'week')
+        self.assertEqual([day for day, _ in weeks], [
+            date(2025, 1, 5), date(2025, 1, 12), date(2025, 1, 19), date(2025, 1, 26), date(2025, 1, 31),
+        ])
+
+    def test_api(self):
+        url = reverse('api_account_balance_history', args=[self.cash.pk])
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(url, {'start': '2025-01-01', 'end': '2025-02-28', 'granularity': 'month'}).json()
+        self.assertEqual(data['series'], [{'date': '2025-01-31', 'balance': 369.75}, {'date': '2025-02-28', 'balance': 399.75}])
+        self.assertEqual(len([q for q in queries if 'OVER' in q['sql']]), 1)
+        self.assertEqual(self.client.get(url, {'granularity': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2025-03-01', 'end': '2025-02-01'}).status_code, 400)
+
+
+class DashboardMetricsTestCase(TestCase):
+    def setUp(self):
+        self.pen = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN', opening_balance=Decimal('10.00'))
+        self.usd = Account.objects.create(name='Ahorros', type='DEBITO', currency='USD', savings_amount=Decimal('1.00'))
+        self.today = timezone.now().date()
+        for kind, amount, currency, account_from, account_to in [
+            ('INGRESO', '1000.00', 'PEN', None, self.pen),
+            ('GASTO', '250.00', 'PEN', self.pen, None),
+            ('TRANSFERENCIA_EXTERNA', '40.00', 'PEN', None, self.pen),
+            ('TRANSFERENCIA_EXTERNA', '15.00', 'PEN', self.pen, None),
+            ('INGRESO', '300.00', 'USD', None, self.usd),
+            ('GASTO', '20.00', 'USD', self.usd, None),
+        ]:
+            Transaction(
+                date=self.today, effective_period=self.today.replace(day=1), kind=kind, amount=Decimal(amount),
+                currency=currency, description='Mov', payment_method='EFECTIVO',
+                account_from=account_from, account_to=account_to,
+            ).save()
+
+    def test_period_metrics_single_query(self):
+        with self.assertNumQueries(1):
+            totals = metrics.period_metrics(self.today.replace(day=1), self.today)
+        self.assertEqual(totals['PEN']['income'], Decimal('1000.00'))
+        self.assertEqual(totals['PEN']['total_income'], Decimal('1040.00'))
+        self.assertEqual(totals['PEN']['total_expenses'], Decimal('265.00'))
+        self.assertEqual(totals['PEN']['savings'], Decimal('775.00'))
+        self.assertEqual(totals['USD']['savings'], Decimal('280.00'))
+
+    def test_dashboard_query_count(self):
+        # LedgerState fingerprint, one aggregate, one balance read
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['pen_income'], Decimal('1040.00'))
+        self.assertEqual(response.context['pen_balance'], Decimal('785.00'))
+        self.assertEqual(response.context['usd_balance'], Decimal('280.00'))
+
+    def test_summary_query_count(self):
+        day = self.today.isoformat()
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse('api_dashboard_summary'), {'start': day, 'end': day}).json()
+        self.assertEqual(data, {'pen_income': 1000.0, 'pen_expenses': 250.0, 'usd_income': 300.0, 'usd_expenses': 20.0})
+
+class QueryPlanTestCase(TestCase):
+    """Dashboard queries must be answered through an index, never a full table scan."""
+
+    def setUp(self):
+        cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        today = timezone.now().date()
+        Transaction(
+            date=today, effective_period=today.replace(day=1), kind='GASTO', amount=Decimal('10.00'),
+            currency='PEN', description='Mov', payment_method='EFECTIVO', account_from=cash,
+        ).save()
+        self.start = today.replace(day=1).isoformat()
+        self.end = today.isoformat()
+
+    def table_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = [row[-1] for row in cursor.fetchall()]
+        # budget_exchangerate: the as-of rate of each converted row must be an index seek on date
+        return [step for step in plan if step.startswith(('SCAN budget_transaction', 'SCAN budget_monthlyrollup', 'SCAN budget_exchangerate'))]
+
+    def test_dashboard_queries_use_indexes(self):
+        period = {'start': self.start, 'end': self.end}
+        urls = [
+            (reverse('dashboard'), {}),
+            (reverse('api_dashboard_summary'), period),
+            (reverse('api_dashboard_netflow_12m'), {}),
+            (reverse('api_dashboard_income_expenses_12m'), {}),
+            (reverse('api_dashboard_expenses_by_category'), period),
+            (reverse('api_dashboard_expenses_by_category'), dict(period, mode='pen')),
+        ]
+        for url, params in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url, params)
+            for query in queries.captured_queries:
+                if query['sql'].startswith('SELECT'):
+                    self.assertEqual(self.table_scans(query['sql']), [], f"{url}: {query['sql']}")
+
+class TransactionsPageTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.food = Category.objects.create(name='Alimentación')
+
+    def add_rows(self, count):
+        for i in range(count):
+            day = date(2025, 1, 1) + timedelta(days=i % 7)
+            Transaction(
+                date=day, effective_period=day.replace(day=1), kind='GASTO', amount=Decimal('1.00'), currency='PEN',
+                description=f'Mov {i}', payment_method='EFECTIVO', account_from=self.cash, category=self.food,
+            ).save()
+
+    def test_keyset_pages_cover_every_row(self):
+        self.add_rows(23)
+        seen = []
+        params = {'page_size': 5}
+        while True:
+            response = self.client.get(reverse('transactions'), params)
+            page = response.context['page']
+            seen.extend(row.id for row in page)
+            if not page.next_cursor:
+                break
+            params = {'page_size': 5, 'after': page.next_cursor}
+        expected = list(Transaction.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(reverse('transactions'), {'page_size': 5, 'before': page.previous_cursor})
+        self.assertEqual([row.id for row in response.context['page']], expected[15:20])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_rows(5)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('transactions'), {'page_size': 50})
+        self.add_rows(40)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('transactions'), {'page_size': 50})
+        self.assertEqual(len(small), len(large))
+
+    def test_row_actions_return_to_the_same_page(self):
+        self.add_rows(8)
+        first = self.client.get(reverse('transactions'), {'page_size': 5})
+        params = {'page_size': 5, 'after': first.context['page'].next_cursor, 'q': 'mov'}
+        response = self.client.get(reverse('transactions'), {**params, 'edit': Transaction.objects.first().pk})
+        page_query = response.context['page_query']
+        self.assertEqual(page_query, urlencode(params))
+
+        row = response.context['page'].rows[0]
+        response = self.client.post(reverse('invalidate_transaction', args=[row.pk]), {'next': page_query})
+        self.assertRedirects(response, f"{reverse('transactions')}?{page_query}", fetch_redirect_response=False)
+        response = self.client.post(reverse('delete_transaction', args=[row.pk]), {'next': page_query})
+        self.assertRedirects(response, f"{reverse('transactions')}?{page_query}", fetch_redirect_response=False)
+        other = Transaction.objects.filter(is_valid=True).first()
+        response = self.client.post(reverse('invalidate_transaction', args=[other.pk]))
+        self.assertRedirects(response, reverse('transactions'), fetch_redirect_response=False)
+
+class PayeeIndexTestCase(TestCase):
+    def setUp(self):
+        payee_index.invalidate()
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.plaza = Payee.objects.create(name='Plaza Vea')
+        self.plin = Payee.objects.create(name='Plin Pagos')
+        self.peru = Payee.objects.create(name='Perúfarma')
+        today = timezone.now().date()
+        for payee, day in [(self.plin, today), (self.plin, today), (self.plaza, today), (self.plaza, today - timedelta(days=400)),
+                           (self.plaza, today - timedelta(days=500)), (self.peru, today - timedelta(days=400))]:
+            self.spend(payee, day)
+
+    def spend(self, payee, day):
+        Transaction(
+            date=day, effective_period=day.replace(day=1), kind='GASTO', amount=Decimal('5.00'), currency='PEN',
+            description='Compra', payment_method='EFECTIVO', account_from=self.cash, payee=payee,
+        ).save()
+
+    def names(self, query, limit=10):
+        return [name for _, name in payee_index.suggest(query, limit)]
+
+    def test_ranks_by_recent_use_then_total(self):
+        payee_index.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('p'), ['Plin Pagos', 'Plaza Vea', 'Perúfarma'])
+            self.assertEqual(self.names('PL', limit=1), ['Plin Pagos'])
+            self.assertEqual(self.names('pla'), ['Plaza Vea'])
+            # Any word, without accents
+            self.assertEqual(self.names('vea'), ['Plaza Vea'])
+            self.assertEqual(self.names('perufa'), ['Perúfarma'])
+            self.assertEqual(self.names('pago'), ['Plin Pagos'])
+            self.assertEqual(self.names('x'), [])
+
+    def test_new_payees_and_uses_update_the_index(self):
+        payee_index.load()
+        # The counter is shared by the whole process; only count this test's loads
+        loads = payee_index.stats()['loads']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('transactions'), {
+                'kind': 'GASTO', 'date': timezone.now().date().isoformat(), 'amount': '9.00', 'currency': 'PEN',
+                'description': 'Compra', 'payment_method': 'EFECTIVO', 'account_from': self.cash.pk, 'payee': 'Plazuela',
+            })
+        self.assertEqual(response.status_code, 302)
+        # The page must actually save it; a validation error also redirects
+        plazuela = Payee.objects.get(name='Plazuela')
+        self.assertEqual(Transaction.objects.filter(payee=plazuela).count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spend(plazuela, timezone.now().date())
+        self.assertEqual(payee_index.stats()['loads'], loads)
+        # Two uses, both recent, like Plin Pagos; ties go by name
+        self.assertEqual(self.names('pl'), ['Plazuela', 'Plin Pagos', 'Plaza Vea'])
+        self.assertEqual(self.names('plaz'), ['Plazuela', 'Plaza Vea'])
+
+    def test_api(self):
+        data = self.client.get(reverse('api_payees_suggest'), {'q': 'pla'}).json()
+        self.assertEqual(data, {'suggestions': [{'id': self.plaza.pk, 'name': 'Plaza Vea'}]})
+        self.assertEqual(self.client.get(reverse('api_payees_suggest'), {'q': 'p', 'limit': 'x'}).status_code, 400)
+
+
+class ExpensesByCategoryTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        food = Category.objects.create(name='Alimentación')
+        travel = Category.objects.create(name='Transporte')
+        ExchangeRate.objects.create(date=date(2025, 1, 5), usd_to_pen=Decimal('3.7123'))
+        ExchangeRate.objects.create(date=date(2025, 1, 20), usd_to_pen=Decimal('3.8457'))
+        for day, amount, currency, category in [
+            (3, '10.10', 'USD', food),      # before the first rate: kept as is
+            (6, '19.99', 'USD', food),
+            (7, '45.35', 'PEN', food),
+            (21, '0.07', 'USD', travel),
+            (22, '1234.56', 'USD', None),
+            (25, '3.33', 'PEN', travel),
+        ]:
+            Transaction(
+                date=date(2025, 1, day), effective_period=date(2025, 1, 1), kind='GASTO', amount=Decimal(amount),
+                currency=currency, category=category, description='Mov', payment_method='EFECTIVO', account_from=self.cash,
+            ).save()
+
+    def legacy_output(self, mode):
+        data = {}
+        for exp in Transaction.objects.filter(kind='GASTO', is_valid=True):
+            amount = exp.amount
+            if mode == 'pen' and exp.currency != 'PEN':
+                # Latest rate on or before the date; kept as is when there is none
+                rate = ExchangeRate.objects.filter(date__lte=exp.date).order_by('-date').first()
+                amount = amount * rate.usd_to_pen if rate else amount
+            cat = exp.category.name if exp.category else 'Sin Categoría'
+            data[cat] = data.get(cat, Decimal('0.00')) + amount
+        return {k: float(v) for k, v in data.items()}
+
+    def test_matches_row_by_row_conversion(self):
+        for mode in ('original', 'pen'):
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('api_dashboard_expenses_by_category'), {'start': '2025-01-01', 'end': '2025-01-31', 'mode': mode})
+            self.assertEqual(response.json(), self.legacy_output(mode))
+            self.assertEqual(list(response.json()), list(self.legacy_output(mode)))
+
+class ImportTransactionsTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        Category.objects.create(name='Alimentación')
+
+    def write(self, suffix, content):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        handle.write(content)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def test_csv_import_batches_and_reports_errors(self):
+        path = self.write('.csv', (
+            'date,kind,amount,currency,description,payment_method,category,account_from,account_to,payee\n'
+            '2025-01-02,INGRESO,1000.00,PEN,Sueldo,TRANSFERENCIA,,,Efectivo,Empresa\n'
+            '2025-01-03,GASTO,25.50,PEN,Mercado,EFECTIVO,Alimentación,Efectivo,,Mercado Central\n'
+            '2025-01-04,GASTO,10.00,PEN,Sin cuenta,EFECTIVO,,,,\n'
+            '2025-01-05,GASTO,abc,PEN,Monto malo,EFECTIVO,,Efectivo,,\n'
+            '2025-01-06,GASTO,4.50,PEN,Mercado,EFECTIVO,Alimentación,Efectivo,,Mercado Central\n'
+        ))
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_transactions', path, batch_size=2, stdout=stdout, stderr=stderr)
+        self.assertEqual(Transaction.objects.count(), 3)
+        self.assertEqual(Payee.objects.count(), 2)
+        self.assertIn('Line 4:', stderr.getvalue())
+        self.assertIn('Line 5:', stderr.getvalue())
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('970.00'))
+        self.assertEqual(ledger.verify_balances(), [])
+        self.assertEqual(rollups.verify_rollups(), [])
+
+    def test_ofx_import(self):
+        path = self.write('.ofx', (
+            'OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><CURDEF>PEN\n<BANKTRANLIST>\n'
+            '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250110120000<TRNAMT>-12.30<FITID>1<NAME>Bodega\n</STMTTRN>\n'
+            '<STMTTRN>\n<TRNTYPE>CREDIT\n<DTPOSTED>20250111\n<TRNAMT>200.00\n<FITID>2\n<NAME>Cliente\n<MEMO>Pago factura\n</STMTTRN>\n'
+            '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+        ))
+        call_command('import_transactions', path, account='Efectivo', stdout=io.StringIO(), stderr=io.StringIO())
+        expense = Transaction.objects.get(kind='GASTO')
+        self.assertEqual((expense.date, expense.amount, expense.account_from_id), (date(2025, 1, 10), Decimal('12.30'), self.cash.pk))
+        self.assertEqual(Transaction.objects.get(kind='INGRESO').description, 'Pago factura')
+
+class TransactionSearchTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.bank = Account.objects.create(name='Banco', type='DEBITO', currency='PEN', savings_amount=Decimal('1.00'))
+        self.food = Category.objects.create(name='Alimentación')
+        self.plaza = Payee.objects.create(name='Plaza Vea')
+        self.lunch = self.add(date(2025, 1, 5), 'Almuerzo de trabajo', '35.00', category=self.food)
+        self.groceries = self.add(date(2025, 1, 9), 'Compras del mes', '180.00', payee=self.plaza, category=self.food)
+        self.coffee = self.add(date(2025, 2, 1), 'Café con trabajo pendiente', '12.50', account=self.bank)
+
+    def add(self, day, description, amount, account=None, **extra):
+        transaction = Transaction(
+            date=day, effective_period=day.replace(day=1), kind='GASTO', amount=Decimal(amount), currency='PEN',
+            description=description, payment_method='EFECTIVO', account_from=account or self.cash, **extra,
+        )
+        transaction.save()
+        return transaction
+
+    def ids(self, **params):
+        response = self.client.get(reverse('api_transactions_search'), params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_match_expression(self):
+        self.assertEqual(search.match_expression('caf* "plaza vea" a-b'), '"caf"* "plaza vea" "a" "b"')
+        self.assertIsNone(search.match_expression(' " '))
+
+    def test_words_prefixes_and_phrases(self):
+        self.assertEqual(self.ids(q='trabajo'), [self.coffee.pk, self.lunch.pk])
+        self.assertEqual(self.ids(q='trab*'), [self.coffee.pk, self.lunch.pk])
+        self.assertEqual(self.ids(q='"trabajo pendiente"'), [self.coffee.pk])
+        self.assertEqual(self.ids(q='"pendiente trabajo"'), [])
+        # Payee and category names, without accents
+        self.assertEqual(self.ids(q='plaza'), [self.groceries.pk])
+        self.assertEqual(self.ids(q='alimentacion compras'), [self.groceries.pk])
+        self.assertEqual(self.ids(q='cafe'), [self.coffee.pk])
+
+    def test_filters_and_pagination(self):
+        self.assertEqual(self.ids(q='trabajo', end='2025-01-31'), [self.lunch.pk])
+        self.assertEqual(self.ids(q='trabajo', account=str(self.bank.pk)), [self.coffee.pk])
+        self.assertEqual(self.ids(min_amount='30', max_amount='100'), [self.lunch.pk])
+        first = self.client.get(reverse('api_transactions_search'), {'q': 'trabajo', 'page_size': 1}).json()
+        self.assertEqual([row['id'] for row in first['results']], [self.coffee.pk])
+        self.assertEqual(self.ids(q='trabajo', page_size=1, after=first['next']), [self.lunch.pk])
+        response = self.client.get(reverse('api_transactions_search'), {'min_amount': 'mucho'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_writes(self):
+        self.coffee.description = 'Café de la tarde'
+        self.coffee.save()
+        self.assertEqual(self.ids(q='trabajo'), [self.lunch.pk])
+        self.plaza.name = 'Tottus'
+        self.plaza.save()
+        self.assertEqual(self.ids(q='tottus'), [self.groceries.pk])
+        Transaction.objects.bulk_create([Transaction(
+            date=date(2025, 3, 1), effective_period=date(2025, 3, 1), kind='GASTO', amount=Decimal('9.00'), currency='PEN',
+            description='Taxi al trabajo', payment_method='EFECTIVO', account_from=self.cash,
+        )])
+        self.assertEqual(len(self.ids(q='trabajo')), 2)
+        self.lunch.delete()
+        self.assertEqual(len(self.ids(q='trabajo')), 1)
+        self.assertEqual(search.verify_index(), [])
+        self.assertEqual(search.rebuild_index(), 3)
+        self.assertEqual(search.verify_index(), [])
+
+    def test_transactions_page_search_box(self):
+        response = self.client.get(reverse('transactions'), {'q': 'trab*', 'account': str(self.cash.pk)})
+        self.assertEqual([transaction.pk for transaction in response.context['page']], [self.lunch.pk])
+        self.assertEqual(response.context['search_query'], f'q=trab%2A&account={self.cash.pk}')
+
+
+class ExportTransactionsTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        other = Account.objects.create(name='Ahorros', type='DEBITO', currency='USD', savings_amount=Decimal('1.00'))
+        food = Category.objects.create(name='Alimentación')
+        for day, account, category in [(1, self.cash, food), (2, other, None), (3, self.cash, None)]:
+            Transaction(
+                date=date(2025, 1, day), effective_period=date(2025, 1, 1), kind='GASTO', amount=Decimal('5.00'),
+                currency=account.currency, category=category, description=f'Mov, {day}', payment_method='EFECTIVO', account_from=account,
+            ).save()
+
+    def test_streams_filtered_csv_with_joined_names(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('export_transactions'), {'account': self.cash.pk, 'start': '2025-01-01'})
+            body = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row['description'] for row in rows], ['Mov, 1', 'Mov, 3'])
+        self.assertEqual((rows[0]['category'], rows[0]['account_from'], rows[0]['amount']), ('Alimentación', 'Efectivo', '5.00'))
+
+    def test_jsonl_and_bad_filters(self):
+        response = self.client.get(reverse('export_transactions'), {'format': 'jsonl', 'currency': 'USD'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(json.loads(lines[0])['account_from'], 'Ahorros')
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(self.client.get(reverse('export_transactions'), {'start': 'ayer'}).status_code, 400)
+
+    def test_command_output_round_trips_through_import(self):
+        handle = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        invalid = Transaction.objects.get(description='Mov, 3')
+        invalid.is_valid = False
+        invalid.save()
+        call_command('export_transactions', output=handle.name)
+        call_command('import_transactions', handle.name, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(Transaction.objects.filter(description='Mov, 2', currency='USD').count(), 2)
+        self.assertEqual(Transaction.objects.filter(description='Mov, 3', is_valid=False).count(), 2)
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('-10.00'))
+        self.assertEqual(rollups.verify_rollups(), [])
+
+class CardStatementTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.card = Account.objects.create(
+            name='Visa', type='CREDITO', currency='PEN', credit_limit=Decimal('1000.00'), billing_cycle_day=15, due_day=5,
+        )
+        for day, kind, amount in (
+            (date(2025, 1, 10), 'GASTO', '100.00'),
+            (date(2025, 1, 20), 'GASTO', '50.00'),
+            (date(2025, 2, 10), 'PAGO_TARJETA', '100.00'),
+            (date(2025, 3, 1), 'GASTO', '30.00'),
+        ):
+            self.card_row(day, kind, amount)
+
+    def card_row(self, day, kind, amount):
+        charge = kind == 'GASTO'
+        Transaction(
+            date=day, effective_period=day.replace(day=1), kind=kind, amount=Decimal(amount), currency='PEN',
+            description='Mov', payment_method='TARJETA_CREDITO' if charge else 'TRANSFERENCIA',
+            account_from=self.card if charge else self.cash, account_to=None if charge else self.card,
+        ).save()
+
+    def closings(self, today):
+        return [
+            (statement.period_end, statement.due_date, statement.closing_balance, is_open)
+            for statement, is_open in statements.account_statements(self.card, today)
+        ]
+
+    def test_closed_cycles_are_stored_once(self):
+        today = date(2025, 3, 20)
+        self.assertEqual(self.closings(today), [
+            (date(2025, 1, 15), date(2025, 2, 5), Decimal('100.00'), False),
+            (date(2025, 2, 15), date(2025, 3, 5), Decimal('50.00'), False),
+            (date(2025, 3, 15), date(2025, 4, 5), Decimal('80.00'), False),
+            (date(2025, 4, 15), date(2025, 5, 5), Decimal('80.00'), True),
+        ])
+        self.assertEqual(CardStatement.objects.count(), 3)
+        # Latest stored statement, stored list, live open cycle
+        with self.assertNumQueries(3):
+            statements.account_statements(self.card, today)
+
+    def test_backdated_rows_reopen_later_cycles(self):
+        today = date(2025, 3, 20)
+        self.closings(today)
+        self.card_row(date(2025, 2, 1), 'GASTO', '20.00')
+        self.assertEqual(CardStatement.objects.count(), 1)
+        self.assertEqual([closing for _, _, closing, _ in self.closings(today)], [
+            Decimal('100.00'), Decimal('70.00'), Decimal('100.00'), Decimal('100.00'),
+        ])
+
+    def test_api(self):
+        response = self.client.get(reverse('api_account_statements', args=[self.card.pk]), {'start': '2025-02-01'})
+        data = response.json()['statements']
+        self.assertEqual(data[0]['period_end'], '2025-02-15')
+        self.assertTrue(data[-1]['open'])
+        response = self.client.get(reverse('api_account_statements', args=[self.cash.pk]))
+        self.assertEqual(response.status_code, 400)
+
+class GenerateRecurringTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+
+    def schedule(self, frequency, start, **kwargs):
+        return RecurringTransaction.objects.create(
+            kind='GASTO', amount=Decimal('10.00'), currency='PEN', description='Suscripción', payment_method='EFECTIVO',
+            account_from=self.cash, frequency=frequency, start_date=start, next_run_date=start, **kwargs
+        )
+
+    def test_catches_up_in_one_run_and_is_idempotent(self):
+        weekly = self.schedule('SEMANAL', date(2025, 1, 1))
+        call_command('generate_recurring', today='2025-01-22', stdout=io.StringIO())
+        self.assertEqual(Transaction.objects.count(), 4)
+        weekly.refresh_from_db()
+        self.assertEqual(weekly.next_run_date, date(2025, 1, 29))
+        self.assertEqual(Account.objects.get(pk=self.cash.pk).balance, Decimal('-40.00'))
+
+        # Even if the schedule is rewound, emitted occurrences are not repeated
+        RecurringTransaction.objects.filter(pk=weekly.pk).update(next_run_date=date(2025, 1, 1))
+        call_command('generate_recurring', today='2025-01-22', stdout=io.StringIO())
+        self.assertEqual(Transaction.objects.count(), 4)
+
+    def test_monthly_keeps_anchor_day_and_ends(self):
+        monthly = self.schedule('MENSUAL', date(2025, 1, 31), end_date=date(2025, 3, 31))
+        call_command('generate_recurring', today='2025-06-01', stdout=io.StringIO())
+        self.assertEqual(
+            list(Transaction.objects.order_by('date').values_list('date', flat=True)),
+            [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31)],
+        )
+        monthly.refresh_from_db()
+        self.assertFalse(monthly.is_active)
+
+    def test_dry_run_writes_nothing(self):
+        self.schedule('QUINCENAL', date(2025, 1, 1))
+        stdout = io.StringIO()
+        call_command('generate_recurring', today='2025-01-31', dry_run=True, stdout=stdout)
+        self.assertIn('Would create 3 transactions', stdout.getvalue())
+        self.assertEqual(Transaction.objects.count(), 0)
+
+class DashboardCacheTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.today = timezone.now().date()
+        self.params = {'start': self.today.replace(day=1).isoformat(), 'end': self.today.isoformat()}
+
+    def expense(self, amount):
+        transaction = Transaction(
+            date=self.today, effective_period=self.today.replace(day=1), kind='GASTO', amount=Decimal(amount),
+            currency='PEN', description='Mov', payment_method='EFECTIVO', account_from=self.cash,
+        )
+        transaction.save()
+        return transaction
+
+    def test_repeated_requests_skip_the_aggregations(self):
+        self.expense('10.00')
+        first = self.client.get(reverse('api_dashboard_summary'), self.params).json()
+        # Only the LedgerState lookup behind the ETag; no aggregation
+        with self.assertNumQueries(1):
+            second = self.client.get(reverse('api_dashboard_summary'), self.params).json()
+        self.assertEqual(first, second)
+
+    def test_writes_invalidate_cached_responses(self):
+        transaction = self.expense('10.00')
+        self.assertEqual(self.client.get(reverse('api_dashboard_summary'), self.params).json()['pen_expenses'], 10.0)
+        self.expense('5.00')
+        self.assertEqual(self.client.get(reverse('api_dashboard_summary'), self.params).json()['pen_expenses'], 15.0)
+        transaction.is_valid = False
+        transaction.save()
+        self.assertEqual(self.client.get(reverse('api_dashboard_summary'), self.params).json()['pen_expenses'], 5.0)
+
+        ExchangeRate.objects.create(date=self.today, usd_to_pen=Decimal('3.5000'))
+        version = cache.ledger_version()
+        ExchangeRate.objects.filter(date=self.today).get().delete()
+        self.assertNotEqual(cache.ledger_version(), version)
+
+    def test_key_follows_the_state_the_request_read(self):
+        # A replica refreshed by another process advances its LedgerState but
+        # not this process's counter; the key must still move on
+        self.expense('10.00')
+        path = reverse('api_dashboard_summary')
+        before = cache.request_key(RequestFactory().get(path, self.params))
+        version = cache.ledger_version()
+        LedgerState.objects.filter(pk=ledger.STATE_PK).update(version=F('version') + 1)
+        self.assertEqual(cache.ledger_version(), version)
+        self.assertNotEqual(cache.request_key(RequestFactory().get(path, self.params)), before)
+
+
+class DashboardBundleTestCase(TestCase):
+    def setUp(self):
+        cache.get_cache().clear()
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.today = timezone.now().date()
+        self.start, self.end = metrics.month_bounds(self.today)
+        self.params = {'start': self.start.isoformat(), 'end': self.end.isoformat()}
+        self.budget = BudgetPlan.objects.create(
+            frequency='MENSUAL', period_start=self.start, period_end=self.end,
+            target_income=Decimal('500.00'), target_expenses=Decimal('300.00'), savings_rate=Decimal('50.00'),
+        )
+        food = Category.objects.create(name='Comida')
+        for kind, amount in (('INGRESO', '400.00'), ('GASTO', '120.50')):
+            Transaction(
+                date=self.today, effective_period=self.start, kind=kind, amount=Decimal(amount), currency='PEN',
+                category=food if kind == 'GASTO' else None, description='Mov', payment_method='EFECTIVO',
+                account_from=self.cash if kind == 'GASTO' else None, account_to=self.cash if kind == 'INGRESO' else None,
+            ).save()
+
+    def test_bundle_matches_single_widget_endpoints(self):
+        widgets = ','.join(metrics.BUNDLE_WIDGETS)
+        # State, budget with its actuals, period metrics, monthly flows, categories
+        with self.assertNumQueries(5):
+            bundle = self.client.get(reverse('api_dashboard_bundle'), {**self.params, 'widgets': widgets, 'budget_id': self.budget.pk}).json()
+        self.assertEqual(bundle['summary'], self.client.get(reverse('api_dashboard_summary'), self.params).json())
+        self.assertEqual(bundle['netflow'], self.client.get(reverse('api_dashboard_netflow_12m')).json())
+        self.assertEqual(bundle['income_expenses'], self.client.get(reverse('api_dashboard_income_expenses_12m')).json())
+        self.assertEqual(bundle['expenses_by_category'], self.client.get(reverse('api_dashboard_expenses_by_category'), self.params).json())
+        self.assertEqual(bundle['actual_vs_budget'], self.client.get(reverse('api_dashboard_actual_vs_budget'), {'budget_id': self.budget.pk}).json())
+
+    def test_bundle_rejects_unknown_widgets(self):
+        response = self.client.get(reverse('api_dashboard_bundle'), {'widgets': 'summary,forecast'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('api_dashboard_bundle'), {'widgets': 'actual_vs_budget'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncDashboardTestCase(django.test.TransactionTestCase):
+    # Committed data: the async views read it from the query pool's own connections
+    def setUp(self):
+        cache.get_cache().clear()
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.today = timezone.now().date()
+        self.start, self.end = metrics.month_bounds(self.today)
+        self.params = {'start': self.start.isoformat(), 'end': self.end.isoformat()}
+        self.budget = BudgetPlan.objects.create(
+            frequency='MENSUAL', period_start=self.start, period_end=self.end,
+            target_income=Decimal('500.00'), target_expenses=Decimal('300.00'), savings_rate=Decimal('50.00'),
+        )
+        for kind, amount in (('INGRESO', '400.00'), ('GASTO', '120.50')):
+            Transaction(
+                date=self.today, effective_period=self.start, kind=kind, amount=Decimal(amount), currency='PEN',
+                description='Mov', payment_method='EFECTIVO',
+                account_from=self.cash if kind == 'GASTO' else None, account_to=self.cash if kind == 'INGRESO' else None,
+            ).save()
+
+    async def test_async_views_match_sync_views(self):
+        budget = {'budget_id': self.budget.pk}
+        bundle = {**self.params, 'widgets': ','.join(metrics.BUNDLE_WIDGETS), **budget}
+        for name, params in (
+            ('api_dashboard_summary', self.params),
+            ('api_dashboard_netflow_12m', {}),
+            ('api_dashboard_income_expenses_12m', {}),
+            ('api_dashboard_expenses_by_category', self.params),
+            ('api_dashboard_actual_vs_budget', budget),
+            ('api_dashboard_bundle', bundle),
+        ):
+            expected = (await self.async_client.get(reverse(name), params)).json()
+            response = await self.async_client.get(reverse(f'{name}_async'), params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected, name)
+
+    async def test_async_views_answer_conditional_requests(self):
+        url = reverse('api_dashboard_bundle_async')
+        response = await self.async_client.get(url, self.params)
+        self.assertEqual(response.status_code, 200)
+        cached = await self.async_client.get(url, self.params, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        response = await self.async_client.get(url, {'widgets': 'actual_vs_budget'})
+        self.assertEqual(response.status_code, 400)
+
+
+class GenerateDatasetTestCase(TestCase):
+    def test_deterministic_and_consistent(self):
+        end = date(2025, 6, 30)
+        counts = datasets.generate_dataset(scale=1, years=1, seed=7, end=end)
+        self.assertEqual(counts['accounts'], 6)
+        self.assertEqual(set(Account.objects.values_list('type', flat=True)), {'EFECTIVO', 'DEBITO', 'CREDITO'})
+        self.assertEqual(set(Transaction.objects.values_list('currency', flat=True)), {'PEN', 'USD'})
+        self.assertEqual(ExchangeRate.objects.count(), 365)
+        self.assertEqual(ledger.verify_balances(), [])
+        self.assertEqual(rollups.verify_rollups(), [])
+        for transaction in Transaction.objects.select_related('account_from', 'account_to')[:500]:
+            transaction.full_clean()
+
+        first = list(Transaction.objects.order_by('date', 'kind', 'amount').values_list('date', 'kind', 'amount', 'currency'))
+        with self.assertRaises(datasets.DatasetError):
+            datasets.generate_dataset(scale=1, years=1, seed=7, end=end)
+        datasets.generate_dataset(scale=1, years=1, seed=7, end=end, replace=True)
+        self.assertEqual(list(Transaction.objects.order_by('date', 'kind', 'amount').values_list('date', 'kind', 'amount', 'currency')), first)
+
+
+# Upper bound on SQL statements per request, for every URL in budget/urls.py
+QUERY_BUDGETS = {
+    'dashboard': 4,
+    'transactions': 6,
+    'invalidate_transaction': 30,
+    'delete_transaction': 30,
+    'export_transactions': 2,
+    'accounts': 3,
+    'budgets': 3,
+    'exchange_rates': 3,
+    'api_dashboard_summary': 3,
+    'api_dashboard_netflow_12m': 3,
+    'api_dashboard_income_expenses_12m': 3,
+    'api_dashboard_expenses_by_category': 3,
+    'api_dashboard_bundle': 6,
+    'api_dashboard_actual_vs_budget': 4,
+    'api_account_statements': 6,
+    'api_account_balance_history': 3,
+    'api_payees_suggest': 0,
+    'api_transactions_search': 2,
+    'api_transactions_bulk_invalidate': 30,
+    'api_transactions_bulk_delete': 30,
+    'api_dashboard_summary_async': 3,
+    'api_dashboard_netflow_12m_async': 3,
+    'api_dashboard_income_expenses_12m_async': 3,
+    'api_dashboard_expenses_by_category_async': 3,
+    'api_dashboard_bundle_async': 6,
+    'api_dashboard_actual_vs_budget_async': 4,
+    # Form POSTs of the pages that write (samples.write_requests)
+    'transactions:create': 30,
+    'transactions:edit': 30,
+    'accounts:create': 10,
+    'accounts:edit': 10,
+    'budgets:create': 10,
+    'exchange_rates:save': 10,
+}
+
+
+class QueryBudgetTestCase(django.test.TransactionTestCase):
+    """No budget URL may issue O(accounts) or O(rows) queries."""
+
+    # Committed data, so the async views' query pool connections can read it.
+    # Queries are counted by the metrics middleware, which also sees the pool threads.
+
+    def request_queries(self, name, sample):
+        method, path, params = sample
+        # Warm in-process indexes first; then count a request that misses the response cache
+        for _ in range(2):
+            cache.get_cache().clear()
+            instrumentation.registry.reset()
+            response = self.client.post(path, params) if method == 'POST' else self.client.get(path, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            self.assertLess(response.status_code, 400, name)
+            if method == 'POST':
+                # Form views report failures as a message and still redirect
+                errors = [str(m) for m in get_messages(response.wsgi_request) if m.level >= message_levels.ERROR]
+                self.assertEqual(errors, [], name)
+                break
+        return instrumentation.registry.views[name].queries.total
+
+    def measure(self, scale):
+        datasets.generate_dataset(scale=scale, years=1, seed=3, replace=True)
+        counts = {name: self.request_queries(name, samples.sample_request(name)) for name in samples.url_names()}
+        for name in samples.WRITE_VIEWS:
+            requests = samples.write_requests(name)
+            self.assertEqual(tuple(requests), samples.WRITE_VIEWS[name])
+            for label, sample in requests.items():
+                counts[f'{name}:{label}'] = self.request_queries(name, sample)
+        return counts
+
+    def test_every_url_has_a_budget(self):
+        writes = {f'{name}:{label}' for name, labels in samples.WRITE_VIEWS.items() for label in labels}
+        self.assertEqual(set(samples.url_names()) | writes, set(QUERY_BUDGETS))
+
+    def test_query_counts_are_bounded_and_flat(self):
+        small = self.measure(1)
+        # Twice the accounts and twice the transactions
+        large = self.measure(2)
+        for name, budget in QUERY_BUDGETS.items():
+            self.assertLessEqual(small[name], budget, name)
+            self.assertEqual(large[name], small[name], name)
+
+
+class DatabaseProfileTestCase(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connections_apply_the_pragmas(self):
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('cache_size'), -64000)
+        self.assertEqual(self.pragma('foreign_keys'), 1)
+
+    def routed_alias(self, method, name):
+        router = database.ReplicaRouter()
+
+        def view(request):
+            return HttpResponse(router.db_for_read(Transaction) or 'default')
+
+        middleware = database.ReplicaRoutingMiddleware(lambda request: middleware.process_view(request, view, (), {}) or view(request))
+        request = getattr(RequestFactory(), method.lower())(reverse(name))
+        request.resolver_match = resolve(request.path)
+        return middleware(request).content.decode()
+
+    def test_dashboard_gets_read_from_the_replica(self):
+        self.assertEqual(self.routed_alias('GET', 'api_dashboard_summary'), 'default')
+        with override_settings(BUDGET_READ_REPLICA='replica'):
+            self.assertEqual(self.routed_alias('GET', 'api_dashboard_summary'), 'replica')
+            self.assertEqual(self.routed_alias('GET', 'api_dashboard_bundle_async'), 'replica')
+            self.assertEqual(self.routed_alias('GET', 'transactions'), 'default')
+            self.assertEqual(self.routed_alias('POST', 'api_dashboard_summary'), 'default')
+            # Outside a request nothing is routed
+            self.assertIsNone(database.ReplicaRouter().db_for_read(Transaction))
+            self.assertEqual(database.ReplicaRouter().db_for_write(Transaction), 'default')
+
+
+class RequestMetricsTestCase(TestCase):
+    def setUp(self):
+        instrumentation.registry.reset()
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+        self.staff = User.objects.create_user('admin', password='secret', is_staff=True)
+
+    def test_records_queries_per_url_name(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('dashboard'))
+            self.client.get(reverse('dashboard'))
+        # Later requests reset the connection's query log, and with it the captured slice
+        captured = len(queries)
+        stats = instrumentation.registry.views['dashboard']
+        self.assertEqual(sum(stats.latency.counts), 2)
+        self.assertEqual(stats.queries.total, captured)
+        self.assertLessEqual(len(stats.slowest), instrumentation.SLOW_QUERIES)
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(self.staff)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('django_view_request_duration_seconds_count{view="dashboard"} 2', body)
+        self.assertIn(f'django_view_sql_queries_sum{{view="dashboard"}} {captured}', body)
+        self.assertIn('django_view_slowest_query_seconds{view="dashboard",sql="SELECT', body)
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.cash = Account.objects.create(name='Efectivo', type='EFECTIVO', currency='PEN')
+
+    def test_api_answers_304_until_the_ledger_changes(self):
+        url = reverse('api_dashboard_netflow_12m')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        today = timezone.now().date()
+        Transaction(
+            date=today, effective_period=today.replace(day=1), kind='INGRESO', amount=Decimal('5.00'),
+            currency='PEN', description='Mov', payment_method='EFECTIVO', account_to=self.cash,
+        ).save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_pages_revalidate_and_skip_flash_messages(self):
+        url = reverse('accounts')
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(url, {'name': 'Caja', 'type': 'EFECTIVO', 'currency': 'PEN', 'opening_balance': '0.00'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)  # the success message is rendered once
+        self.assertEqual(LedgerState.objects.get().transaction_count, 0)
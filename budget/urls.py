@@ -6,6 +6,7 @@ urlpatterns = [
     path('transacciones/', views.transactions, name='transactions'),
     path('transacciones/invalidar/<int:transaction_id>/', views.invalidate_transaction, name='invalidate_transaction'),
     path('transacciones/eliminar/<int:transaction_id>/', views.delete_transaction, name='delete_transaction'),
+    path('transacciones/exportar/', views.export_transactions, name='export_transactions'),
     path('cuentas/', views.accounts, name='accounts'),
     path('presupuestos/', views.budgets, name='budgets'),
     path('tipo-cambio/', views.exchange_rates, name='exchange_rates'),
@@ -14,5 +15,19 @@ urlpatterns = [
     path('api/dashboard/netflow_12m', views.api_dashboard_netflow_12m, name='api_dashboard_netflow_12m'),
     path('api/dashboard/income_expenses_12m', views.api_dashboard_income_expenses_12m, name='api_dashboard_income_expenses_12m'),
     path('api/dashboard/expenses_by_category', views.api_dashboard_expenses_by_category, name='api_dashboard_expenses_by_category'),
+    path('api/dashboard/bundle', views.api_dashboard_bundle, name='api_dashboard_bundle'),
     path('api/dashboard/actual_vs_budget', views.api_dashboard_actual_vs_budget, name='api_dashboard_actual_vs_budget'),
+    path('api/accounts/<int:account_id>/statements', views.api_account_statements, name='api_account_statements'),
+    path('api/transactions/search', views.api_transactions_search, name='api_transactions_search'),
+    path('api/transactions/bulk_invalidate', views.api_transactions_bulk_invalidate, name='api_transactions_bulk_invalidate'),
+    path('api/transactions/bulk_delete', views.api_transactions_bulk_delete, name='api_transactions_bulk_delete'),
+    path('api/payees/suggest', views.api_payees_suggest, name='api_payees_suggest'),
+    path('api/accounts/<int:account_id>/balance_history', views.api_account_balance_history, name='api_account_balance_history'),
+    # Async variants of the API (served concurrently under ASGI)
+    path('api/async/dashboard/summary', views.api_dashboard_summary_async, name='api_dashboard_summary_async'),
+    path('api/async/dashboard/netflow_12m', views.api_dashboard_netflow_12m_async, name='api_dashboard_netflow_12m_async'),
+    path('api/async/dashboard/income_expenses_12m', views.api_dashboard_income_expenses_12m_async, name='api_dashboard_income_expenses_12m_async'),
+    path('api/async/dashboard/expenses_by_category', views.api_dashboard_expenses_by_category_async, name='api_dashboard_expenses_by_category_async'),
+    path('api/async/dashboard/bundle', views.api_dashboard_bundle_async, name='api_dashboard_bundle_async'),
+    path('api/async/dashboard/actual_vs_budget', views.api_dashboard_actual_vs_budget_async, name='api_dashboard_actual_vs_budget_async'),
 ]
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+Transaction validation without per-row queries.
+
+``Model.full_clean()`` validates every foreign key with its own query, and
+the kind rules used to dereference ``account_from``/``account_to`` for their
+types, so each validated row cost several queries. The rules here read
+account types from ``account_directory``, a process-local {id: type}
+snapshot loaded in one query. The Account signals in budget/signals.py
+invalidate it in the process that saved the account. Other processes reload
+it after ``MAX_AGE`` seconds, or as soon as they meet an unknown id.
+Category and payee ids are left to the database's foreign key constraints.
+
+``validate`` replaces ``full_clean()`` for one instance; ``validate_many``
+checks a whole batch in one pass and reports errors per row. Both coerce
+foreign key ids set from form strings (``convert_related``) before the
+rules compare them with the directory's integer keys. Both are used
+by Transaction.save(), the importers and recurring generation, and
+``check_rules`` by Transaction.clean() and RecurringTransaction.clean().
+"""
+import threading
+import time
+
+from django.core.exceptions import ValidationError
+
+from .models import Account
+
+# Checked here (accounts) or by the database (category, payee); clean_fields()
+# would run one query each.
+RELATED_FIELDS = ['category', 'account_from', 'account_to', 'payee']
+
+# Bounds how long another process may validate against an old account type
+MAX_AGE = 60
+
+
+class AccountDirectory:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types = None
+        self._loaded_at = 0.0
+        self.loads = 0
+
+    def load(self):
+        types = dict(Account.objects.values_list('id', 'type'))
+        with self._lock:
+            self._types = types
+            self._loaded_at = time.monotonic()
+            self.loads += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._types = None
+
+    def get_many(self, ids):
+        """{id: account type or None} for ``ids``; reloads once if stale or if any id is unknown."""
+        ids = {pk for pk in ids if pk is not None}
+        types = self._types
+        if types is None or time.monotonic() - self._loaded_at > MAX_AGE or not ids <= types.keys():
+            # Unknown ids may be accounts created by another process
+            self.load()
+            types = self._types
+        return {pk: types.get(pk) for pk in ids}
+
+
+account_directory = AccountDirectory()
+
+
+def rule_error(kind, account_from_id, account_to_id, accounts):
+    """The first kind/account rule ``kind`` breaks, as a message, or None."""
+    for account_id in (account_from_id, account_to_id):
+        if account_id is not None and accounts.get(account_id) is None:
+            return f"La cuenta {account_id} no existe."
+    has_from = account_from_id is not None
+    has_to = account_to_id is not None
+    if kind == 'GASTO':
+        if not has_from:
+            return "Los gastos requieren cuenta de origen."
+        if has_to:
+            return "Los gastos no tienen cuenta de destino."
+    elif kind == 'INGRESO':
+        if not has_to:
+            return "Los ingresos requieren cuenta de destino."
+        if has_from:
+            return "Los ingresos no tienen cuenta de origen."
+    elif kind == 'TRANSFERENCIA':
+        if not has_from or not has_to:
+            return "Las transferencias requieren cuenta de origen y destino."
+        if account_from_id == account_to_id:
+            return "No se puede transferir a la misma cuenta."
+    elif kind == 'PAGO_TARJETA':
+        if not has_from or not has_to:
+            return "Los pagos de tarjeta requieren cuenta de origen y destino."
+        if accounts[account_to_id] != 'CREDITO':
+            return "El destino debe ser una cuenta de crédito."
+        if accounts[account_from_id] == 'CREDITO':
+            return "El origen no puede ser una cuenta de crédito."
+    elif kind == 'TRANSFERENCIA_EXTERNA':
+        if has_from == has_to:
+            return "Las transferencias externas requieren una cuenta interna (origen o destino) y un destinatario externo."
+    return None
+
+
+def check_rules(instance, accounts=None):
+    """Raise ValidationError if ``instance`` (a Transaction or RecurringTransaction) breaks a kind rule."""
+    if accounts is None:
+        accounts = account_directory.get_many([instance.account_from_id, instance.account_to_id])
+    message = rule_error(instance.kind, instance.account_from_id, instance.account_to_id, accounts)
+    if message:
+        raise ValidationError(message)
+
+
+def convert_related(instance):
+    """Coerce the foreign key ids (e.g. strings from a form) to their Python type, without a query."""
+    errors = {}
+    for name in RELATED_FIELDS:
+        field = instance._meta.get_field(name)
+        try:
+            setattr(instance, field.attname, field.to_python(getattr(instance, field.attname)))
+        except ValidationError as error:
+            errors[name] = error.messages
+    if errors:
+        raise ValidationError(errors)
+
+
+def validate(instance):
+    """``full_clean()`` without the foreign key queries."""
+    convert_related(instance)
+    instance.clean_fields(exclude=RELATED_FIELDS)
+    instance.clean()
+
+
+def validate_many(instances):
+    """Validate a batch in one pass; return [(position, ValidationError)] for the rows that fail."""
+    errors = {}
+    for position, instance in enumerate(instances):
+        try:
+            convert_related(instance)
+        except ValidationError as error:
+            errors[position] = error
+    accounts = account_directory.get_many(
+        account_id for position, instance in enumerate(instances) if position not in errors
+        for account_id in (instance.account_from_id, instance.account_to_id)
+    )
+    for position, instance in enumerate(instances):
+        if position in errors:
+            continue
+        try:
+            instance.clean_fields(exclude=RELATED_FIELDS)
+            check_rules(instance, accounts)
+        except ValidationError as error:
+            errors[position] = error
+    return sorted(errors.items())
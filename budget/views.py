@@ -1,49 +1,33 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
-from django.db.models import Sum, F, Case, When, Value, DecimalField, Q
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
+from django.urls import reverse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from urllib.parse import urlencode
 from datetime import datetime, timedelta
-from decimal import Decimal
 from .models import Transaction, Account, Category, BudgetPlan, ExchangeRate, Payee
 from django.contrib import messages
+from . import exports, history, ledger, metrics, pagination, query_pool, rollups, search, statements
+from .payees import MAX_SUGGESTIONS, payee_index
+from .cache import cached_api
+from .conditional import conditional_api, conditional_page
 
-def get_exchange_rate(date):
-    # Get the latest exchange rate on or before the date
-    rate = ExchangeRate.objects.filter(date__lte=date).order_by('-date').first()
-    return rate.usd_to_pen if rate else None
-
-def convert_to_pen(amount, currency, date):
-    if currency == 'PEN':
-        return amount
-    rate = get_exchange_rate(date)
-    return amount * rate if rate else amount  # If no rate, return original
-
+@conditional_page
 def dashboard(request):
     # Default period: current month
     today = timezone.now().date()
-    start_date = today.replace(day=1)
-    end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    start_date, end_date = metrics.month_bounds(today)
 
     # KPIs
-    transactions = Transaction.objects.filter(date__range=(start_date, end_date))
-
-    # PEN
-    pen_transactions = transactions.filter(currency='PEN')
-    # pen_income = pen_transactions.filter(kind='INGRESO', is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    # pen_expenses = pen_transactions.filter(kind='GASTO', is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    pen_income = pen_transactions.filter(Q(kind='INGRESO') | Q(kind='TRANSFERENCIA_EXTERNA', account_to__isnull=False), is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    pen_expenses = pen_transactions.filter(Q(kind='GASTO') | Q(kind='TRANSFERENCIA_EXTERNA', account_from__isnull=False), is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    pen_savings = pen_income - pen_expenses
-    pen_balance = sum(account.balance for account in Account.objects.filter(currency='PEN').exclude(type="CREDITO"))
-
-    # USD
-    usd_transactions = transactions.filter(currency='USD')
-    # usd_income = usd_transactions.filter(kind='INGRESO', is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    # usd_expenses = usd_transactions.filter(kind='GASTO', is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    usd_income = usd_transactions.filter(Q(kind='INGRESO') | Q(kind='TRANSFERENCIA_EXTERNA', account_to__isnull=False), is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    usd_expenses = usd_transactions.filter(Q(kind='GASTO') | Q(kind='TRANSFERENCIA_EXTERNA', account_from__isnull=False), is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    usd_savings = usd_income - usd_expenses
-    usd_balance = sum(account.balance for account in Account.objects.filter(currency='USD'))
+    totals = metrics.period_metrics(start_date, end_date)
+    balances = metrics.currency_balances()
+    pen_income = totals['PEN']['total_income']
+    pen_expenses = totals['PEN']['total_expenses']
+    pen_savings = totals['PEN']['savings']
+    pen_balance = balances['PEN']
+    usd_income = totals['USD']['total_income']
+    usd_expenses = totals['USD']['total_expenses']
+    usd_savings = totals['USD']['savings']
+    usd_balance = balances['USD']
 
     context = {
         'pen_income': pen_income,
@@ -59,6 +43,12 @@ def dashboard(request):
     }
     return render(request, 'dashboard.html', context)
 
+def back_to_page(request):
+    # Return to the page, size and search the form was posted from
+    query = request.POST.get('next', '')
+    return redirect(f"{reverse('transactions')}?{query}" if query else 'transactions')
+
+@conditional_page
 def transactions(request):
     edit_transaction = None
     if 'edit' in request.GET:
@@ -131,20 +121,35 @@ def transactions(request):
                 messages.success(request, 'Transacción creada exitosamente.')
             except Exception as e:
                 messages.error(request, f'Error: {str(e)}')
-        return redirect('transactions')
-
-    transactions = Transaction.objects.filter(date__gte='2025-01-01').order_by('-date')
+        return back_to_page(request)
+
+    # Search box: full-text query plus date, account and amount filters
+    filters = {field: request.GET.get(field, '') for field in search.FILTERS}
+    queryset = Transaction.objects.select_related('category', 'account_from', 'account_to')
+    try:
+        queryset = search.search_transactions(queryset, **filters)
+    except search.SearchFilterError as e:
+        messages.error(request, f'Error: {str(e)}')
+    page = pagination.keyset_page(
+        queryset,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page_size=pagination.page_size_from(request.GET.get('page_size')),
+    )
     categories = Category.objects.filter(is_active=True)
     accounts = Account.objects.all()
-    payees = Payee.objects.all()
     return render(request, 'transactions.html', {
-        'transactions': transactions,
+        'transactions': page,
+        'page': page,
         'categories': categories,
         'accounts': accounts,
-        'payees': payees,
         'edit_transaction': edit_transaction,
+        'filters': filters,
+        'search_query': urlencode({field: value for field, value in filters.items() if value}),
+        'page_query': urlencode({field: value for field, value in request.GET.items() if field != 'edit' and value}),
     })
 
+@conditional_page
 def accounts(request):
     edit_account = None
     if 'edit' in request.GET:
@@ -196,9 +201,10 @@ def accounts(request):
                 messages.error(request, f'Error: {str(e)}')
         return redirect('accounts')
 
-    accounts = Account.objects.all()
+    accounts = Account.objects.select_related('ledger')
     return render(request, 'accounts.html', {'accounts': accounts, 'edit_account': edit_account})
 
+@conditional_page
 def budgets(request):
     if request.method == 'POST':
         frequency = request.POST.get('frequency')
@@ -225,9 +231,11 @@ def budgets(request):
             messages.error(request, f'Error: {str(e)}')
         return redirect('budgets')
 
-    budgets = BudgetPlan.objects.all()
+    # Actuals for every plan's own window come from the daily rollup, in one query
+    budgets = rollups.with_actuals(BudgetPlan.objects.all())
     return render(request, 'budgets.html', {'budgets': budgets})
 
+@conditional_page
 def exchange_rates(request):
     if request.method == 'POST':
         date = request.POST.get('date')
@@ -244,6 +252,8 @@ def exchange_rates(request):
     return render(request, 'exchange_rates.html', {'rates': rates})
 
 # API views
+@conditional_api
+@cached_api
 def api_dashboard_summary(request):
     start = request.GET.get('start')
     end = request.GET.get('end')
@@ -252,70 +262,22 @@ def api_dashboard_summary(request):
     start_date = datetime.fromisoformat(start).date()
     end_date = datetime.fromisoformat(end).date()
 
-    transactions = Transaction.objects.filter(date__range=(start_date, end_date), is_valid=True)
-
-    pen_income = transactions.filter(currency='PEN', kind='INGRESO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    pen_expenses = transactions.filter(currency='PEN', kind='GASTO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    usd_income = transactions.filter(currency='USD', kind='INGRESO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    usd_expenses = transactions.filter(currency='USD', kind='GASTO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-
-    return JsonResponse({
-        'pen_income': float(pen_income),
-        'pen_expenses': float(pen_expenses),
-        'usd_income': float(usd_income),
-        'usd_expenses': float(usd_expenses),
-    })
+    totals = metrics.period_metrics(start_date, end_date)
+    return JsonResponse(metrics.summary_payload(totals))
 
+@conditional_api
+@cached_api
 def api_dashboard_netflow_12m(request):
     # Last 12 months net flow (income - expenses) per month, chronological order
-    today = timezone.now().date()
-    data = []
-    for i in range(11, -1, -1):  # From 11 to 0, oldest to newest
-        month_start = (today - timedelta(days=30*i)).replace(day=1)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        transactions = Transaction.objects.filter(date__range=(month_start, month_end), is_valid=True)
-        
-        # pen_income = transactions.filter(Q(kind='INGRESO', payment_method='TRANSFERENCIA') | Q(kind='TRANSFERENCIA_EXTERNA', account_to__isnull=False), currency='PEN', is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        pen_income = transactions.filter(Q(kind='INGRESO') | Q(kind='TRANSFERENCIA_EXTERNA', account_to__isnull=False), currency='PEN', is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        # pen_expense = transactions.filter(Q(kind='GASTO', payment_method='TRANSFERENCIA') | Q(kind='TRANSFERENCIA_EXTERNA', account_from__isnull=False), currency='PEN', is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        pen_expense = transactions.filter(Q(kind='GASTO') | Q(kind='TRANSFERENCIA_EXTERNA', account_from__isnull=False), currency='PEN', is_valid=True).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        pen_net = pen_income - pen_expense
-        # pen_income_transf = transactions.filter(currency='PEN', kind='TRANSFERENCIA_EXTERNA').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        # pen_expense_transf = transactions.filter(currency='PEN', kind='TRANSFERENCIA_EXTERNA').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        # pen_net = pen_income + pen_income_transf - pen_expense - pen_expense_transf
-        
-        usd_income = transactions.filter(currency='USD', kind='INGRESO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        usd_expense = transactions.filter(currency='USD', kind='GASTO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        usd_net = usd_income - usd_expense
-        data.append({
-            'month': month_start.strftime('%Y-%m'),
-            'pen': float(pen_net),
-            'usd': float(usd_net),
-        })
-    # print(data)
-    return JsonResponse(data, safe=False)
+    months = metrics.last_12_months(timezone.now().date())
+    return JsonResponse(metrics.netflow_payload(months, rollups.monthly_flows(months)), safe=False)
 
+@conditional_api
+@cached_api
 def api_dashboard_income_expenses_12m(request):
     # Last 12 months income and expenses per month, chronological order
-    today = timezone.now().date()
-    data = []
-    for i in range(11, -1, -1):  # From 11 to 0, oldest to newest
-        month_start = (today - timedelta(days=30*i)).replace(day=1)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        transactions = Transaction.objects.filter(date__range=(month_start, month_end))
-        pen_income = transactions.filter(currency='PEN', kind='INGRESO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        pen_expense = transactions.filter(currency='PEN', kind='GASTO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        usd_income = transactions.filter(currency='USD', kind='INGRESO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        usd_expense = transactions.filter(currency='USD', kind='GASTO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        data.append({
-            'month': month_start.strftime('%Y-%m'),
-            'pen_income': float(pen_income),
-            'pen_expense': float(pen_expense),
-            'usd_income': float(usd_income),
-            'usd_expense': float(usd_expense),
-        })
-    # print(data)
-    return JsonResponse(data, safe=False)
+    months = metrics.last_12_months(timezone.now().date())
+    return JsonResponse(metrics.income_expenses_payload(months, rollups.monthly_flows(months)), safe=False)
 
 def invalidate_transaction(request, transaction_id):
     if request.method == 'POST':
@@ -326,7 +288,7 @@ def invalidate_transaction(request, transaction_id):
             messages.success(request, 'Transacción invalidada exitosamente.')
         else:
             messages.warning(request, 'La transacción ya está invalidada.')
-    return redirect('transactions')
+    return back_to_page(request)
 
 def delete_transaction(request, transaction_id):
     if request.method == 'POST':
@@ -336,8 +298,10 @@ def delete_transaction(request, transaction_id):
             messages.success(request, 'Transacción eliminada permanentemente.')
         else:
             messages.error(request, 'Solo se pueden eliminar transacciones invalidas.')
-    return redirect('transactions')
+    return back_to_page(request)
 
+@conditional_api
+@cached_api
 def api_dashboard_expenses_by_category(request):
     start = request.GET.get('start')
     end = request.GET.get('end')
@@ -347,30 +311,238 @@ def api_dashboard_expenses_by_category(request):
     start_date = datetime.fromisoformat(start).date()
     end_date = datetime.fromisoformat(end).date()
 
-    expenses = Transaction.objects.filter(date__range=(start_date, end_date), kind='GASTO', is_valid=True)
-    data = {}
-    for exp in expenses:
-        amount = exp.amount if mode == 'original' else convert_to_pen(exp.amount, exp.currency, exp.date)
-        cat = exp.category.name if exp.category else 'Sin Categoría'
-        data[cat] = data.get(cat, Decimal('0.00')) + amount
-    return JsonResponse({k: float(v) for k, v in data.items()})
+    data = metrics.expenses_by_category(start_date, end_date, mode)
+    return JsonResponse(metrics.categories_payload(data))
 
+@conditional_api
+@cached_api
 def api_dashboard_actual_vs_budget(request):
     budget_id = request.GET.get('budget_id')
     if not budget_id:
         return JsonResponse({'error': 'budget_id required'}, status=400)
-    budget = get_object_or_404(BudgetPlan, id=budget_id)
+    budget = get_object_or_404(rollups.with_actuals(BudgetPlan.objects.all()), id=budget_id)
 
-    transactions = Transaction.objects.filter(effective_period=budget.period_start.replace(day=1), is_valid=True)
-    actual_income = transactions.filter(kind='INGRESO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    actual_expenses = transactions.filter(kind='GASTO').aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-    actual_savings = actual_income - actual_expenses
+    return JsonResponse(metrics.actual_vs_budget_payload(budget))
 
+@conditional_api
+@cached_api
+def api_account_statements(request, account_id):
+    # Billing-cycle statements of a credit card; closed cycles are read from storage
+    account = get_object_or_404(Account, id=account_id)
+    if not statements.has_cycle(account):
+        return JsonResponse({'error': 'account is not a credit card with billing and due days'}, status=400)
+    start = request.GET.get('start')
+    end = request.GET.get('end')
+    start_date = datetime.fromisoformat(start).date() if start else None
+    end_date = datetime.fromisoformat(end).date() if end else None
+
+    rows = statements.account_statements(account, timezone.now().date(), start_date, end_date)
     return JsonResponse({
-        'target_income': float(budget.target_income),
-        'actual_income': float(actual_income),
-        'target_expenses': float(budget.target_expenses),
-        'actual_expenses': float(actual_expenses),
-        'target_savings': float(budget.target_savings),
-        'actual_savings': float(actual_savings),
+        'account': account.id,
+        'statements': [statements.statement_payload(statement, is_open) for statement, is_open in rows],
     })
+
+@conditional_api
+@cached_api
+def api_account_balance_history(request, account_id):
+    # Running balance per day, week or month; the last year unless start/end are given
+    account = get_object_or_404(Account, id=account_id)
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in history.GRANULARITIES:
+        return JsonResponse({'error': f"granularity must be one of {', '.join(history.GRANULARITIES)}"}, status=400)
+    end = request.GET.get('end')
+    end_date = datetime.fromisoformat(end).date() if end else timezone.now().date()
+    start = request.GET.get('start')
+    start_date = datetime.fromisoformat(start).date() if start else end_date - timedelta(days=365)
+    if start_date > end_date:
+        return JsonResponse({'error': 'start must not be after end'}, status=400)
+
+    series = history.balance_history(account, start_date, end_date, granularity)
+    return JsonResponse(history.history_payload(account, start_date, end_date, granularity, series))
+
+def api_payees_suggest(request):
+    # Payee names for the transaction form, answered from the in-process prefix index
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), MAX_SUGGESTIONS)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    suggestions = payee_index.suggest(request.GET.get('q', ''), limit)
+    return JsonResponse({'suggestions': [{'id': payee_id, 'name': name} for payee_id, name in suggestions]})
+
+@conditional_api
+def api_transactions_search(request):
+    # Full-text search over description, payee and category; newest first, keyset-paginated
+    try:
+        queryset = search.search_transactions(
+            Transaction.objects.select_related('category', 'payee'),
+            **{field: request.GET.get(field) for field in search.FILTERS},
+        )
+    except search.SearchFilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    page = pagination.keyset_page(
+        queryset,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page_size=pagination.page_size_from(request.GET.get('page_size')),
+    )
+    return JsonResponse({
+        'results': [search.result_payload(transaction) for transaction in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+def bulk_targets(request):
+    """Transactions selected by a bulk request (``ids`` and/or the search filters), or a 400 response."""
+    ids = [pk for pk in request.POST.get('ids', '').split(',') if pk]
+    filters = {field: request.POST.get(field) for field in search.FILTERS}
+    if not ids and not any(filters.values()):
+        return JsonResponse({'error': 'ids or a filter required'}, status=400)
+    if not all(pk.isdigit() for pk in ids):
+        return JsonResponse({'error': 'ids must be comma-separated transaction ids'}, status=400)
+    queryset = Transaction.objects.all()
+    if ids:
+        queryset = queryset.filter(id__in=ids)
+    try:
+        return search.search_transactions(queryset, **filters)
+    except search.SearchFilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+def api_transactions_bulk_invalidate(request):
+    # One UPDATE for every selected valid transaction; balances and rollups follow in the same transaction
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    queryset = bulk_targets(request)
+    if isinstance(queryset, JsonResponse):
+        return queryset
+    return JsonResponse({'invalidated': ledger.bulk_invalidate(queryset)})
+
+def api_transactions_bulk_delete(request):
+    # One DELETE for every selected invalidated transaction; valid ones are left alone
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    queryset = bulk_targets(request)
+    if isinstance(queryset, JsonResponse):
+        return queryset
+    return JsonResponse({'deleted': ledger.bulk_delete(queryset)})
+
+def bundle_params(request):
+    """Widgets, period and mode of a bundle request, or a 400 response."""
+    widgets = [w for w in request.GET.get('widgets', ','.join(metrics.BUNDLE_WIDGETS[:4])).split(',') if w]
+    unknown = [w for w in widgets if w not in metrics.BUNDLE_WIDGETS]
+    if unknown:
+        return JsonResponse({'error': f"unknown widgets: {', '.join(unknown)}"}, status=400)
+    if 'actual_vs_budget' in widgets and not request.GET.get('budget_id'):
+        return JsonResponse({'error': 'budget_id required'}, status=400)
+    start = request.GET.get('start')
+    end = request.GET.get('end')
+    if start and end:
+        start_date = datetime.fromisoformat(start).date()
+        end_date = datetime.fromisoformat(end).date()
+    else:
+        start_date, end_date = metrics.month_bounds(timezone.now().date())
+    return widgets, start_date, end_date, request.GET.get('mode', 'original')
+
+@conditional_api
+@cached_api
+def api_dashboard_bundle(request):
+    # Several dashboard widgets in one response, sharing their queries
+    params = bundle_params(request)
+    if isinstance(params, JsonResponse):
+        return params
+    widgets, start_date, end_date, mode = params
+    budget = None
+    if 'actual_vs_budget' in widgets:
+        budget = get_object_or_404(rollups.with_actuals(BudgetPlan.objects.all()), id=request.GET['budget_id'])
+
+    queries = metrics.bundle_queries(widgets, start_date, end_date, timezone.now().date(), mode)
+    results = {name: func(*args) for name, (func, *args) in queries.items()}
+    return JsonResponse(metrics.bundle_payload(widgets, start_date, end_date, queries, results, budget))
+
+# Async API views (ASGI): same payloads as above, but the queries run on the
+# bounded query pool so the event loop keeps serving other requests, and the
+# independent queries of a bundle run concurrently.
+@conditional_api
+@cached_api
+async def api_dashboard_summary_async(request):
+    start = request.GET.get('start')
+    end = request.GET.get('end')
+    if not start or not end:
+        return JsonResponse({'error': 'start and end required'}, status=400)
+    start_date = datetime.fromisoformat(start).date()
+    end_date = datetime.fromisoformat(end).date()
+
+    totals = await query_pool.run(metrics.period_metrics, start_date, end_date)
+    return JsonResponse(metrics.summary_payload(totals))
+
+@conditional_api
+@cached_api
+async def api_dashboard_netflow_12m_async(request):
+    months = metrics.last_12_months(timezone.now().date())
+    flows = await query_pool.run(rollups.monthly_flows, months)
+    return JsonResponse(metrics.netflow_payload(months, flows), safe=False)
+
+@conditional_api
+@cached_api
+async def api_dashboard_income_expenses_12m_async(request):
+    months = metrics.last_12_months(timezone.now().date())
+    flows = await query_pool.run(rollups.monthly_flows, months)
+    return JsonResponse(metrics.income_expenses_payload(months, flows), safe=False)
+
+@conditional_api
+@cached_api
+async def api_dashboard_expenses_by_category_async(request):
+    start = request.GET.get('start')
+    end = request.GET.get('end')
+    mode = request.GET.get('mode', 'original')  # original or pen
+    if not start or not end:
+        return JsonResponse({'error': 'start and end required'}, status=400)
+    start_date = datetime.fromisoformat(start).date()
+    end_date = datetime.fromisoformat(end).date()
+
+    data = await query_pool.run(metrics.expenses_by_category, start_date, end_date, mode)
+    return JsonResponse(metrics.categories_payload(data))
+
+@conditional_api
+@cached_api
+async def api_dashboard_actual_vs_budget_async(request):
+    budget_id = request.GET.get('budget_id')
+    if not budget_id:
+        return JsonResponse({'error': 'budget_id required'}, status=400)
+    budget = await aget_object_or_404(rollups.with_actuals(BudgetPlan.objects.all()), id=budget_id)
+
+    return JsonResponse(metrics.actual_vs_budget_payload(budget))
+
+@conditional_api
+@cached_api
+async def api_dashboard_bundle_async(request):
+    params = bundle_params(request)
+    if isinstance(params, JsonResponse):
+        return params
+    widgets, start_date, end_date, mode = params
+    budget = None
+    if 'actual_vs_budget' in widgets:
+        budget = await aget_object_or_404(rollups.with_actuals(BudgetPlan.objects.all()), id=request.GET['budget_id'])
+
+    queries = metrics.bundle_queries(widgets, start_date, end_date, timezone.now().date(), mode)
+    results = dict(zip(queries, await query_pool.gather(queries.values())))
+    return JsonResponse(metrics.bundle_payload(widgets, start_date, end_date, queries, results, budget))
+
+def export_transactions(request):
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in exports.FORMATS:
+        return JsonResponse({'error': 'format must be csv or jsonl'}, status=400)
+    try:
+        queryset = exports.export_queryset(
+            start=request.GET.get('start'),
+            end=request.GET.get('end'),
+            account=request.GET.get('account'),
+            currency=request.GET.get('currency'),
+            valid=request.GET.get('valid'),
+        )
+    except exports.ExportFilterError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(exports.iter_export(queryset, file_format), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="transacciones.{file_format}"'
+    return response
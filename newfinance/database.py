@@ -0,0 +1,123 @@
+"""
+SQLite connection profile and read-replica routing.
+
+Every connection runs ``SQLITE_PRAGMAS`` as its ``init_command`` (WAL, so
+readers never wait on a writer; ``synchronous=NORMAL``, which is durable
+across application crashes in WAL mode; a larger page cache and memory map;
+and a ``busy_timeout`` so writers queue instead of failing) and connections
+persist for ``CONN_MAX_AGE`` seconds. See newfinance/settings.py.
+
+When ``BUDGET_READ_REPLICA`` names a database alias, GET requests to URL
+names starting with ``BUDGET_REPLICA_VIEWS`` read from that alias, a copy
+of the primary refreshed with the SQLite online backup API by the
+``refresh_replica`` command. Those responses lag by up to one refresh;
+writes and every other request always use ``default``. Cached responses
+are keyed on the replica's own LedgerState version (see budget/cache.py),
+so every worker moves on after a refresh, whichever process ran it.
+"""
+import contextvars
+import sqlite3
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from budget.cache import bump_ledger_version
+
+_routing = contextvars.ContextVar('replica_routing', default=None)
+
+
+class Routing:
+    """Whether the current request may read from the replica (set once its view is resolved)."""
+
+    def __init__(self):
+        self.use_replica = False
+
+
+def replica_alias():
+    return getattr(settings, 'BUDGET_READ_REPLICA', None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and routing.use_replica:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the backup, never from migrate
+        return db != replica_alias()
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _routing.set(Routing())
+        try:
+            return self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+    async def __acall__(self, request):
+        token = _routing.set(Routing())
+        try:
+            return await self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Mutate the holder rather than the variable: process_view may run in a copied context
+        routing = _routing.get()
+        if routing is not None and replica_alias() and request.method in ('GET', 'HEAD'):
+            routing.use_replica = (request.resolver_match.url_name or '').startswith(settings.BUDGET_REPLICA_VIEWS)
+        return None
+
+
+def database_path(alias):
+    return str(connections.settings[alias]['NAME'])
+
+
+def refresh_replica(alias=None, pages=-1):
+    """Copy the primary database into the replica file with the online backup API.
+
+    Readers of the replica keep their snapshot until the copy commits; the
+    primary stays writable throughout. Returns the number of pages copied.
+    """
+    alias = alias or replica_alias()
+    if not alias:
+        raise ValueError('BUDGET_READ_REPLICA is not set')
+    target = database_path(alias)
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    copied = []
+    source = sqlite3.connect(database_path(DEFAULT_DB_ALIAS))
+    try:
+        replica = sqlite3.connect(target)
+        try:
+            source.backup(replica, pages=pages, progress=lambda status, remaining, total: copied.append(total))
+        finally:
+            replica.close()
+    finally:
+        source.close()
+    # Also drop this process's cached responses now; other workers move on
+    # when they next read the replica's LedgerState (see budget/cache.py)
+    bump_ledger_version()
+    return copied[-1] if copied else 0
@@ -0,0 +1,192 @@
+"""
+Per-view request instrumentation exposed in Prometheus text format.
+
+QueryMetricsMiddleware times every request and, through a wrapper in each
+connection's ``execute_wrappers`` (the hook behind
+``connection.execute_wrapper``), counts the SQL statements it runs, their
+total time and the slowest ones. Samples are grouped by the resolved URL
+name and served at the staff-only ``/metrics`` view.
+
+The per-query cost is two clock reads and a few additions, and the registry
+lock is taken once per request, so it is meant to stay on in production.
+Each process keeps its own registry; scrape every worker separately.
+"""
+import bisect
+import contextvars
+import heapq
+import threading
+import time
+from operator import itemgetter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SLOW_QUERIES = getattr(settings, 'METRICS_SLOW_QUERIES', 5)
+UNRESOLVED = '<unresolved>'
+
+_current = contextvars.ContextVar('request_sql', default=None)
+
+
+class RequestSQL:
+    """SQL statements run on behalf of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = {}  # sql -> seconds; N+1 loops repeat one statement
+
+    def add(self, sql, seconds):
+        self.count += 1
+        self.seconds += seconds
+        if seconds > self.slowest.get(sql, 0.0):
+            self.slowest[sql] = seconds
+
+
+def record_query(execute, sql, params, many, context):
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.add(sql, time.perf_counter() - started)
+
+
+def install(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+
+class ViewStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_seconds = 0.0
+        self.slowest = {}  # sql -> seconds
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view, seconds, sample):
+        with self._lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats()
+            stats.latency.observe(seconds)
+            stats.queries.observe(sample.count)
+            stats.sql_seconds += sample.seconds
+            for sql, query_seconds in sample.slowest.items():
+                if query_seconds > stats.slowest.get(sql, 0.0):
+                    stats.slowest[sql] = query_seconds
+            if len(stats.slowest) > SLOW_QUERIES:
+                stats.slowest = dict(heapq.nlargest(SLOW_QUERIES, stats.slowest.items(), key=itemgetter(1)))
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+
+    def render(self):
+        with self._lock:
+            views = sorted(self.views.items())
+            lines = []
+            histogram_lines(lines, 'django_view_request_duration_seconds', 'Request latency by URL name.',
+                            [(view, stats.latency) for view, stats in views])
+            histogram_lines(lines, 'django_view_sql_queries', 'SQL statements per request by URL name.',
+                            [(view, stats.queries) for view, stats in views])
+            lines.append('# HELP django_view_sql_seconds_total Time spent in SQL by URL name.')
+            lines.append('# TYPE django_view_sql_seconds_total counter')
+            for view, stats in views:
+                lines.append(f'django_view_sql_seconds_total{{view="{escape(view)}"}} {stats.sql_seconds}')
+            lines.append('# HELP django_view_slowest_query_seconds Slowest SQL statements seen by URL name.')
+            lines.append('# TYPE django_view_slowest_query_seconds gauge')
+            for view, stats in views:
+                for sql, seconds in sorted(stats.slowest.items(), key=itemgetter(1), reverse=True):
+                    lines.append(f'django_view_slowest_query_seconds{{view="{escape(view)}",sql="{escape(sql[:300])}"}} {seconds}')
+        return '\n'.join(lines) + '\n'
+
+
+def histogram_lines(lines, name, help_text, histograms):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for view, histogram in histograms:
+        label = f'view="{escape(view)}"'
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{label}}} {histogram.total}')
+        lines.append(f'{name}_count{{{label}}} {cumulative}')
+
+
+def escape(value):
+    return ' '.join(value.split()).replace('\\', '\\\\').replace('"', '\\"')
+
+
+registry = Registry()
+
+
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Worker threads open their own connections later; wrap those as they appear
+        connection_created.connect(install, dispatch_uid='newfinance.instrumentation.install')
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        sample = RequestSQL()
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+            self.observe(request, time.perf_counter() - started, sample)
+
+    async def __acall__(self, request):
+        sample = RequestSQL()
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            _current.reset(token)
+            self.observe(request, time.perf_counter() - started, sample)
+
+    def observe(self, request, seconds, sample):
+        match = request.resolver_match
+        registry.observe(match.view_name if match else UNRESOLVED, seconds, sample)
+
+
+def metrics_view(request):
+    if not (request.user.is_active and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its latency covers the rest of the stack
+    'newfinance.instrumentation.QueryMetricsMiddleware',
+    'newfinance.database.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,13 +77,85 @@ WSGI_APPLICATION = 'newfinance.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Run on every new connection (see newfinance/database.py). WAL lets the
+# dashboard reads proceed while a write commits; busy_timeout (ms) makes a
+# second writer wait for the lock instead of failing.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,  # KiB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    # Take the write lock at BEGIN, so writers queue on busy_timeout rather
+    # than deadlock upgrading a read lock
+    'transaction_mode': 'IMMEDIATE',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': int(os.environ.get('BUDGET_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Optional read replica for the dashboard APIs: set BUDGET_SQLITE_REPLICA to
+# a file path and refresh it periodically with `manage.py refresh_replica`.
+BUDGET_READ_REPLICA = None
+BUDGET_REPLICA_VIEWS = ('api_dashboard_',)
+
+if os.environ.get('BUDGET_SQLITE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': Path(os.environ['BUDGET_SQLITE_REPLICA']),
+        'OPTIONS': {**SQLITE_OPTIONS, 'init_command': SQLITE_OPTIONS['init_command'] + ';PRAGMA query_only=1'},
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+    BUDGET_READ_REPLICA = 'replica'
+
+DATABASE_ROUTERS = ['newfinance.database.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The 'budget' cache holds dashboard API responses keyed on a ledger version
+# counter. Pick the backend with BUDGET_CACHE_BACKEND: 'locmem' (single
+# process), 'file' (shared by the processes of one host) or 'redis' (local
+# stand-in for a shared cache; requires the redis package).
+
+BUDGET_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'budget',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'budget',
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('BUDGET_CACHE_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'budget': BUDGET_CACHE_BACKENDS[os.environ.get('BUDGET_CACHE_BACKEND', 'locmem')],
+}
+
+BUDGET_CACHE_TIMEOUT = 60 * 60 * 24
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,3 +198,15 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Budget app
+# Rows per page on the transactions page (overridable with ?page_size=)
+
+BUDGET_PAGE_SIZE = 50
+
+# Threads the async dashboard APIs use to run their queries concurrently
+BUDGET_QUERY_WORKERS = int(os.environ.get('BUDGET_QUERY_WORKERS', 4))
+
+# Slowest SQL statements kept per URL name on /metrics
+METRICS_SLOW_QUERIES = 5